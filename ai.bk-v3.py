@@ -1,11 +1,15 @@
-import openai
-from openai import OpenAIError
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
+from PIL import UnidentifiedImageError
 from dotenv import load_dotenv
 import os
-import cv2
-import numpy as np
+import tempfile
+import uuid
+
+from app_assets import background_catalog, font_choices, load_css, load_questions
+from metrics import metrics, stage, start_metrics_server
+
+# openai 와 렌더링 모듈(NumPy, Pillow, OpenCV)은 가져오는 데 오래 걸리므로 처음 쓰는 함수 안에서 불러온다.
+# 한 번 불러온 모듈은 프로세스에 남으므로 재실행 때는 비용이 없다.
 
 # 페이지 기본 설정
 st.set_page_config(
@@ -19,244 +23,178 @@ if 'show_qa' not in st.session_state:
     st.session_state.show_qa = True
 if 'show_result' not in st.session_state:
     st.session_state.show_result = False
+if 'preview_session_id' not in st.session_state:
+    st.session_state['preview_session_id'] = uuid.uuid4().hex
 
-# Custom CSS 적용
-st.markdown("""
-    <style>
-        /* Font Awesome 아이콘 추가 */
-        @import url('https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css');
-        
-        /* 구글 폰트 */
-        @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+KR:wght@300;400;500;700&display=swap');
-        
-        /* 기본 스타일 */
-        html, body, [class*="css"] {
-            font-family: 'Noto Sans KR', sans-serif;
-        }
-        
-        /* 메인 타이틀 스타일 */
-        .main-title {
-            color: #2C3E50;
-            padding: 2rem 0;
-            font-size: 2.0rem;
-            font-weight: 700;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            text-align: center;
-            margin-bottom: 1.5rem;
-        }
-        
-        /* 섹션 헤더 스타일 */
-        .section-header {
-            background: #f8f9fa;
-            padding: 1rem;
-            border-radius: 10px;
-            margin: 1.5rem 0;
-            border-left: 5px solid #667eea;
-        }
-        
-        /* 입력 필드 컨테이너 */
-        .input-container {
-            background: white;
-            padding: 1.5rem;
-            border-radius: 12px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.05);
-            margin-bottom: 1.5rem;
-            border: 1px solid #e9ecef;
-            transition: all 0.3s ease;
-        }
-        
-        .input-container:hover {
-            box-shadow: 0 8px 12px rgba(0, 0, 0, 0.1);
-            transform: translateY(-2px);
-        }
-        
-        /* 입력 필드 스타일 */
-        .stTextInput > div > div > input {
-            border-radius: 8px;
-            border: 2px solid #e9ecef;
-            padding: 0.8rem;
-            font-size: 1rem;
-            transition: all 0.3s ease;
-            background: #f8f9fa;
-        }
-        
-        .stTextInput > div > div > input:focus {
-            border-color: #667eea;
-            box-shadow: 0 0 0 3px rgba(102,126,234,0.2);
-        }
-        
-        /* 버튼 스타일 */
-        .stButton > button {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            border: none;
-            padding: 0.8rem 2rem;
-            border-radius: 50px;
-            font-weight: 500;
-            letter-spacing: 0.5px;
-            transition: all 0.3s ease;
-            text-transform: uppercase;
-        }
-        
-        .stButton > button:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 12px rgba(102,126,234,0.3);
-        }
-        
-        /* 선택 박스 스타일 */
-        .stSelectbox > div > div {
-            border-radius: 8px;
-            border: 2px solid #e9ecef;
-        }
-        
-        .stSelectbox > div > div:hover {
-            border-color: #667eea;
-        }
-        
-        /* 슬라이더 스타일 */
-        .stSlider > div > div > div {
-            background-color: #667eea;
-        }
-        
-        /* 이미지 스타일 */
-        .stImage {
-            border-radius: 15px;
-            box-shadow: 0 8px 16px rgba(0,0,0,0.1);
-            transition: transform 0.3s ease;
-        }
-        
-        .stImage:hover {
-            transform: scale(1.03);
-        }
-        
-        /* 아이콘 스타일 */
-        .icon {
-            margin-right: 8px;
-            color: #667eea;
-        }
-        
-        /* 결과 컨테이너 */
-        .result-container {
-            background: white;
-            padding: 2rem;
-            border-radius: 15px;
-            box-shadow: 0 10px 20px rgba(0,0,0,0.08);
-            margin: 2rem 0;
-            border: 2px solid #e9ecef;
-        }
-        
-        /* 툴팁 스타일 */
-        .tooltip {
-            position: relative;
-            display: inline-block;
-            cursor: help;
-        }
-        
-        .tooltip:hover::after {
-            content: attr(data-tooltip);
-            position: absolute;
-            bottom: 100%;
-            left: 50%;
-            transform: translateX(-50%);
-            padding: 0.5rem 1rem;
-            background: #2C3E50;
-            color: white;
-            border-radius: 4px;
-            font-size: 0.875rem;
-            white-space: nowrap;
-            z-index: 1000;
-        }
-        
-        /* 결과 섹션 스타일 */
-        .result-section {
-            margin-top: -550px;  /* Q&A 섹션 높이만큼 위로 조정 */
-            transition: margin-top 0.3s ease;
-            display: none;  /* 초기에는 숨김 */
-        }
-        
-        .result-section.visible {
-            margin-top: 0;
-            display: block;
-        }
-        
-        /* Q&A 섹션 스타일 */
-        .qa-section {
-            transition: all 0.3s ease;
-            margin-bottom: 550px;  /* 결과 섹션이 올라올 공간 확보 */
-        }
-        
-        .qa-section.hidden {
-            display: none;
-        }
-    </style>
-""", unsafe_allow_html=True)
+# Custom CSS 적용 (assets/ai.bk-v3.css, 프로세스마다 한 번만 읽는다)
+st.markdown(load_css("ai.bk-v3"), unsafe_allow_html=True)
 
 # 핵심 함수들
 def get_motivational_quote(answers):
+    # 같은 답변은 캐시된 응답이나 진행 중인 호출을 함께 쓴다 (quote_service.py 참고)
+    import openai
+    from quote_service import get_quote_service
+
+    if openai_api_key:
+        openai.api_key = openai_api_key
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": f"사용자의 심리 검사 결과가 다음과 같아: {answers}. 이 사용자에게 어울리는 짧고 따뜻하고 긍정적인 명언과 같은 글귀 1개 20글자 내로 추천해줘."}],
-            max_tokens=50,
-            temperature=0.7
-        )
-        motivational_quote = response.choices[0].message.content.strip()
-        return motivational_quote
+        return get_quote_service().get_quote(answers)
     except Exception as e:
         st.error(f"ChatGPT API 호출 중 오류가 발생했습니다: {e}")
         return None
 
-def overlay_text_with_custom_font(image_path, text, font_choice, text_color, stroke_color, x=None, y=None, font_size=60, upscale_factor=6):
+def show_effect_controls():
+    from bookmark_render import STROKE_PX
+
+    # 테두리 두께는 출력 픽셀 기준이라 upscale_factor 와 상관없이 화면에 보이는 두께 그대로다
+    stroke_px = st.number_input("🖊️ 테두리 두께 (px)", min_value=0.0, max_value=10.0, value=STROKE_PX, step=0.5)
+    shadow = st.checkbox("🌑 그림자", value=False)
+    glow = None
+    if st.checkbox("🌟 빛 번짐", value=False):
+        glow = {"color": st.color_picker("💡 빛 번짐 색상", "#FFFFFF")}
+    return {"stroke_px": stroke_px, "shadow": shadow, "glow": glow}
+
+def auto_placement(image_path, text, font_choice, font_size=60, upscale_factor=6, wrap_width=None, effects=None):
+    # 배경에서 가장 차분한 자리와 잘 보이는 글귀/테두리 색을 렌더링 없이 고른다 (auto_place.py 참고)
+    from auto_place import auto_place
+
+    return auto_place(image_path, text, font_choice, font_size, upscale_factor=upscale_factor, wrap_width=wrap_width,
+                      **(effects or {}))
+
+def overlay_text_with_custom_font(image_path, text, font_choice, text_color, stroke_color, x=None, y=None, font_size=60, upscale_factor=6, render_mode="region", wrap_width=None, effects=None, auto_place=False):
+    # render_mode="region" 은 글귀 영역만 슈퍼샘플링하고, "full" 은 기존처럼 배경 전체를 업스케일한다
+    # effects 는 테두리 두께와 그림자/빛 번짐 설정 (stroke_px, shadow, glow, text_effects.py 참고)
+    # auto_place=True 면 x, y 와 글귀/테두리 색을 무시하고 자동 배치 결과를 쓴다
+    # BOOKMARK_RENDER_SERVER 가 설정되어 있으면 렌더링 서버(render_server.py)에 맡긴다
+    from bookmark_render import render_bookmark
+    from render_server import get_render_client, render_remote
+
+    render = render_remote if get_render_client() is not None else render_bookmark
     try:
-        image = Image.open(image_path)
-        original_size = image.size
-        high_res_size = (original_size[0] * upscale_factor, original_size[1] * upscale_factor)
-        image = image.resize(high_res_size, Image.LANCZOS)
-        
-        font_paths = {
-            "나눔손글씨 가람연꽃": "나눔손글씨 가람연꽃.ttf",
-            "나눔손글씨 펜": "나눔손글씨 펜.ttf",
-            "나눔고딕": "나눔고딕.ttf",
-            "돋움체": "돋움체.ttf"
-        }
-        font_path = font_paths.get(font_choice, "나눔손글씨 가람연꽃.ttf")
-        font = ImageFont.truetype(font_path, font_size * upscale_factor)
+        if auto_place:
+            x, y, text_color, stroke_color = auto_placement(image_path, text, font_choice, font_size, upscale_factor,
+                                                            wrap_width, effects)[:4]
+        return render(image_path=image_path, text=text, font_choice=font_choice, text_color=text_color,
+                      stroke_color=stroke_color, x=x, y=y, font_size=font_size, upscale_factor=upscale_factor,
+                      render_mode=render_mode, wrap_width=wrap_width, **(effects or {}))
+    except (UnidentifiedImageError, IOError) as e:
+        st.error(f"이미지를 불러오거나 글꼴을 로드하는 중 오류가 발생했습니다: {e}")
+        return None
+
+def show_live_preview(image_path, text, font_choice, text_color, stroke_color, x=None, y=None, font_size=60, wrap_width=None, effects=None):
+    # 조작 중에는 초안을, 입력이 멈추면 완성본을 같은 자리에 보여준다 (live_preview.py 참고)
+    from live_preview import live_preview
+
+    spec = dict(image_path=image_path, text=text, font_choice=font_choice, text_color=text_color,
+                stroke_color=stroke_color, x=x, y=y, font_size=font_size, wrap_width=wrap_width, **(effects or {}))
+    placeholder = st.empty()
+    heartbeat = st.empty()
+
+    def show(image, is_final):
+        caption = "✨ 글귀가 추가된 이미지" if is_final else "✏️ 미리보기 (조작을 멈추면 선명하게 다시 그립니다)"
+        with stage("display"):
+            placeholder.image(image, caption=caption, use_column_width=False)
+
+    try:
+        return live_preview(st.session_state['preview_session_id'], spec, show, tick=heartbeat.empty)
     except (UnidentifiedImageError, IOError) as e:
         st.error(f"이미지를 불러오거나 글꼴을 로드하는 중 오류가 발생했습니다: {e}")
         return None
 
-    draw = ImageDraw.Draw(image)
-    lines = text.split("\n")
-    text_width = max([draw.textbbox((0, 0), line, font=font)[2] for line in lines]) if lines else 0
-    total_text_height = sum([draw.textbbox((0, 0), line, font=font)[3] for line in lines]) + (len(lines) - 1) * 10
+def show_background_suggestions(quote, image_path):
+    # 글귀 분위기에 어울리는 배경과 지금 배경과 비슷한 배경을 알려준다 (특징 색인만 조회하고 이미지는 디코딩하지 않는다)
+    from background_index import background_index
 
-    if x is None or y is None:
-        x = (image.width - text_width) / 2
-        y = (image.height - total_text_height) / 2
+    def names(paths):
+        return ", ".join(os.path.splitext(path)[0] for path in paths)
 
-    y_offset = y
-    for line in lines:
-        draw.text((x, y_offset), line, fill=text_color, font=font, align="center", stroke_width=8, stroke_fill=stroke_color)
-        y_offset += draw.textbbox((0, 0), line, font=font)[3] + 10 * upscale_factor
+    suggested = background_index.suggest(quote=quote, exclude=(image_path,))
+    if suggested:
+        st.caption(f"✨ 글귀와 어울리는 배경: {names(suggested)}")
+    similar = background_index.similar(image_path)
+    if similar:
+        st.caption(f"🎨 비슷한 느낌의 배경: {names(similar)}")
 
-    image = image.resize(original_size, Image.LANCZOS)
-    return image
+def show_client_preview(image_path, text, font_choice, text_color, stroke_color, x=None, y=None, font_size=60, wrap_width=None, effects=None):
+    # 배경은 한 번만 보내고 이후에는 작은 글귀 레이어만 보내서 브라우저가 합성한다 (client_compositor.py 참고)
+    from client_compositor import client_preview
 
-def upscale_image(image, scale_factor=6):
-    image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    upscaled_image = cv2.resize(image, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_CUBIC)
-    upscaled_image = Image.fromarray(cv2.cvtColor(upscaled_image, cv2.COLOR_BGR2RGB))
-    return upscaled_image
+    try:
+        client_preview(image_path, text, font_choice, text_color, stroke_color, x=x, y=y, font_size=font_size,
+                       wrap_width=wrap_width, caption="✨ 글귀가 추가된 이미지 (브라우저 합성)", **(effects or {}))
+        return True
+    except (UnidentifiedImageError, IOError) as e:
+        st.error(f"이미지를 불러오거나 글꼴을 로드하는 중 오류가 발생했습니다: {e}")
+        return None
+
+def show_print_export(image_path, text, font_choice, text_color, stroke_color, x=None, y=None, font_size=60, wrap_width=None, effects=None):
+    # 인쇄용 고해상도 파일은 띠 단위로 임시 파일에 바로 인코딩한다 (bookmark_export.py 참고)
+    from bookmark_export import DEFAULT_WIDTH_MM, EXPORT_FORMATS, EXPORT_MIME_TYPES, export_bookmark
+
+    with st.expander("🖨️ 인쇄용 내보내기"):
+        col1, col2, col3 = st.columns(3)
+        width_mm = col1.number_input("가로 길이 (mm)", min_value=20, max_value=300, value=DEFAULT_WIDTH_MM, step=5)
+        dpi = col2.selectbox("해상도 (DPI)", [150, 300, 600, 1200], index=1)
+        image_format = col3.selectbox("파일 형식", list(EXPORT_FORMATS))
+        if not st.button("📦 인쇄용 파일 만들기"):
+            return
+        try:
+            with tempfile.TemporaryFile() as f, st.spinner("인쇄용 파일을 만드는 중입니다..."):
+                width, height = export_bookmark(f, image_path, text, font_choice, text_color, stroke_color, x=x, y=y,
+                                                font_size=font_size, wrap_width=wrap_width, width_mm=width_mm,
+                                                dpi=dpi, image_format=image_format, **(effects or {}))
+                f.seek(0)
+                extension, mime = EXPORT_MIME_TYPES[image_format]
+                st.download_button(f"⬇️ 다운로드 ({width}x{height}px)", data=f.read(),
+                                   file_name=f"bookmark_{dpi}dpi.{extension}", mime=mime)
+        except (UnidentifiedImageError, IOError, ValueError) as e:
+            st.error(f"인쇄용 파일을 만드는 중 오류가 발생했습니다: {e}")
+
+def show_debug_panel():
+    # BOOKMARK_DEBUG_PANEL=1 이면 사이드바에 단계별 지연 시간과 캐시 상태를 보여준다 (metrics.py 참고)
+    if os.getenv("BOOKMARK_DEBUG_PANEL") != "1":
+        return
+    from auto_place import placement_stats
+    from bookmark_render import text_layer_stats
+    from font_registry import font_registry
+    from image_cache import background_cache
+    from live_preview import preview_scheduler
+    from quote_service import get_quote_service
+    from render_cache import render_cache
+
+    with st.sidebar.expander("🔧 성능 정보", expanded=False):
+        snapshot = metrics.snapshot()
+        st.table([{"단계": name, **values} for name, values in snapshot["stages"].items()])
+        st.json({
+            "counters": snapshot["counters"],
+            "gauges": snapshot["gauges"],
+            "text_layer_cache": text_layer_stats(),
+            "background_cache": background_cache.stats(),
+            "fonts": font_registry.stats(),
+            "quote_service": get_quote_service().stats(),
+            "preview": preview_scheduler.stats(),
+            "render_cache": render_cache.stats(),
+            "placement_maps": placement_stats()
+        })
+
+def upscale_image(image, scale_factor=6, backend=None):
+    # 설정된 리샘플링 백엔드로 확대한다 (resample.py 참고)
+    from resample import resize_image
+
+    return resize_image(image, (image.width * scale_factor, image.height * scale_factor), backend)
+
+@st.cache_resource(show_spinner=False)
+def load_api_key():
+    # .env 는 프로세스마다 한 번만 읽는다
+    load_dotenv()
+    return os.getenv("OPENAI_API_KEY")
 
 # 환경 변수에서 API Key 로드
-load_dotenv()
-openai_api_key = os.getenv("OPENAI_API_KEY")
+start_metrics_server()  # BOOKMARK_METRICS_PORT 가 있을 때만 /metrics, /stats.json 을 연다
+openai_api_key = load_api_key()
 
-# OpenAI API Key 설정
+# OpenAI API Key 설정 (openai 모듈은 글귀를 처음 요청할 때 불러온다)
 if openai_api_key:
-    openai.api_key = openai_api_key
     st.markdown('<div style="text-align: center; color: #28a745;"><i class="fas fa-check-circle"></i> OpenAI API 연결됨</div>', unsafe_allow_html=True)
 else:
     st.error('🔑 OpenAI API Key가 설정되지 않았습니다. .env 파일을 확인해주세요.')
@@ -279,13 +217,7 @@ st.markdown(f'<div class="{qa_class}">', unsafe_allow_html=True)
 
 with qa_container:
     if st.session_state.show_qa:
-        questions = [
-            {"icon": "fas fa-smile", "text": "오늘 기분이 어떤가요?", "tooltip": "현재의 감정 상태를 자유롭게 적어주세요"},
-            {"icon": "fas fa-heart", "text": "당신의 가장 소중한 것은 무엇인가요?", "tooltip": "삶에서 가장 가치있게 여기는 것을 생각해 보세요"},
-            {"icon": "fas fa-user-friends", "text": "애인이 있으신가요?", "tooltip": "현재 연애 상태를 알려주세요"},
-            {"icon": "fas fa-cloud", "text": "현재 가장 큰 고민거리가 무엇인가요?", "tooltip": "지금 마음을 무겁게 하는 문제를 찾아보세요"},
-            {"icon": "fas fa-star", "text": "소원이 무엇인가요?", "tooltip": "이루고 싶은 작은 희망이나 큰 꿈을 상상해 보세요"}
-        ]
+        questions = load_questions()
 
         answers = []
         for q in questions:
@@ -345,34 +277,59 @@ with result_container:
 
         st.markdown('<div class="section-header"><i class="fas fa-image"></i> 배경 이미지를 선택하세요</div>', unsafe_allow_html=True)
         
-        uploaded_images = ["네잎클로버.jpg", '라이즈 소희.jpg', '라이즈 앤톤.jpg', '라이즈 원빈.jpg',
-                          '라이즈 은석.jpg', '물감.jpg', '물결.jpg', '바다.jpg', '비눗방울.jpg',
-                          '에스파 카리나.jpg', '투데이.jpg', '고양이.jpg','동화.jpg','노을.jpg','어항 고양이.jpg','어항.jpg','화사한 고양이.jpg','심해.jpg','크리스마스.jpg']
+        uploaded_images = background_catalog()
         
         selected_image = st.selectbox("🖼️ 배경 이미지 선택", options=uploaded_images)
         
         if selected_image:
+            from bookmark_render import fit_text
+            from image_cache import background_cache
+
             st.session_state['background_image_url'] = selected_image
-            image = Image.open(selected_image)
-            st.image(image, caption="선택된 배경 이미지", use_column_width=False)
+            image = background_cache.get_preview(selected_image)  # 미리보기 단계 (피라미드 또는 디코딩 캐시)
+            with stage("display"):
+                st.image(image, caption="선택된 배경 이미지", use_column_width=False)
+            show_background_suggestions(selected_quote, selected_image)
 
             st.markdown('<div class="section-header"><i class="fas fa-paint-brush"></i> 스타일을 설정하세요</div>', unsafe_allow_html=True)
             
             col1, col2 = st.columns(2)
             with col1:
-                font_choice = st.selectbox("📝 글꼴 선택", ["나눔손글씨 가람연꽃", "예스 명조 레귤러"])
-                font_size = st.number_input("📏 글귀 크기 (pt)", min_value=10, max_value=200, value=30, step=1)
+                font_choice = st.selectbox("📝 글꼴 선택", font_choices())
+                auto_fit = st.checkbox("📐 글귀 크기 자동 맞춤", value=False)
+                font_size = st.number_input("📏 글귀 크기 (pt)", min_value=10, max_value=200, value=30, step=1, disabled=auto_fit)
+                wrap_width = None
+                if auto_fit:
+                    # 책갈피 영역에 들어가는 가장 큰 크기를 찾고, 그 너비에 맞춰 줄을 바꾼다
+                    font_size, wrap_width = fit_text(selected_image, selected_quote, font_choice)
+                    st.caption(f"자동 맞춤 크기: {font_size}pt")
                 
             with col2:
                 text_color = st.color_picker("🎨 글귀 색상", "#000000")
                 stroke_color = st.color_picker("✏️ 글귀 테두리 색상", "#FFFFFF")
+                effects = show_effect_controls()
 
             st.markdown('<div class="section-header"><i class="fas fa-arrows-alt"></i> 글귀 위치를 조정하세요</div>', unsafe_allow_html=True)
-            x_position = st.slider("⬅️➡️ x 좌표 (픽셀)", min_value=0, max_value=2048, value=512, step=10)
-            y_position = st.slider("⬆️⬇️ y 좌표 (픽셀)", min_value=0, max_value=2048, value=512, step=10)
+            auto_position = st.checkbox("🧭 자동 배치 (차분한 자리와 잘 보이는 색)", value=False)
+            x_position = st.slider("⬅️➡️ x 좌표 (픽셀)", min_value=0, max_value=2048, value=512, step=10, disabled=auto_position)
+            y_position = st.slider("⬆️⬇️ y 좌표 (픽셀)", min_value=0, max_value=2048, value=512, step=10, disabled=auto_position)
+            if auto_position:
+                # 누적 합 테이블로 모든 위치를 한 번에 비교한다 (시험 렌더링 없이 몇 ms)
+                try:
+                    x_position, y_position, text_color, stroke_color = auto_placement(
+                        selected_image, selected_quote, font_choice, font_size, wrap_width=wrap_width, effects=effects)[:4]
+                    st.caption(f"자동 배치: x={x_position}, y={y_position}, 글귀 {text_color} / 테두리 {stroke_color}")
+                except (UnidentifiedImageError, IOError) as e:
+                    st.error(f"자동 배치 중 오류가 발생했습니다: {e}")
+                    auto_position = False
 
-            # 실시간 이미지 업데이트
-            final_image = overlay_text_with_custom_font(
+            # 실시간 이미지 업데이트 (조작 중에는 초안, 입력이 멈추면 완성본)
+            st.markdown('<div class="section-header"><i class="fas fa-magic"></i> 완성된 책갈피</div>', unsafe_allow_html=True)
+            # 브라우저 합성: 위치/색을 바꿀 때 글귀 레이어만 보낸다. 완성본은 인쇄용 내보내기에서 서버가 합성한다.
+            client_side = st.checkbox("⚡ 브라우저에서 합성 (위치·색 조정이 빠름)", value=False)
+            # 완성본 이미지는 세션 상태에 두지 않는다 (설정만 남기고 필요하면 공유 캐시에서 다시 꺼낸다)
+            preview = show_client_preview if client_side else show_live_preview
+            final_image = preview(
                 st.session_state['background_image_url'],
                 selected_quote,
                 font_choice,
@@ -380,11 +337,15 @@ with result_container:
                 stroke_color=stroke_color,
                 x=x_position,
                 y=y_position,
-                font_size=font_size
+                font_size=font_size,
+                wrap_width=wrap_width,
+                effects=effects
             )
             if final_image:
-                st.session_state['final_image'] = final_image
-                st.markdown('<div class="section-header"><i class="fas fa-magic"></i> 완성된 책갈피</div>', unsafe_allow_html=True)
-                st.image(final_image, caption="✨ 글귀가 추가된 이미지", use_column_width=False)
+                show_print_export(selected_image, selected_quote, font_choice, text_color, stroke_color,
+                                  x=x_position, y=y_position, font_size=font_size, wrap_width=wrap_width,
+                                  effects=effects)
 
 st.markdown('</div>', unsafe_allow_html=True)
+
+show_debug_panel()
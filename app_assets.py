@@ -0,0 +1,39 @@
+# Streamlit 앱 정적 자원 (CSS, 질문 목록, 글꼴 표, 배경 카탈로그)
+# Streamlit 은 상호작용마다 스크립트 전체를 다시 실행하므로, 여기 있는 값은 프로세스마다 한 번만 읽고 만든다.
+# 파일을 읽거나 무거운 모듈을 가져오는 일은 처음 호출할 때로 미룬다.
+import json
+import os
+
+import streamlit as st
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+@st.cache_resource(show_spinner=False)
+def load_css(name):
+    # assets/<name>.css 를 st.markdown 에 바로 넘길 <style> 블록으로 만든다
+    with open(os.path.join(ASSET_DIR, f"{name}.css"), encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+
+@st.cache_data(show_spinner=False)
+def load_questions():
+    # 심리검사 질문 목록 (icon, text, tooltip)
+    with open(os.path.join(ASSET_DIR, "questions.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@st.cache_resource(show_spinner=False)
+def font_choices():
+    # 글꼴 폴더를 훑어 검증을 통과한 글꼴만 고를 수 있게 하고, 기본 크기는 미리 만들어 둔다 (font_registry.py 참고)
+    from font_registry import font_registry
+
+    font_registry.preload()
+    return font_registry.families()
+
+
+@st.cache_data(show_spinner=False)
+def background_catalog():
+    # background_store 는 NumPy/Pillow 를 함께 가져오므로 배경을 처음 고를 때 불러온다
+    from background_store import BACKGROUND_IMAGES
+
+    return list(BACKGROUND_IMAGES)
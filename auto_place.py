@@ -0,0 +1,131 @@
+# 글귀 자동 배치와 대비 색 고르기
+# 배경마다 한 번, 작게 줄인 밝기 / 밝기 제곱 / 경계 세기의 누적 합 테이블(summed-area table)을 만들어 캐시한다.
+# 그러면 글귀 상자가 들어갈 수 있는 모든 위치의 평균 밝기, 밝기 분산, 평균 경계 세기를 위치마다 O(1) 로
+# (NumPy 로 한 번에) 구할 수 있어서, 가장 차분한 자리를 시험 렌더링 없이 몇 ms 안에 고른다.
+#
+#   점수 = 평균 경계 세기 + STD_WEIGHT x 밝기 표준편차 + CENTER_WEIGHT x 가운데에서 떨어진 정도  (낮을수록 좋다)
+#
+# 글자 색은 고른 자리의 평균 밝기에 대해 명암 대비(WCAG)가 더 큰 검정/흰색이고, 테두리는 그 반대 색이다.
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from bookmark_render import FIT_MARGIN, LINE_GAP, STROKE_PX, load_font, split_lines
+from image_cache import LRUByteCache, background_cache
+from metrics import timed
+from text_effects import effect_margin, make_style
+from text_layout import layout_block
+
+# 분석 해상도의 긴 변 (이보다 큰 배경은 정수 배로 줄여서 분석한다)
+ANALYSIS_SIZE = 256
+STD_WEIGHT = 0.5
+CENTER_WEIGHT = 0.05
+DARK_TEXT, LIGHT_TEXT = "#000000", "#FFFFFF"
+PLACEMENT_CACHE_BYTES = int(os.getenv("BOOKMARK_PLACEMENT_CACHE_BYTES", 32 * 1024 * 1024))
+
+# x, y 는 render_bookmark 와 같은 업스케일 좌표, score 는 고른 자리의 점수
+Placement = namedtuple("Placement", ["x", "y", "text_color", "stroke_color", "score"])
+PlacementMaps = namedtuple("PlacementMaps", ["scale", "size", "luminance", "luminance_sq", "edges"])
+
+_maps_cache = LRUByteCache(PLACEMENT_CACHE_BYTES)
+
+
+def _summed_area(array):
+    # 맨 위 행과 맨 왼쪽 열이 0 인 누적 합. 상자 (top, left, h, w) 의 합은 네 칸만 읽으면 된다.
+    table = np.zeros((array.shape[0] + 1, array.shape[1] + 1), dtype=np.float64)
+    np.cumsum(array, axis=0, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+def _box_sums(table, height, width):
+    # 모든 (top, left) 위치에서 height x width 상자의 합 (결과 모양: 가능한 top 개수 x 가능한 left 개수)
+    return table[height:, width:] - table[:-height, width:] - table[height:, :-width] + table[:-height, :-width]
+
+
+def _build_maps(image_path):
+    array = background_cache.get_array(image_path)
+    height, width = array.shape[:2]
+    scale = max(1, math.ceil(max(width, height) / ANALYSIS_SIZE))
+    small = Image.fromarray(array).reduce(scale) if scale > 1 else Image.fromarray(array)
+    rgb = np.asarray(small, dtype=np.float32) / 255
+    # 상대 휘도 (sRGB -> 선형)
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    luminance = linear @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    # 경계 세기는 보이는 밝기(감마 적용) 차이로 잰다
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    edges = np.zeros_like(gray)
+    edges[:, 1:] += np.abs(np.diff(gray, axis=1))
+    edges[1:, :] += np.abs(np.diff(gray, axis=0))
+    maps = PlacementMaps(scale, (width, height), _summed_area(luminance), _summed_area(luminance ** 2),
+                         _summed_area(edges))
+    return maps, sum(table.nbytes for table in maps[2:])
+
+
+def placement_maps(image_path):
+    # 배경별 누적 합 테이블 (파일이 바뀌면 수정 시각으로 무효화된다)
+    path = os.path.abspath(image_path)
+    key = (path, os.stat(path).st_mtime_ns)
+    return _maps_cache.get_or_create(key, lambda: _build_maps(path))
+
+
+def _contrast(luminance, color_luminance):
+    light, dark = max(luminance, color_luminance), min(luminance, color_luminance)
+    return (light + 0.05) / (dark + 0.05)
+
+
+def contrasting_colors(luminance):
+    # 평균 상대 휘도에 대해 대비가 더 큰 글자 색과 그 반대 테두리 색
+    if _contrast(luminance, 0.0) >= _contrast(luminance, 1.0):
+        return DARK_TEXT, LIGHT_TEXT
+    return LIGHT_TEXT, DARK_TEXT
+
+
+@timed("auto_place")
+def auto_place(image_path, text, font_choice, font_size=60, upscale_factor=6, wrap_width=None,
+               stroke_px=STROKE_PX, shadow=None, glow=None, margin=FIT_MARGIN):
+    # 글귀 상자가 배경 여백(margin) 안에 들어가는 위치 중 가장 차분한 자리와 대비 색을 고른다
+    maps = placement_maps(image_path)
+    width, height = maps.size
+    font = load_font(font_choice, font_size, upscale_factor)
+    block = layout_block(split_lines(text, font, wrap_width, upscale_factor), font, gap=LINE_GAP * upscale_factor)
+    pad = effect_margin(make_style(stroke_px, shadow, glow))
+    box_width = block.width / upscale_factor + 2 * pad
+    box_height = block.height / upscale_factor + 2 * pad
+
+    # 분석 격자 기준 상자 크기와 위치 범위
+    scale = maps.scale
+    grid_height, grid_width = maps.edges.shape[0] - 1, maps.edges.shape[1] - 1
+    box_w = min(grid_width, max(1, math.ceil(box_width / scale)))
+    box_h = min(grid_height, max(1, math.ceil(box_height / scale)))
+    margin_x, margin_y = round(grid_width * margin), round(grid_height * margin)
+    left_max, top_max = grid_width - box_w, grid_height - box_h
+    left_min, top_min = min(margin_x, left_max // 2), min(margin_y, top_max // 2)
+    left_max, top_max = max(left_min, left_max - margin_x), max(top_min, top_max - margin_y)
+
+    area = box_w * box_h
+    window = (slice(top_min, top_max + 1), slice(left_min, left_max + 1))
+    mean = _box_sums(maps.luminance, box_h, box_w)[window] / area
+    variance = np.maximum(_box_sums(maps.luminance_sq, box_h, box_w)[window] / area - mean ** 2, 0)
+    busyness = _box_sums(maps.edges, box_h, box_w)[window] / area
+    tops = np.arange(top_min, top_max + 1)[:, None] + box_h / 2 - grid_height / 2
+    lefts = np.arange(left_min, left_max + 1)[None, :] + box_w / 2 - grid_width / 2
+    distance = np.sqrt((tops / grid_height) ** 2 + (lefts / grid_width) ** 2)
+    scores = busyness + STD_WEIGHT * np.sqrt(variance) + CENTER_WEIGHT * distance
+
+    row, column = np.unravel_index(np.argmin(scores), scores.shape)
+    text_color, stroke_color = contrasting_colors(float(mean[row, column]))
+    # 분석 격자의 상자 왼쪽 위 -> 출력 픽셀 -> 업스케일 좌표 (상자를 올림한 만큼 가운데로 맞춘다)
+    left = (left_min + column) * scale + (box_w * scale - box_width) / 2 + pad
+    top = (top_min + row) * scale + (box_h * scale - box_height) / 2 + pad
+    left = min(max(0, left), max(0, width - box_width + pad))
+    top = min(max(0, top), max(0, height - box_height + pad))
+    return Placement(round(left * upscale_factor), round(top * upscale_factor), text_color, stroke_color,
+                     float(scores[row, column]))
+
+
+def placement_stats():
+    return _maps_cache.stats()
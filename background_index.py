@@ -0,0 +1,252 @@
+# 배경 추천용 시각 특징 색인
+# 빌드할 때 배경마다 작은 특징 벡터를 한 번 계산해서 features.npy (float32 행렬, 한 줄에 배경 하나) 와
+# features.json (배경 이름, 원본 stat, 열 구성) 으로 피라미드 폴더에 저장한다.
+# 실행 중 추천은 이 행렬에 대한 벡터 연산뿐이라 이미지를 디코딩하지 않는다 (배경이 수천 장이어도 같은 방식이다).
+#
+#   hist    : RGB 4x4x4 색 히스토그램 (64칸, 합 1)
+#   tiny    : 4x4 로 줄인 RGB (48, 0~1). 색 배치가 비슷한 배경을 찾을 때 쓴다
+#   palette : 대표 색 PALETTE_SIZE 개 (RGB 0~1) 와 각 색의 비율
+#   tone    : 평균 밝기, 밝기 표준편차, 평균 채도, 따뜻함 (빨강 - 파랑, -1~1)
+#
+# 빌드:
+#   python background_index.py build
+# 색인이 없거나 원본이 바뀐 배경은 처음 조회할 때 메모리에서만 계산한다 (JPEG 는 축소 디코딩이라 빠르다).
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from background_store import BACKGROUND_IMAGES, DEFAULT_STORE_DIR
+
+INDEX_VERSION = 1
+# 특징을 계산할 때 줄이는 크기 (JPEG 는 이 근처까지 DCT 단계에서 줄여서 디코딩한다)
+SAMPLE_SIZE = 32
+HIST_BINS = 4
+TINY_SIZE = 4
+PALETTE_SIZE = 5
+
+# 열 구성: 이름 -> 열 수
+FEATURE_COLUMNS = (
+    ("hist", HIST_BINS ** 3),
+    ("tiny", TINY_SIZE * TINY_SIZE * 3),
+    ("palette", PALETTE_SIZE * 3),
+    ("palette_weight", PALETTE_SIZE),
+    ("tone", 4)
+)
+
+# 분위기 -> (글귀에서 찾을 낱말, 목표 tone: 밝기, 대비, 채도, 따뜻함)
+MOODS = {
+    "bright": (("희망", "햇살", "빛", "밝", "웃", "기쁨", "행복", "꿈"), (0.75, 0.2, 0.45, 0.1)),
+    "calm": (("쉼", "평온", "고요", "천천히", "위로", "괜찮", "숨", "편안"), (0.6, 0.12, 0.2, -0.05)),
+    "warm": (("사랑", "따뜻", "마음", "함께", "가족", "포근", "노을"), (0.6, 0.2, 0.45, 0.25)),
+    "deep": (("밤", "별", "바다", "깊", "꿈꾸", "새벽", "달"), (0.3, 0.2, 0.45, -0.25)),
+    "energetic": (("열정", "도전", "힘", "용기", "시작", "달려", "뜨겁"), (0.6, 0.3, 0.75, 0.2))
+}
+# tone 거리를 잴 때 열마다 곱하는 가중치
+TONE_WEIGHTS = np.array([1.0, 0.5, 1.0, 1.0], dtype=np.float32)
+# 색으로 찾을 때 대표 색과의 거리가 이 정도면 점수가 1/e 로 떨어진다 (RGB 0~1 공간)
+COLOR_RADIUS = 0.25
+
+
+def _slices():
+    slices, start = {}, 0
+    for name, width in FEATURE_COLUMNS:
+        slices[name] = slice(start, start + width)
+        start += width
+    return slices, start
+
+
+COLUMN_SLICES, FEATURE_WIDTH = _slices()
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def extract_features(path):
+    # 배경 하나의 특징 벡터 (FEATURE_WIDTH,)
+    with Image.open(path) as image:
+        image.draft("RGB", (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        image = image.convert("RGB").resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.BOX)
+    pixels = np.asarray(image, dtype=np.float32).reshape(-1, 3) / 255
+    vector = np.zeros(FEATURE_WIDTH, dtype=np.float32)
+
+    bins = np.minimum((pixels * HIST_BINS).astype(np.int64), HIST_BINS - 1)
+    codes = (bins[:, 0] * HIST_BINS + bins[:, 1]) * HIST_BINS + bins[:, 2]
+    vector[COLUMN_SLICES["hist"]] = np.bincount(codes, minlength=HIST_BINS ** 3) / len(codes)
+
+    tiny = image.resize((TINY_SIZE, TINY_SIZE), Image.BOX)
+    vector[COLUMN_SLICES["tiny"]] = np.asarray(tiny, dtype=np.float32).ravel() / 255
+
+    quantized = image.quantize(PALETTE_SIZE, method=Image.Quantize.MEDIANCUT)
+    counts = sorted(quantized.getcolors(), reverse=True)[:PALETTE_SIZE]
+    colors = np.array(quantized.getpalette()[:PALETTE_SIZE * 3], dtype=np.float32).reshape(-1, 3) / 255
+    palette = np.zeros((PALETTE_SIZE, 3), dtype=np.float32)
+    weights = np.zeros(PALETTE_SIZE, dtype=np.float32)
+    for slot, (count, index) in enumerate(counts):
+        palette[slot] = colors[index]
+        weights[slot] = count / len(pixels)
+    vector[COLUMN_SLICES["palette"]] = palette.ravel()
+    vector[COLUMN_SLICES["palette_weight"]] = weights
+
+    luminance = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    saturation = pixels.max(axis=1) - pixels.min(axis=1)
+    warmth = (pixels[:, 0] - pixels[:, 2]).mean()
+    vector[COLUMN_SLICES["tone"]] = (luminance.mean(), luminance.std(), saturation.mean(), warmth)
+    return vector
+
+
+def build_index(paths, store_dir=DEFAULT_STORE_DIR, root="."):
+    # 특징 행렬과 메타데이터를 새로 쓴다. 원본이 바뀌지 않은 배경은 기존 행을 그대로 옮긴다.
+    os.makedirs(store_dir, exist_ok=True)
+    previous = BackgroundIndex(store_dir)._load_saved()
+    rows, entries, built = [], [], []
+    for path in paths:
+        stat = _source_stat(os.path.join(root, path))
+        row = previous.get(path)
+        if row is None or row[0] != stat:
+            row = (stat, extract_features(os.path.join(root, path)))
+            built.append(path)
+        entries.append({"path": path, "mtime_ns": stat[0], "bytes": stat[1]})
+        rows.append(np.array(row[1], dtype=np.float32))
+    # 기존 행렬의 메모리 매핑을 놓은 뒤 덮어쓴다
+    del previous
+
+    matrix = np.stack(rows) if rows else np.zeros((0, FEATURE_WIDTH), dtype=np.float32)
+    np.save(os.path.join(store_dir, "features.npy"), matrix.astype(np.float32))
+    meta = {"version": INDEX_VERSION, "columns": [list(column) for column in FEATURE_COLUMNS], "entries": entries}
+    with open(os.path.join(store_dir, "features.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return built
+
+
+def _color_vector(color):
+    # "#RRGGBB" -> RGB 0~1
+    color = color.lstrip("#")
+    return np.array([int(color[i:i + 2], 16) for i in (0, 2, 4)], dtype=np.float32) / 255
+
+
+def moods_for(text):
+    # 글귀에 들어 있는 낱말로 분위기를 고른다 (없으면 빈 목록)
+    return [mood for mood, (keywords, _) in MOODS.items() if any(keyword in text for keyword in keywords)]
+
+
+class BackgroundIndex:
+    # 실행 중 색인. 저장된 행렬을 읽고, 빠졌거나 오래된 배경만 그 자리에서 계산해 채운다.
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, paths=BACKGROUND_IMAGES):
+        self.store_dir = store_dir
+        self.root = os.path.dirname(os.path.abspath(store_dir))
+        self.paths = list(paths)
+        self._names = None
+        self._matrix = None
+        self._computed = 0
+        self._lock = threading.Lock()
+
+    def _load_saved(self):
+        # {배경 이름: (stat, 특징 행)} - 색인 파일이 없거나 구성이 다르면 빈 dict
+        try:
+            with open(os.path.join(self.store_dir, "features.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(os.path.join(self.store_dir, "features.npy"), mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return {}
+        if meta.get("version") != INDEX_VERSION or [tuple(column) for column in meta["columns"]] != list(FEATURE_COLUMNS):
+            return {}
+        return {entry["path"]: ([entry["mtime_ns"], entry["bytes"]], matrix[row])
+                for row, entry in enumerate(meta["entries"])}
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._matrix is None:
+                saved = self._load_saved()
+                names, rows = [], []
+                for path in self.paths:
+                    source = os.path.join(self.root, path)
+                    try:
+                        stat = _source_stat(source)
+                    except FileNotFoundError:
+                        continue
+                    row = saved.get(path)
+                    if row is None or row[0] != stat:
+                        row = (stat, extract_features(source))
+                        self._computed += 1
+                    names.append(path)
+                    rows.append(np.asarray(row[1], dtype=np.float32))
+                self._names = names
+                self._matrix = np.stack(rows) if rows else np.zeros((0, FEATURE_WIDTH), dtype=np.float32)
+            return self._names, self._matrix
+
+    def reload(self):
+        with self._lock:
+            self._names = self._matrix = None
+
+    def column(self, name):
+        return self._ensure_loaded()[1][:, COLUMN_SLICES[name]]
+
+    def _top(self, scores, k, exclude=()):
+        names, _ = self._ensure_loaded()
+        scores = np.array(scores, dtype=np.float32)
+        for name in exclude:
+            if name in names:
+                scores[names.index(name)] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [names[i] for i in top[np.argsort(-scores[top])]]
+
+    def suggest(self, quote=None, mood=None, color=None, k=3, exclude=()):
+        # 글귀(분위기 낱말) / 분위기 이름 / 원하는 색(#RRGGBB) 에 어울리는 배경 이름을 k 개까지 돌려준다
+        if mood and mood not in MOODS:
+            raise ValueError(f"알 수 없는 분위기입니다: {mood}")
+        names, matrix = self._ensure_loaded()
+        scores = np.zeros(len(names), dtype=np.float32)
+        moods = [mood] if mood else moods_for(quote or "")
+        for name in moods:
+            target = np.array(MOODS[name][1], dtype=np.float32)
+            scores -= np.sqrt(((matrix[:, COLUMN_SLICES["tone"]] - target) ** 2 * TONE_WEIGHTS).sum(axis=1))
+        if color:
+            palette = matrix[:, COLUMN_SLICES["palette"]].reshape(len(names), PALETTE_SIZE, 3)
+            distance = np.linalg.norm(palette - _color_vector(color), axis=2)
+            weights = matrix[:, COLUMN_SLICES["palette_weight"]]
+            scores += (weights * np.exp(-(distance / COLOR_RADIUS) ** 2)).sum(axis=1)
+        if not moods and not color:
+            return []
+        return self._top(scores, k, exclude)
+
+    def similar(self, path, k=3):
+        # 색 분포와 색 배치가 비슷한 배경 (코사인 유사도)
+        names, matrix = self._ensure_loaded()
+        if path not in names:
+            return []
+        vectors = np.concatenate([matrix[:, COLUMN_SLICES["hist"]], matrix[:, COLUMN_SLICES["tiny"]]], axis=1)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-6
+        return self._top(vectors @ vectors[names.index(path)], k, exclude=(path,))
+
+    def stats(self):
+        names, matrix = self._ensure_loaded()
+        return {"backgrounds": len(names), "bytes": matrix.nbytes, "computed_at_runtime": self._computed}
+
+
+background_index = BackgroundIndex()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="배경 추천용 특징 색인 빌드")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("paths", nargs="*", help="배경 이미지 (기본값: 기본 카탈로그 전체)")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.abspath(args.store_dir))
+    paths = [os.path.relpath(os.path.abspath(p), root) for p in args.paths] or BACKGROUND_IMAGES
+    built = build_index(paths, args.store_dir, root=root)
+    print(f"특징 색인 빌드 완료: 배경 {len(paths)}개 ({len(built)}개 새로 계산)")
+
+
+if __name__ == "__main__":
+    main()
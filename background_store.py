@@ -0,0 +1,158 @@
+# 배경 이미지 카탈로그와 해상도별 피라미드 저장소
+# 빌드 단계에서 배경마다 preview / working / print 세 단계를 미리 만들어 두고,
+# 실행 중에는 index.json 과 원본 파일의 stat 만 확인한 뒤 필요한 단계만 지연 로딩한다.
+#
+#   preview : 긴 변 720px WebP (화면 미리보기)
+#   working : 원본 해상도 RGB 원시 배열 .npy (메모리 매핑으로 읽는다)
+#   print   : 원본의 2배 WebP (고해상도 출력)
+#
+# 빌드:
+#   python background_store.py build
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from resample import resize_image
+
+BACKGROUND_IMAGES = ["네잎클로버.jpg", '라이즈 소희.jpg', '라이즈 앤톤.jpg', '라이즈 원빈.jpg', '라이즈 은석.jpg',
+                     '물감.jpg', '물결.jpg', '바다.jpg', '비눗방울.jpg', '에스파 카리나.jpg', '투데이.jpg', '고양이.jpg',
+                     '동화.jpg', '노을.jpg', '어항 고양이.jpg', '어항.jpg', '화사한 고양이.jpg', '심해.jpg', '크리스마스.jpg']
+
+DEFAULT_STORE_DIR = os.getenv("BOOKMARK_PYRAMID_DIR", ".pyramid")
+PREVIEW_SIZE = (540, 720)
+PRINT_SCALE = 2
+TIER_ORDER = ("preview", "working", "print")
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def build_pyramid(paths, store_dir=DEFAULT_STORE_DIR, root=".", webp_quality=90):
+    # 배경마다 세 단계를 만들고 index.json 을 갱신한다. 원본이 바뀌지 않은 배경은 건너뛴다.
+    os.makedirs(store_dir, exist_ok=True)
+    index_path = os.path.join(store_dir, "index.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+
+    built = []
+    for path in paths:
+        source = os.path.join(root, path)
+        mtime_ns, size = _source_stat(source)
+        entry = index.get(path)
+        if entry and entry["mtime_ns"] == mtime_ns and entry["bytes"] == size:
+            continue
+
+        name = hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]
+        with Image.open(source) as image:
+            image = image.convert("RGB")
+        np.save(os.path.join(store_dir, f"{name}.working.npy"), np.asarray(image))
+
+        preview = image.copy()
+        preview.thumbnail(PREVIEW_SIZE, Image.LANCZOS)
+        preview.save(os.path.join(store_dir, f"{name}.preview.webp"), "WEBP", quality=webp_quality)
+
+        print_image = resize_image(image, (image.width * PRINT_SCALE, image.height * PRINT_SCALE))
+        print_image.save(os.path.join(store_dir, f"{name}.print.webp"), "WEBP", quality=webp_quality)
+
+        index[path] = {
+            "mtime_ns": mtime_ns,
+            "bytes": size,
+            "tiers": {
+                "preview": {"file": f"{name}.preview.webp", "size": list(preview.size)},
+                "working": {"file": f"{name}.working.npy", "size": list(image.size)},
+                "print": {"file": f"{name}.print.webp", "size": list(print_image.size)}
+            }
+        }
+        built.append(path)
+
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    return built
+
+
+class PyramidStore:
+    # 실행 중 피라미드 로더. index.json 이 바뀌면 다시 읽고, 원본보다 오래된 항목은 쓰지 않는다.
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        self.root = os.path.dirname(os.path.abspath(store_dir))
+        self._index = {}
+        self._index_mtime = None
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        index_path = os.path.join(self.store_dir, "index.json")
+        try:
+            mtime = os.stat(index_path).st_mtime_ns
+        except FileNotFoundError:
+            self._index, self._index_mtime = {}, None
+            return self._index
+        if mtime != self._index_mtime:
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            self._index = {os.path.normcase(os.path.join(self.root, path)): entry for path, entry in index.items()}
+            self._index_mtime = mtime
+        return self._index
+
+    def entry(self, path):
+        with self._lock:
+            entry = self._load_index().get(os.path.normcase(os.path.abspath(path)))
+        if entry is None:
+            return None
+        try:
+            if _source_stat(path) != (entry["mtime_ns"], entry["bytes"]):
+                return None
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def select_tier(self, path, min_size):
+        # min_size (너비, 높이) 이상인 가장 작은 단계, 없으면 가장 큰 단계를 고른다
+        entry = self.entry(path)
+        if entry is None:
+            return None
+        for tier in TIER_ORDER:
+            width, height = entry["tiers"][tier]["size"]
+            if width >= min_size[0] and height >= min_size[1]:
+                return tier
+        return TIER_ORDER[-1]
+
+    def load(self, path, tier):
+        # working 단계는 읽기 전용 메모리 매핑 배열, 나머지는 PIL 이미지로 돌려준다
+        entry = self.entry(path)
+        if entry is None:
+            return None
+        file_path = os.path.join(self.store_dir, entry["tiers"][tier]["file"])
+        if tier == "working":
+            return np.load(file_path, mmap_mode="r")
+        with Image.open(file_path) as image:
+            return image.convert("RGB")
+
+
+pyramid_store = PyramidStore()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="배경 이미지 피라미드 빌드")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("paths", nargs="*", help="배경 이미지 (기본값: 기본 카탈로그 전체)")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--quality", type=int, default=90, help="WebP 품질")
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.abspath(args.store_dir))
+    paths = [os.path.relpath(os.path.abspath(p), root) for p in args.paths] or BACKGROUND_IMAGES
+    built = build_pyramid(paths, args.store_dir, root=root, webp_quality=args.quality)
+    print(f"피라미드 빌드 완료: {len(built)}개 새로 생성, {len(paths) - len(built)}개 최신 상태")
+
+
+if __name__ == "__main__":
+    main()
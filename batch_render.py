@@ -0,0 +1,178 @@
+# 책갈피 일괄 생성 도구 (인쇄용)
+# JSONL 또는 CSV 작업 목록을 읽어 프로세스 풀에서 렌더링하고, 결과를 바로 디스크에 저장한다.
+#
+# 작업 항목 필드: quote, background, font, font_size, text_color, stroke_color, x, y, output(선택)
+#
+# 사용 예:
+#   python batch_render.py jobs.jsonl --out-dir out --format webp
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    import resource
+except ImportError:  # Windows 에는 resource 모듈이 없다
+    resource = None
+
+from background_store import BACKGROUND_IMAGES
+from bookmark_render import RENDER_MODES, render_bookmark
+from image_cache import adopt_shared_backgrounds, background_cache
+from shared_image import SharedArrayPool
+
+FORMATS = {
+    "png": ("PNG", "png"),
+    "jpeg": ("JPEG", "jpg"),
+    "jpg": ("JPEG", "jpg"),
+    "webp": ("WEBP", "webp")
+}
+
+DEFAULT_JOB = {
+    "font": "나눔손글씨 가람연꽃",
+    "font_size": 30,
+    "text_color": "#000000",
+    "stroke_color": "#FFFFFF",
+    "x": None,
+    "y": None
+}
+
+
+def read_jobs(path):
+    # 작업 목록을 한 줄씩 읽어 넘긴다 (전체를 메모리에 올리지 않는다)
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield {key: value for key, value in row.items() if value not in (None, "")}
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _optional_int(value):
+    return None if value in (None, "") else int(value)
+
+
+def render_job(index, job, out_dir, background_dir, image_format, quality, upscale_factor, render_mode):
+    # 워커 프로세스에서 실행된다. 이미지는 저장만 하고 메타데이터만 돌려보낸다.
+    started = time.perf_counter()
+    job = {**DEFAULT_JOB, **job}
+    pil_format, extension = FORMATS[image_format]
+    output = job.get("output") or f"{index:06d}.{extension}"
+    output_path = os.path.join(out_dir, output)
+    result = {"index": index, "output": output_path, "background": job.get("background")}
+    try:
+        # 작업 파일이 결과 폴더 밖(절대 경로, ..)에 쓰지 못하게 한다
+        root = os.path.abspath(out_dir)
+        if os.path.commonpath([os.path.abspath(output_path), root]) != root:
+            raise ValueError(f"결과 폴더 밖의 경로입니다: {output}")
+        image = render_bookmark(
+            os.path.join(background_dir, job["background"]),
+            job["quote"],
+            job["font"],
+            text_color=job["text_color"],
+            stroke_color=job["stroke_color"],
+            x=_optional_int(job["x"]),
+            y=_optional_int(job["y"]),
+            font_size=int(job["font_size"]),
+            upscale_factor=upscale_factor,
+            render_mode=render_mode
+        )
+        save_options = {} if pil_format == "PNG" else {"quality": quality}
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        image.save(output_path, pil_format, **save_options)
+        result.update(status="ok", size=list(image.size))
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def peak_rss_mb(children=False):
+    # 리눅스는 KB, macOS 는 바이트 단위로 돌려준다
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="책갈피 일괄 생성")
+    parser.add_argument("jobs", help="작업 목록 파일 (.jsonl 또는 .csv)")
+    parser.add_argument("--out-dir", default="bookmarks", help="결과 저장 폴더")
+    parser.add_argument("--background-dir", default=".", help="배경 이미지 폴더")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="png", help="저장 형식")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG/WebP 품질")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="워커 프로세스 수")
+    parser.add_argument("--upscale-factor", type=int, default=6)
+    parser.add_argument("--render-mode", choices=RENDER_MODES, default="region")
+    parser.add_argument("--manifest", default=None, help="매니페스트 경로 (기본값: <out-dir>/manifest.jsonl)")
+    parser.add_argument("--no-shared-backgrounds", action="store_true",
+                        help="카탈로그 배경을 공유 메모리로 워커에 넘기지 않는다")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.out_dir, "manifest.jsonl")
+    # 작업 목록이 아주 길어도 대기 중인 작업 수는 워커 수에 비례하도록 제한한다
+    max_pending = args.workers * 4
+    counts = {"ok": 0, "error": 0}
+
+    # 카탈로그 배경은 한 번만 디코딩해서 공유 메모리로 워커에 넘긴다 (워커가 끝난 뒤에 세그먼트를 지운다)
+    shared = SharedArrayPool()
+    descriptors = []
+    if not args.no_shared_backgrounds:
+        paths = [os.path.join(args.background_dir, name) for name in BACKGROUND_IMAGES]
+        descriptors = background_cache.share([path for path in paths if os.path.exists(path)], shared)
+
+    started = time.perf_counter()
+    with shared, ProcessPoolExecutor(max_workers=args.workers, initializer=adopt_shared_backgrounds,
+                                     initargs=(descriptors,)) as executor, \
+            open(manifest_path, "w", encoding="utf-8") as manifest:
+
+        def drain(futures):
+            for future in futures:
+                result = future.result()
+                counts[result["status"]] += 1
+                manifest.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+        pending = set()
+        for index, job in enumerate(read_jobs(args.jobs)):
+            pending.add(executor.submit(
+                render_job, index, job, args.out_dir, args.background_dir,
+                args.format, args.quality, args.upscale_factor, args.render_mode
+            ))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                drain(done)
+        drain(wait(pending).done)
+    elapsed = time.perf_counter() - started
+
+    total = counts["ok"] + counts["error"]
+    summary = {
+        "jobs": total,
+        "ok": counts["ok"],
+        "errors": counts["error"],
+        "seconds": round(elapsed, 3),
+        "bookmarks_per_sec": round(total / elapsed, 2) if elapsed else 0.0,
+        "workers": args.workers,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_worker_rss_mb": peak_rss_mb(children=True),
+        "manifest": manifest_path
+    }
+    with open(os.path.join(args.out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print(f"렌더링 완료: {summary['ok']}개 성공, {summary['errors']}개 실패, {summary['seconds']}초")
+    print(f"처리량: {summary['bookmarks_per_sec']}개/초 (워커 {args.workers}개)")
+    print(f"최대 RSS: 메인 {summary['peak_rss_mb']} MB, 워커 {summary['peak_worker_rss_mb']} MB")
+    return 0 if counts["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# 리샘플링 백엔드 벤치마크
+# 백엔드마다 별도 프로세스에서 배경을 upscale_factor 배 확대했다가 원래 크기로 줄이며,
+# 단계별 지연 시간과 최대 RSS, 그리고 pil 결과 대비 PSNR 을 보고한다.
+#
+# 사용 예:
+#   python bench_resample.py --image 크리스마스.jpg --factor 6 --repeat 5
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows 에는 resource 모듈이 없다
+    resource = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def run_worker(backend, image_path, factor, repeat, output_path):
+    # 자식 프로세스에서 실행된다. 결과는 JSON 한 줄로 표준 출력에 쓴다.
+    from PIL import Image
+
+    from resample import resize_array
+
+    with Image.open(image_path) as image:
+        array = np.asarray(image.convert("RGB"))
+    height, width = array.shape[:2]
+    baseline_rss = _peak_rss_mb()
+
+    upscale_times, downscale_times = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        upscaled = resize_array(array, (width * factor, height * factor), backend)
+        upscale_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        restored = resize_array(upscaled, (width, height), backend)
+        downscale_times.append(time.perf_counter() - started)
+        del upscaled
+
+    np.save(output_path, restored)
+    print(json.dumps({
+        "backend": backend,
+        "size": [width, height],
+        "factor": factor,
+        "upscale_ms": round(float(np.median(upscale_times)) * 1000, 1),
+        "downscale_ms": round(float(np.median(downscale_times)) * 1000, 1),
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": _peak_rss_mb()
+    }))
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def main(argv=None):
+    from resample import available_backends
+
+    parser = argparse.ArgumentParser(description="리샘플링 백엔드 벤치마크")
+    parser.add_argument("--image", default="크리스마스.jpg", help="벤치마크에 쓸 배경 이미지")
+    parser.add_argument("--factor", type=int, default=6, help="업스케일 배율")
+    parser.add_argument("--repeat", type=int, default=3, help="반복 횟수 (중앙값을 보고)")
+    parser.add_argument("--backends", nargs="*", default=None, help="측정할 백엔드 (기본값: 사용 가능한 전부)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON 으로 출력")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker, args.image, args.factor, args.repeat, args.output)
+        return
+
+    backends = args.backends or available_backends()
+    if "pil" in backends:
+        backends = ["pil"] + [b for b in backends if b != "pil"]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        for backend in backends:
+            outputs[backend] = os.path.join(tmp, f"{backend}.npy")
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", backend, "--image", args.image,
+                 "--factor", str(args.factor), "--repeat", str(args.repeat), "--output", outputs[backend]],
+                capture_output=True, text=True, check=True
+            )
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+        if "pil" in outputs:
+            reference = np.load(outputs["pil"])
+            for result in results:
+                result["psnr_vs_pil"] = round(psnr(reference, np.load(outputs[result["backend"]])), 2)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{args.image} {results[0]['size'][0]}x{results[0]['size'][1]}, x{args.factor}, 반복 {args.repeat}회 중앙값")
+    print(f"{'backend':<8} {'up(ms)':>9} {'down(ms)':>9} {'base RSS':>9} {'peak RSS':>9} {'PSNR':>7}")
+    for r in results:
+        print(f"{r['backend']:<8} {r['upscale_ms']:>9} {r['downscale_ms']:>9} "
+              f"{r['baseline_rss_mb']!s:>9} {r['peak_rss_mb']!s:>9} {r.get('psnr_vs_pil', '-')!s:>7}")
+
+
+if __name__ == "__main__":
+    main()
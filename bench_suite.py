@@ -0,0 +1,406 @@
+# 렌더링/글귀 경로 벤치마크 모음과 성능 회귀 검사
+# 묶음(suite)마다 별도 프로세스에서 실행해 지연 시간 백분위와 최대 RSS 를 재고, 결과를 JSON 이력 파일에 쌓는다.
+# 기준보다 p95 지연(--gate-stat 으로 p50 도 고를 수 있다)이나 최대 RSS 가 허용 비율 이상 나빠지면 종료 코드 1 로 끝난다.
+# p95 는 표본이 P95_MIN_SAMPLES 개 이상인 벤치마크에만 쓰고 (그보다 적으면 사실상 최댓값이다) 나머지는 p50 으로 검사하며
+# 그런 벤치마크가 있으면 따로 알려 준다.
+# 기준은 --baseline 으로 고른 label 의 실행이거나, 옵션이 같은 최근 통과 실행 BASELINE_RUNS 개의 벤치마크별 중앙값이다.
+# 회귀로 실패한 실행도 이력에는 남기지만 (passed: false) 기준으로는 쓰지 않는다. 그래서 한 번 느려진 결과가 다음 실행의
+# 기준이 되어 허용 범위가 조금씩 밀려 내려가지 않는다.
+#
+#   render  : render_bookmark (overlay_text_with_custom_font 본체) — 배경 카탈로그 x 글꼴 크기 x 줄 수 x 배율
+#   upscale : upscale_image 와 같은 배경 전체 확대 (resize_image, 설정된 리샘플링 백엔드)
+#   quote   : 스텁 OpenAI 서버를 상대로 한 QuoteService 요청 지연
+#   startup : Streamlit 스크립트의 첫 실행(새 프로세스, 모듈 가져오기 포함)과 재실행 시간 (AppTest)
+#
+# 사용 예:
+#   python bench_suite.py                     # 빠른 격자, 이력에 추가하고 최근 통과 실행들과 비교
+#   python bench_suite.py --full --label main # 전체 격자
+#   python bench_suite.py --suites render --max-regression 0.2 --no-record
+#   python bench_suite.py --gate-stat p50 --repeat 5     # 빨리 돌릴 때는 중앙값으로 검사
+#   python bench_suite.py --suites startup --apps ai.bk-v3.py ai.bk-v4.py
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows 에는 resource 모듈이 없다
+    resource = None
+
+SUITES = ("render", "upscale", "quote", "startup")
+FONT_SIZES = (10, 30, 60, 120, 200)
+LINE_COUNTS = (1, 2, 3, 4, 5)
+UPSCALE_FACTORS = (1, 2, 4, 6, 8)
+# 빠른 격자에서는 기본값을 두고 한 번에 한 가지만 바꾼다
+DEFAULT_CASE = {"font_size": 30, "lines": 2, "upscale_factor": 6}
+SAMPLE_LINES = ["오늘도 한 걸음씩", "천천히 가도 괜찮아요", "당신은 충분히 빛나요", "작은 용기가 큰 길을 만들어요", "내일은 더 따뜻할 거예요"]
+DEFAULT_HISTORY = "bench_history.json"
+DEFAULT_APPS = ("ai.bk-v3.py", "ai.bk-v4.py")
+# 회귀 검사에 쓸 수 있는 지연 통계
+GATE_STATS = ("p50", "p95")
+DEFAULT_GATE_STAT = "p95"
+# p95 로 검사하려면 벤치마크마다 이만큼의 표본이 있어야 한다 (기본 반복 횟수도 이 값이다)
+P95_MIN_SAMPLES = 20
+BASELINE_RUNS = 5
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # startup 묶음처럼 자식 프로세스에서 재는 경우도 있으므로 자식 쪽 최대값도 함께 본다
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def _summary(seconds):
+    values = np.asarray(seconds) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3)
+    }
+
+
+def _backgrounds(names):
+    # 실제로 있는 배경만, 픽셀 수가 작은 것부터
+    from PIL import Image
+
+    found = []
+    for name in names:
+        if os.path.exists(name):
+            with Image.open(name) as image:
+                found.append((image.width * image.height, name))
+    return [name for _, name in sorted(found)]
+
+
+def render_cases(backgrounds, full=False):
+    if full:
+        for background, font_size, lines, factor in itertools.product(backgrounds, FONT_SIZES, LINE_COUNTS,
+                                                                      UPSCALE_FACTORS):
+            yield {"background": background, "font_size": font_size, "lines": lines, "upscale_factor": factor}
+        return
+    # 가장 작은 배경과 가장 큰 배경에서 한 축씩 바꾼다
+    for background in sorted({backgrounds[0], backgrounds[-1]}, key=backgrounds.index):
+        seen = set()
+        for field, values in (("font_size", FONT_SIZES), ("lines", LINE_COUNTS), ("upscale_factor", UPSCALE_FACTORS)):
+            for value in values:
+                case = {**DEFAULT_CASE, field: value}
+                key = tuple(sorted(case.items()))
+                if key not in seen:
+                    seen.add(key)
+                    yield {"background": background, **case}
+
+
+def run_render(args):
+    from bookmark_render import render_bookmark, text_layer_cache
+    from image_cache import background_cache
+
+    groups = {}
+    backgrounds = _backgrounds(args.backgrounds)
+    if not backgrounds:
+        raise SystemExit("배경 이미지를 찾을 수 없습니다")
+    for case in render_cases(backgrounds, args.full):
+        text = "\n".join(SAMPLE_LINES[:case["lines"]])
+        background_cache.get_array(case["background"])  # 디코딩은 첫 호출에서만 (렌더링 자체를 잰다)
+        for _ in range(args.repeat):
+            text_layer_cache.clear()
+            started = time.perf_counter()
+            render_bookmark(case["background"], text, args.font, "#000000", "#FFFFFF", font_size=case["font_size"],
+                            upscale_factor=case["upscale_factor"], render_mode=args.render_mode)
+            elapsed = time.perf_counter() - started
+            for name in ("render", f"render/background={case['background']}", f"render/font_size={case['font_size']}",
+                         f"render/lines={case['lines']}", f"render/upscale_factor={case['upscale_factor']}"):
+                groups.setdefault(name, []).append(elapsed)
+    return groups
+
+
+def run_upscale(args):
+    from image_cache import background_cache
+    from resample import get_backend, resize_image
+
+    groups = {}
+    backend = get_backend()
+    for background in _backgrounds(args.backgrounds):
+        image = background_cache.get_image(background)
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            resize_image(image, (image.width * args.factor, image.height * args.factor), backend)
+            elapsed = time.perf_counter() - started
+            for name in (f"upscale/{backend}", f"upscale/{backend}/background={background}"):
+                groups.setdefault(name, []).append(elapsed)
+    return groups
+
+
+def run_quote(args):
+    import openai
+
+    from quote_service import QuoteCache, QuoteService
+    from stub_openai_server import StubOpenAIServer
+
+    server = StubOpenAIServer(("127.0.0.1", 0), latency=args.quote_latency).start()
+    openai.api_base = server.api_base
+    openai.api_key = openai.api_key or "stub-key"
+    service = QuoteService(cache=QuoteCache(":memory:"))
+
+    latencies = []
+    answers = [[f"답변{i % args.quote_distinct}", "가족", "아니요", "진로", "행복"] for i in range(args.quote_requests)]
+    futures = []
+    for answer in answers:
+        started = time.perf_counter()
+        future = service.submit(answer)
+        future.add_done_callback(lambda _, started=started: latencies.append(time.perf_counter() - started))
+        futures.append(future)
+    for future in futures:
+        future.result()
+    # 모든 답변이 캐시에 들어간 뒤의 적중 경로
+    cached = []
+    for answer in answers[:args.quote_distinct]:
+        started = time.perf_counter()
+        service.get_quote(answer)
+        cached.append(time.perf_counter() - started)
+    service.close()
+    server.shutdown()
+    return {"quote/cold": latencies, "quote/cached": cached}
+
+
+def run_startup_probe(args):
+    # 새 프로세스에서 스크립트 하나를 처음 실행하고 이어서 재실행한다. Streamlit 자체를 가져오는 시간은 빼고 잰다.
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.abspath(args.app), default_timeout=120)
+    app.secrets["OPENAI_API_KEY"] = "bench-key"
+    started = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - started
+    reruns = []
+    for _ in range(args.reruns):
+        started = time.perf_counter()
+        app.run()
+        reruns.append(time.perf_counter() - started)
+    if app.exception:
+        raise SystemExit(f"{args.app}: {app.exception[0].value}")
+    print(json.dumps({"cold": cold, "reruns": reruns, "modules": len(sys.modules)}))
+
+
+def run_startup(args):
+    # 첫 실행은 프로세스마다 한 번뿐이므로 repeat 만큼 새 프로세스를 띄운다
+    groups = {}
+    for app in args.apps:
+        name = os.path.basename(app)
+        for _ in range(args.repeat):
+            command = [sys.executable, os.path.abspath(__file__), "--worker", "startup-probe", "--app", app,
+                       "--reruns", str(args.reruns)]
+            completed = subprocess.run(command, capture_output=True, text=True, check=True)
+            probe = json.loads(completed.stdout.strip().splitlines()[-1])
+            groups.setdefault(f"startup/{name}/cold", []).append(probe["cold"])
+            groups.setdefault(f"startup/{name}/rerun", []).extend(probe["reruns"])
+    return groups
+
+
+RUNNERS = {"render": run_render, "upscale": run_upscale, "quote": run_quote, "startup": run_startup}
+
+
+def run_worker(args):
+    # 자식 프로세스에서 실행된다. 결과는 JSON 한 줄로 표준 출력에 쓴다.
+    if args.worker == "startup-probe":
+        run_startup_probe(args)
+        return
+    groups = RUNNERS[args.worker](args)
+    print(json.dumps({
+        "suite": args.worker,
+        "benchmarks": {name: _summary(values) for name, values in sorted(groups.items())},
+        "peak_rss_mb": _peak_rss_mb()
+    }, ensure_ascii=False))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def median_baseline(runs):
+    # 여러 실행에서 벤치마크마다 지연 통계의 중앙값, 묶음마다 최대 RSS 의 중앙값을 모은 기준
+    # (가장 좋은 값과 비교하면 운 좋은 한 번과 비교하게 되어 잡음만으로도 실패한다)
+    suites = {}
+    for run in runs:
+        for suite, result in run["suites"].items():
+            samples = suites.setdefault(suite, {"benchmarks": {}, "peak_rss_mb": []})
+            for name, stats in result["benchmarks"].items():
+                samples["benchmarks"].setdefault(name, []).append(stats)
+            if result.get("peak_rss_mb"):
+                samples["peak_rss_mb"].append(result["peak_rss_mb"])
+    baseline = {}
+    for suite, samples in suites.items():
+        benchmarks = {}
+        for name, runs_stats in samples["benchmarks"].items():
+            benchmarks[name] = {"count": min(stats["count"] for stats in runs_stats),
+                                **{f"{stat}_ms": round(float(np.median([stats[f"{stat}_ms"] for stats in runs_stats])), 3)
+                                   for stat in GATE_STATS}}
+        peak = round(float(np.median(samples["peak_rss_mb"])), 1) if samples["peak_rss_mb"] else None
+        baseline[suite] = {"benchmarks": benchmarks, "peak_rss_mb": peak}
+    return {"suites": baseline}
+
+
+def gate_stat_for(stats, gate_stat):
+    # 표본이 적은 벤치마크는 p95 대신 p50 으로 검사한다
+    if gate_stat == "p95" and stats["count"] < P95_MIN_SAMPLES:
+        return "p50"
+    return gate_stat
+
+
+def compare(baseline, current, max_regression, max_memory_regression, min_delta_ms=1.0,
+            gate_stat=DEFAULT_GATE_STAT):
+    # 기준 대비 나빠진 항목 목록 (양쪽에 모두 있는 벤치마크만 비교, min_delta_ms 보다 작은 차이는 잡음으로 본다)
+    failures = []
+    for suite, result in current["suites"].items():
+        base = baseline["suites"].get(suite)
+        if base is None:
+            continue
+        for name, stats in result["benchmarks"].items():
+            base_stats = base["benchmarks"].get(name)
+            if not base_stats:
+                continue
+            stat = gate_stat_for(stats, gate_stat)
+            key = f"{stat}_ms"
+            if base_stats[key] > 0:
+                change = stats[key] / base_stats[key] - 1
+                if change > max_regression and stats[key] - base_stats[key] > min_delta_ms:
+                    failures.append(f"{name}: {stat} {base_stats[key]}ms -> {stats[key]}ms (+{change:.0%})")
+        if base.get("peak_rss_mb") and result.get("peak_rss_mb"):
+            change = result["peak_rss_mb"] / base["peak_rss_mb"] - 1
+            if change > max_memory_regression:
+                failures.append(f"{suite}: peak RSS {base['peak_rss_mb']}MB -> {result['peak_rss_mb']}MB (+{change:.0%})")
+    return failures
+
+
+def main(argv=None):
+    from background_store import BACKGROUND_IMAGES
+    from bookmark_render import RENDER_MODES
+
+    parser = argparse.ArgumentParser(description="렌더링/글귀 경로 벤치마크와 회귀 검사")
+    parser.add_argument("--suites", nargs="*", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--full", action="store_true", help="배경 x 글꼴 크기 x 줄 수 x 배율 전체 격자")
+    parser.add_argument("--repeat", type=int, default=P95_MIN_SAMPLES)
+    parser.add_argument("--backgrounds", nargs="*", default=BACKGROUND_IMAGES)
+    parser.add_argument("--font", default="나눔손글씨 가람연꽃")
+    parser.add_argument("--render-mode", choices=RENDER_MODES, default="region")
+    parser.add_argument("--factor", type=int, default=6, help="upscale 묶음의 확대 배율")
+    parser.add_argument("--quote-requests", type=int, default=200)
+    parser.add_argument("--quote-distinct", type=int, default=20)
+    parser.add_argument("--quote-latency", type=float, default=0.05, help="스텁 서버 응답 지연 (초)")
+    parser.add_argument("--apps", nargs="*", default=list(DEFAULT_APPS), help="startup 묶음에서 잴 스크립트")
+    parser.add_argument("--reruns", type=int, default=10, help="startup 묶음에서 첫 실행 뒤 재실행 횟수")
+    parser.add_argument("--app", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="결과 이력 JSON 파일")
+    parser.add_argument("--label", default=None, help="이번 실행의 이름 (기준으로 고를 때 사용)")
+    parser.add_argument("--baseline", default=None,
+                        help=f"비교할 실행의 label (기본값: 옵션이 같은 최근 통과 실행 {BASELINE_RUNS}개의 중앙값)")
+    parser.add_argument("--gate-stat", choices=GATE_STATS, default=None,
+                        help=f"회귀 검사에 쓰는 지연 통계 (기본값: {DEFAULT_GATE_STAT}, "
+                             f"표본이 {P95_MIN_SAMPLES}개보다 적은 벤치마크는 p50)")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="허용하는 지연 증가 비율")
+    parser.add_argument("--max-p95-regression", type=float, default=None,
+                        help="--gate-stat p95 --max-regression 과 같다")
+    parser.add_argument("--max-memory-regression", type=float, default=0.10, help="허용하는 최대 RSS 증가 비율")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="이보다 작은 지연 차이는 무시한다")
+    parser.add_argument("--no-record", action="store_true", help="이력 파일에 추가하지 않는다")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.max_p95_regression is not None:
+        if args.gate_stat == "p50":
+            parser.error("--max-p95-regression 은 --gate-stat p50 과 함께 쓸 수 없습니다")
+        args.gate_stat, args.max_regression = "p95", args.max_p95_regression
+    args.gate_stat = args.gate_stat or DEFAULT_GATE_STAT
+
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    run = {
+        "label": args.label,
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {"full": args.full, "repeat": args.repeat, "render_mode": args.render_mode,
+                    "factor": args.factor, "resample_backend": os.getenv("BOOKMARK_RESAMPLE_BACKEND", "pil")},
+        "suites": {}
+    }
+    for suite in args.suites:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", suite, "--repeat", str(args.repeat),
+                   "--font", args.font, "--render-mode", args.render_mode, "--factor", str(args.factor),
+                   "--quote-requests", str(args.quote_requests), "--quote-distinct", str(args.quote_distinct),
+                   "--quote-latency", str(args.quote_latency), "--reruns", str(args.reruns),
+                   "--apps", *args.apps, "--backgrounds", *args.backgrounds]
+        if args.full:
+            command.append("--full")
+        completed = subprocess.run(command, capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        run["suites"][suite] = result
+        print(f"[{suite}] 최대 RSS {result['peak_rss_mb']}MB")
+        for name, stats in result["benchmarks"].items():
+            print(f"  {name:<48} n={stats['count']:<5} p50 {stats['p50_ms']:>9}ms  p95 {stats['p95_ms']:>9}ms")
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history, encoding="utf-8") as f:
+            history = json.load(f)
+
+    # passed 가 없는 예전 기록은 통과한 실행으로 본다
+    passing = [r for r in history if r.get("passed", True)]
+    baseline = None
+    if args.baseline:
+        baseline = next((r for r in reversed(passing) if r.get("label") == args.baseline), None)
+        if baseline is None:
+            print(f"통과한 기준 실행을 찾을 수 없습니다: {args.baseline}")
+        else:
+            name = baseline.get("label") or baseline.get("commit") or baseline["timestamp"]
+    else:
+        recent = [r for r in passing if r.get("options") == run["options"]][-BASELINE_RUNS:]
+        if recent:
+            baseline = median_baseline(recent)
+            name = f"옵션이 같은 최근 통과 실행 {len(recent)}개의 중앙값"
+
+    failures = []
+    if baseline is not None:
+        failures = compare(baseline, run, args.max_regression, args.max_memory_regression, args.min_delta_ms,
+                           args.gate_stat)
+        fallback = [benchmark for result in run["suites"].values() for benchmark, stats in result["benchmarks"].items()
+                    if gate_stat_for(stats, args.gate_stat) != args.gate_stat]
+        if fallback:
+            print(f"표본이 {P95_MIN_SAMPLES}개보다 적어 p50 으로 검사한 벤치마크 {len(fallback)}개: {', '.join(fallback)}")
+    run["passed"] = not failures
+
+    if not args.no_record:
+        history.append(run)
+        with open(args.history, "w", encoding="utf-8") as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+
+    if baseline is None:
+        print("비교할 기준 실행이 없습니다 (이번 결과를 기준으로 기록합니다)")
+        return 0
+    if failures:
+        print(f"성능 회귀 {len(failures)}건 (기준: {name}, 이번 실행은 기준으로 쓰지 않습니다)")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print(f"성능 회귀 없음 (기준: {name})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
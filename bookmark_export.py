@@ -0,0 +1,241 @@
+# 인쇄용 고해상도 책갈피 내보내기
+# 요청한 실제 크기(mm)와 DPI 로 책갈피를 가로 띠(strip) 단위로 그려서 곧바로 인코딩해 내보낸다.
+# 전체 해상도 프레임은 만들지 않으므로 최대 메모리는 출력 크기가 아니라 띠 크기(와 원본 배경 크기)에 비례한다.
+#
+#   png : 띠마다 행을 필터링해서 zlib 으로 이어서 압축하고 IDAT 청크로 바로 쓴다
+#   jpeg: 띠마다 같은 설정으로 JPEG 을 만든 뒤 스캔 데이터만 떼어 재시작 마커(RSTn)로 이어 붙인다
+#   pdf : 위의 JPEG 을 PDF 페이지에 그대로 담는다 (인쇄 시트는 여러 페이지, sheet_export.py 참고)
+#
+# 글귀 레이어(테두리/효과 포함)는 출력 해상도로, 띠 안에서도 TEXT_BAND_BYTES 크기의 가로 조각마다 위아래 효과 여백만
+# 더해 잘라서 그린다 (인쇄 해상도에서는 슈퍼샘플링 없이도 충분히 매끄럽다). 레이어는 마스크, 거리 변환(float32), 블러까지
+# 픽셀당 RGB 띠보다 몇 배 많은 메모리를 쓰므로 글귀 영역 전체나 띠 전체 크기로 만들지 않는다.
+import io
+import math
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from bookmark_render import STROKE_PX, _ink_box, layout_lines, render_text_layer, split_lines
+from font_registry import font_registry
+from image_cache import background_cache
+from metrics import stage, timed
+from text_effects import effect_margin, make_style
+
+EXPORT_FORMATS = ("png", "jpeg", "pdf")
+EXPORT_MIME_TYPES = {
+    "png": ("png", "image/png"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "pdf": ("pdf", "application/pdf")
+}
+DEFAULT_WIDTH_MM = 60
+DEFAULT_DPI = 300
+# 띠 하나의 RGB 버퍼 목표 크기
+STRIP_BYTES = 16 * 1024 * 1024
+# 글귀 레이어 조각 하나의 RGBA 버퍼 목표 크기 (중간 버퍼까지 합쳐 띠 하나 정도가 되게 한다)
+TEXT_BAND_BYTES = STRIP_BYTES // 4
+# 4:2:0 JPEG 의 MCU 높이. 마지막 띠를 빼고는 이 배수여야 스캔을 이어 붙일 수 있다.
+JPEG_MCU = 16
+MAX_RESTART_INTERVAL = 65535
+
+
+def export_size(image_path, width_mm=DEFAULT_WIDTH_MM, dpi=DEFAULT_DPI):
+    # 출력 픽셀 크기. 높이는 배경 비율을 따른다.
+    height, width = background_cache.get_array(image_path).shape[:2]
+    out_width = max(1, round(width_mm / 25.4 * dpi))
+    return out_width, max(1, round(out_width * height / width))
+
+
+def _strip_height(size, image_format, strip_height=None):
+    width = size[0]
+    rows = strip_height or max(JPEG_MCU, STRIP_BYTES // (width * 3))
+    rows = max(JPEG_MCU, rows // JPEG_MCU * JPEG_MCU)
+    if image_format in ("jpeg", "pdf"):
+        # 재시작 간격(띠 하나의 MCU 수)은 16비트를 넘을 수 없다
+        mcus_per_row = math.ceil(width / JPEG_MCU)
+        rows = min(rows, MAX_RESTART_INTERVAL // mcus_per_row * JPEG_MCU)
+        if rows < JPEG_MCU:
+            raise ValueError(f"JPEG 로 내보내기에는 너무 넓습니다: {width}px")
+    return rows
+
+
+def _strips(image_path, text, font_choice, text_color, stroke_color, x, y, font_size, upscale_factor,
+            wrap_width, style, size, rows):
+    # (시작 행, 띠 이미지) 를 위에서부터 차례로 만든다
+    out_width, out_height = size
+    source = background_cache.get_for_size(image_path, size)
+    original_height, original_width = background_cache.get_array(image_path).shape[:2]
+    # 원본 1픽셀이 출력에서 차지하는 픽셀 수. 화면 렌더링의 upscale_factor 자리에 들어간다.
+    scale = out_width / original_width
+
+    font = font_registry.get_font(font_choice, max(1, round(font_size * scale)))
+    lines = split_lines(text, font, wrap_width, scale)
+    if x is not None and y is not None:
+        x, y = x / upscale_factor * scale, y / upscale_factor * scale
+    positions = layout_lines(lines, font, x, y, size, scale)
+    margin = math.ceil(effect_margin(style) * scale)
+    box = _ink_box(lines, positions, font, 1, margin)
+    band_rows = max(margin, TEXT_BAND_BYTES // (4 * (box[2] - box[0]))) if box is not None else 0
+
+    source_scale = source.height / out_height
+    for top in range(0, out_height, rows):
+        bottom = min(out_height, top + rows)
+        with stage("export_strip"):
+            strip = source.resize((out_width, bottom - top), Image.LANCZOS,
+                                  box=(0, top * source_scale, source.width, bottom * source_scale))
+        if box is not None:
+            with stage("export_text"):
+                for band_top in range(max(top, box[1]), min(bottom, box[3]), band_rows):
+                    band_bottom = min(bottom, box[3], band_top + band_rows)
+                    # 조각 위아래로 효과가 번지는 거리(margin)만큼 더 그려야 경계의 테두리/블러가 이어진다
+                    clip = (box[0], max(box[1], band_top - margin), box[2], min(box[3], band_bottom + margin))
+                    layer = render_text_layer(lines, positions, font, text_color, stroke_color, clip, style, scale)
+                    layer = layer.crop((0, band_top - clip[1], layer.width, band_bottom - clip[1]))
+                    strip.paste(layer, (clip[0], band_top - top), layer)
+                    del layer
+        yield top, strip
+
+
+def _png_chunk(out, tag, data):
+    out.write(struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+
+def _write_png(out, strips, size, dpi):
+    width, height = size
+    out.write(b"\x89PNG\r\n\x1a\n")
+    _png_chunk(out, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    pixels_per_meter = round(dpi / 0.0254)
+    _png_chunk(out, b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1))
+
+    compressor = zlib.compressobj(6)
+    for _, strip in strips:
+        # Sub 필터: 각 바이트에서 왼쪽 픽셀 값을 뺀다 (사진 배경이 필터 없이보다 훨씬 잘 압축된다)
+        rows = np.asarray(strip).reshape(strip.height, width * 3)
+        filtered = np.empty((strip.height, width * 3 + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        np.subtract(rows[:, 3:], rows[:, :-3], out=filtered[:, 4:])
+        data = compressor.compress(filtered.tobytes())
+        if data:
+            _png_chunk(out, b"IDAT", data)
+    _png_chunk(out, b"IDAT", compressor.flush())
+    _png_chunk(out, b"IEND", b"")
+
+
+def _jpeg_segments(data):
+    # SOI 다음부터 SOS 헤더까지의 (마커, 세그먼트 바이트) 목록과 엔트로피 부호화된 스캔 데이터
+    segments = []
+    position = 2
+    while True:
+        marker = data[position + 1]
+        length = struct.unpack(">H", data[position + 2:position + 4])[0]
+        segments.append((marker, data[position:position + 2 + length]))
+        position += 2 + length
+        if marker == 0xDA:
+            return segments, data[position:-2]
+
+
+def _write_jpeg(out, strips, size, dpi, quality, rows):
+    width, height = size
+    restart_interval = math.ceil(width / JPEG_MCU) * (rows // JPEG_MCU)
+    for index, (_, strip) in enumerate(strips):
+        # 양자화/허프만 표가 띠마다 같도록 고정 설정(표준 허프만 표, 4:2:0)으로 인코딩한다
+        buffer = io.BytesIO()
+        strip.save(buffer, "JPEG", quality=quality, subsampling=2, optimize=False, progressive=False,
+                   dpi=(dpi, dpi))
+        segments, scan = _jpeg_segments(buffer.getvalue())
+        if index == 0:
+            out.write(b"\xff\xd8")
+            for marker, segment in segments:
+                if marker == 0xC0:
+                    # SOF0 의 높이를 전체 높이로 바꾼다
+                    segment = segment[:5] + struct.pack(">H", height) + segment[7:]
+                elif marker == 0xDA:
+                    out.write(b"\xff\xdd" + struct.pack(">HH", 4, restart_interval))
+                out.write(segment)
+        else:
+            # 재시작 마커에서 DC 예측값이 0 으로 돌아가므로 띠마다 따로 인코딩한 스캔을 그대로 이어 붙일 수 있다
+            out.write(bytes([0xFF, 0xD0 + (index - 1) % 8]))
+        out.write(scan)
+    out.write(b"\xff\xd9")
+
+
+class _CountingWriter:
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+
+    def write(self, data):
+        self.out.write(data)
+        self.count += len(data)
+
+
+def _write_pdf(out, strips, size, dpi, quality, rows):
+    _write_pdf_pages(out, [strips], 1, size, dpi, quality, rows)
+
+
+def _write_pdf_pages(out, pages, page_count, size, dpi, quality, rows):
+    # 페이지마다 JPEG(DCTDecode) 이미지 하나. pages 는 페이지별 띠 목록을 차례로 내놓고, 앞 페이지를 다 쓴 뒤에야
+    # 다음 페이지를 꺼내므로 페이지를 하나씩 그려도 된다. 이미지 길이는 다 쓴 뒤에 간접 객체로 적는다.
+    width, height = size
+    page_width, page_height = width / dpi * 72, height / dpi * 72
+    writer = _CountingWriter(out)
+    offsets = {}
+
+    def begin(number):
+        offsets[number] = writer.count
+        writer.write(f"{number} 0 obj\n".encode("ascii"))
+
+    # 페이지 하나는 페이지, 내용, 이미지, 이미지 길이 객체 4개 (3번부터)
+    kids = " ".join(f"{3 + 4 * index} 0 R" for index in range(page_count))
+    writer.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    begin(1)
+    writer.write(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+    begin(2)
+    writer.write(f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>\nendobj\n".encode("ascii"))
+    content = f"q {page_width:.3f} 0 0 {page_height:.3f} 0 0 cm /Im0 Do Q".encode("ascii")
+    for index, strips in enumerate(pages):
+        page = 3 + 4 * index
+        begin(page)
+        writer.write(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.3f} {page_height:.3f}] "
+                     f"/Resources << /XObject << /Im0 {page + 2} 0 R >> >> /Contents {page + 1} 0 R >>\nendobj\n"
+                     .encode("ascii"))
+        begin(page + 1)
+        writer.write(f"<< /Length {len(content)} >>\nstream\n".encode("ascii") + content + b"\nendstream\nendobj\n")
+        begin(page + 2)
+        writer.write(f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceRGB "
+                     f"/BitsPerComponent 8 /Filter /DCTDecode /Length {page + 3} 0 R >>\nstream\n".encode("ascii"))
+        image_start = writer.count
+        _write_jpeg(writer, strips, size, dpi, quality, rows)
+        image_length = writer.count - image_start
+        writer.write(b"\nendstream\nendobj\n")
+        begin(page + 3)
+        writer.write(f"{image_length}\nendobj\n".encode("ascii"))
+
+    xref = writer.count
+    writer.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode("ascii"))
+    for number in sorted(offsets):
+        writer.write(f"{offsets[number]:010d} 00000 n \n".encode("ascii"))
+    writer.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+
+
+@timed("export")
+def export_bookmark(out, image_path, text, font_choice, text_color, stroke_color, x=None, y=None, font_size=60,
+                    upscale_factor=6, wrap_width=None, stroke_px=STROKE_PX, shadow=None, glow=None,
+                    width_mm=DEFAULT_WIDTH_MM, dpi=DEFAULT_DPI, image_format="png", quality=95, strip_height=None):
+    # out: 바이너리 쓰기 가능한 객체 (파일, 소켓, 응답 스트림 등). 글귀 인자는 render_bookmark 와 같다.
+    # 출력 픽셀 크기 (너비, 높이) 를 돌려준다.
+    if image_format not in EXPORT_FORMATS:
+        raise ValueError(f"지원하지 않는 내보내기 형식입니다: {image_format}")
+    size = export_size(image_path, width_mm, dpi)
+    rows = _strip_height(size, image_format, strip_height)
+    strips = _strips(image_path, text, font_choice, text_color, stroke_color, x, y, font_size, upscale_factor,
+                     wrap_width, make_style(stroke_px, shadow, glow), size, rows)
+    if image_format == "png":
+        _write_png(out, strips, size, dpi)
+    elif image_format == "jpeg":
+        _write_jpeg(out, strips, size, dpi, quality, rows)
+    else:
+        _write_pdf(out, strips, size, dpi, quality, rows)
+    return size
@@ -0,0 +1,250 @@
+# 책갈피 렌더링 핵심 로직
+# Streamlit 스크립트(ai.bk-v3.py, ai.bk-v4.py)와 다른 도구들이 함께 사용한다.
+# 오류는 예외로 올려 보내고, 화면에 보여주는 일은 호출하는 쪽에서 처리한다.
+import math
+import os
+
+from PIL import Image, ImageDraw
+
+from font_registry import font_registry
+from image_cache import LRUByteCache, background_cache
+from metrics import stage, timed
+from resample import get_backend, resize_image
+from text_effects import compose_text_layer, effect_margin, make_style
+from text_layout import fit_font_size, layout_block, measure_line, wrap_lines
+
+# 출력 픽셀 기준 기본 테두리 두께 (upscale_factor 와 무관하게 같은 두께로 보인다)
+STROKE_PX = 1.5
+# 출력 픽셀 기준 줄 간격
+LINE_GAP = 10
+
+# LANCZOS 필터는 축소 시 출력 픽셀 기준 양쪽 3픽셀까지 영향을 준다
+LANCZOS_SUPPORT = 3
+
+RENDER_MODES = ("region", "full")
+
+# 자동 맞춤 시 책갈피 가장자리에 남기는 여백 (배경 크기 대비 비율)
+FIT_MARGIN = 0.08
+
+
+class RenderCancelled(Exception):
+    # should_cancel 콜백이 참을 돌려주면 렌더링을 중단한다
+    pass
+
+
+def _check_cancelled(should_cancel):
+    if should_cancel is not None and should_cancel():
+        raise RenderCancelled()
+
+# 축소까지 끝난 글귀 레이어 캐시 (글귀, 글꼴, 크기, 테두리, 색상, 위상 기준)
+TEXT_LAYER_CACHE_BYTES = int(os.getenv("BOOKMARK_TEXT_CACHE_BYTES", 64 * 1024 * 1024))
+text_layer_cache = LRUByteCache(TEXT_LAYER_CACHE_BYTES)
+
+
+def load_font(font_choice, font_size, upscale_factor):
+    # 같은 (글꼴, 크기) 는 한 번만 파싱한다 (font_registry.py 참고)
+    return font_registry.get_font(font_choice, font_size * upscale_factor)
+
+
+def split_lines(text, font, wrap_width=None, upscale_factor=1):
+    # wrap_width 는 출력 픽셀 기준 최대 줄 너비 (None 이면 줄바꿈 문자로만 나눈다)
+    max_width = wrap_width * upscale_factor if wrap_width else None
+    return wrap_lines(text, font, max_width)
+
+
+def layout_lines(lines, font, x, y, high_res_size, upscale_factor):
+    # 각 줄을 그릴 고해상도 좌표 목록을 돌려준다.
+    # 줄 간격(LINE_GAP)은 가운데 정렬 계산과 배치 모두 출력 픽셀 기준으로 같게 적용한다.
+    block = layout_block(lines, font, gap=LINE_GAP * upscale_factor)
+    if x is None or y is None:
+        x = (high_res_size[0] - block.width) / 2
+        y = (high_res_size[1] - block.height) / 2
+    return [(x, y + offset) for offset in block.offsets]
+
+
+def fit_text(image_path, text, font_choice, min_size=10, max_size=200, margin=FIT_MARGIN):
+    # 배경에서 여백을 뺀 영역에 줄바꿈까지 해서 들어가는 가장 큰 글꼴 크기(pt)와 줄바꿈 너비를 돌려준다.
+    # 측정은 출력 해상도(배율 1)에서 하므로 업스케일 렌더링 없이 끝난다.
+    height, width = background_cache.get_array(image_path).shape[:2]
+    box = (int(width * (1 - 2 * margin)), int(height * (1 - 2 * margin)))
+    font_size = fit_font_size(text, lambda size: font_registry.get_font(font_choice, size), box, min_size, max_size,
+                              gap=LINE_GAP)
+    return font_size, box[0]
+
+
+def _render_full(image, original_size, lines, font, text_color, stroke_color, style, x, y, upscale_factor,
+                 should_cancel=None):
+    # 기존 방식: 업스케일된 배경 전체에 글귀를 그리고 다시 축소한다
+    high_res_size = image.size
+    with stage("draw"):
+        positions = layout_lines(lines, font, x, y, high_res_size, upscale_factor)
+        box = _ink_box(lines, positions, font, upscale_factor, effect_margin(style) * upscale_factor)
+        if box is not None:
+            layer = render_text_layer(lines, positions, font, text_color, stroke_color, box, style, upscale_factor)
+            image.paste(layer, box[:2], layer)
+
+    _check_cancelled(should_cancel)
+    with stage("downscale"):
+        return resize_image(image, original_size)
+
+
+def _ink_box(lines, positions, font, upscale_factor, margin=0):
+    # 글귀(테두리와 효과 포함)가 차지하는 고해상도 영역을 upscale_factor 배수로 맞춰 구한다
+    # 줄 크기는 배치 때 캐시해 둔 측정값을 쓰고, margin(고해상도 픽셀)만큼 넓힌다
+    boxes = []
+    for line, (line_x, line_y) in zip(lines, positions):
+        if line:
+            left, top, right, bottom = measure_line(font, line)
+            boxes.append((line_x + left - margin, line_y + top - margin,
+                          line_x + right + margin, line_y + bottom + margin))
+    if not boxes:
+        return None
+
+    pad = LANCZOS_SUPPORT * upscale_factor
+    left = math.floor((min(box[0] for box in boxes) - pad) / upscale_factor) * upscale_factor
+    top = math.floor((min(box[1] for box in boxes) - pad) / upscale_factor) * upscale_factor
+    right = math.ceil((max(box[2] for box in boxes) + pad) / upscale_factor) * upscale_factor
+    bottom = math.ceil((max(box[3] for box in boxes) + pad) / upscale_factor) * upscale_factor
+    return left, top, right, bottom
+
+
+def render_text_layer(lines, positions, font, text_color, stroke_color, box, style, scale):
+    # 글귀 영역만 RGBA 레이어로 그린다. 글자 마스크는 테두리 없이 한 번만 래스터화하고
+    # 테두리와 효과는 text_effects 에서 마스크로부터 만든다 (scale: 출력 1픽셀당 레이어 픽셀 수).
+    left, top, right, bottom = box
+    fill_mask = Image.new("L", (right - left, bottom - top), 0)
+    fill_draw = ImageDraw.Draw(fill_mask)
+    for line, (line_x, line_y) in zip(lines, positions):
+        fill_draw.text((line_x - left, line_y - top), line, fill=255, font=font)
+    return compose_text_layer(fill_mask, text_color, stroke_color, style, scale)
+
+
+@timed("text_layer")
+def _build_text_layer(lines, positions, font, text_color, stroke_color, style, upscale_factor):
+    # 고해상도로 그린 글귀 레이어를 출력 해상도로 축소하고, 격자 원점 기준 오프셋과 함께 돌려준다
+    box = _ink_box(lines, positions, font, upscale_factor, effect_margin(style) * upscale_factor)
+    if box is None:
+        return None, 0
+
+    layer = render_text_layer(lines, positions, font, text_color, stroke_color, box, style, upscale_factor)
+    layer = resize_image(layer, (layer.width // upscale_factor, layer.height // upscale_factor))
+    offset = (box[0] // upscale_factor, box[1] // upscale_factor)
+    return (layer, offset), layer.width * layer.height * 4
+
+
+def _region_layer(original_size, lines, font, text_color, stroke_color, style, x, y, upscale_factor,
+                  should_cancel=None):
+    # 출력 해상도로 축소된 글귀 레이어와 붙일 위치(출력 픽셀). 글귀가 비어 있으면 None.
+    high_res_size = (original_size[0] * upscale_factor, original_size[1] * upscale_factor)
+
+    with stage("layout"):
+        positions = layout_lines(lines, font, x, y, high_res_size, upscale_factor)
+
+    # 위치를 출력 픽셀 격자(base)와 격자 안의 위상(phase)으로 나눈다.
+    # 위상이 같으면 레이어가 똑같으므로 위치만 바뀐 경우에는 캐시된 레이어를 새 위치에 붙이기만 한다.
+    origin_x, origin_y = positions[0]
+    base_x = math.floor(origin_x / upscale_factor)
+    base_y = math.floor(origin_y / upscale_factor)
+    phase = (origin_x - base_x * upscale_factor, origin_y - base_y * upscale_factor)
+    relative_positions = [(line_x - origin_x + phase[0], line_y - origin_y + phase[1]) for line_x, line_y in positions]
+
+    key = (tuple(lines), font.path, font.size, style, text_color, stroke_color, upscale_factor, phase, get_backend())
+    _check_cancelled(should_cancel)
+    cached = text_layer_cache.get_or_create(
+        key,
+        lambda: _build_text_layer(lines, relative_positions, font, text_color, stroke_color, style, upscale_factor)
+    )
+    if cached is None:
+        return None
+    layer, (offset_x, offset_y) = cached
+    return layer, (base_x + offset_x, base_y + offset_y)
+
+
+def _render_region(image, lines, font, text_color, stroke_color, style, x, y, upscale_factor, should_cancel=None):
+    # 글귀가 들어가는 영역만 슈퍼샘플링해서 원본 해상도 배경 위에 합성한다
+    # image 는 캐시에서 복사해 온 RGB 이미지이므로 그대로 합성해도 된다
+    region = _region_layer(image.size, lines, font, text_color, stroke_color, style, x, y, upscale_factor,
+                           should_cancel)
+    if region is None:
+        return image
+
+    layer, position = region
+    _check_cancelled(should_cancel)
+    with stage("composite"):
+        image.paste(layer, position, layer)
+    return image
+
+
+def text_layer_stats():
+    # 글귀 레이어 캐시와 글꼴 캐시의 적중/실패 횟수
+    stats = text_layer_cache.stats()
+    font_stats = font_registry.stats()
+    stats["font_hits"] = font_stats["hits"]
+    stats["font_misses"] = font_stats["misses"]
+    stats["font_entries"] = font_stats["entries"]
+    return stats
+
+
+@timed("draft")
+def render_draft(image_path, text, font_choice, text_color, stroke_color, x=None, y=None,
+                 font_size=60, upscale_factor=6, wrap_width=None, stroke_px=STROKE_PX, shadow=None, glow=None):
+    # 슈퍼샘플링 없이 원본 해상도에 바로 그리는 초안 (조작 중 미리보기용).
+    # 좌표는 render_bookmark 와 같은 결과가 나오도록 원본 해상도로 환산하고, 테두리와 효과는 출력 픽셀 기준이라 그대로 쓴다.
+    image = background_cache.get_image(image_path)
+    font = load_font(font_choice, font_size, 1)
+    style = make_style(stroke_px, shadow, glow)
+    lines = split_lines(text, font, wrap_width)
+    if x is not None and y is not None:
+        x, y = x / upscale_factor, y / upscale_factor
+
+    positions = layout_lines(lines, font, x, y, image.size, 1)
+    box = _ink_box(lines, positions, font, 1, effect_margin(style))
+    if box is not None:
+        layer = render_text_layer(lines, positions, font, text_color, stroke_color, box, style, 1)
+        image.paste(layer, box[:2], layer)
+    return image
+
+
+@timed("text_overlay")
+def render_text_overlay(image_path, text, font_choice, text_color, stroke_color, x=None, y=None,
+                        font_size=60, upscale_factor=6, wrap_width=None, stroke_px=STROKE_PX, shadow=None, glow=None):
+    # 배경 없이 글귀 레이어(RGBA)와 붙일 위치(출력 픽셀)만 돌려준다. 글귀가 비어 있으면 None.
+    # render_bookmark(render_mode="region") 가 배경에 붙이는 레이어와 같으므로 브라우저에서 합성해도 결과가 같다.
+    with stage("decode"):
+        height, width = background_cache.get_array(image_path).shape[:2]
+    font = load_font(font_choice, font_size, upscale_factor)
+    lines = split_lines(text, font, wrap_width, upscale_factor)
+    return _region_layer((width, height), lines, font, text_color, stroke_color, make_style(stroke_px, shadow, glow),
+                         x, y, upscale_factor)
+
+
+@timed("render")
+def render_bookmark(image_path, text, font_choice, text_color, stroke_color, x=None, y=None,
+                    font_size=60, upscale_factor=6, render_mode="region", should_cancel=None, wrap_width=None,
+                    stroke_px=STROKE_PX, shadow=None, glow=None):
+    # x, y 는 기존과 같이 업스케일된 좌표계 기준이다
+    # wrap_width (출력 픽셀) 를 넘기면 그 너비에 맞춰 자동으로 줄을 바꾼다
+    # stroke_px 는 출력 픽셀 기준 테두리 두께, shadow / glow 는 True 또는 설정 dict 로 켠다 (text_effects.py)
+    # should_cancel 을 넘기면 단계 사이마다 확인해서 RenderCancelled 로 중단한다
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"지원하지 않는 렌더링 모드입니다: {render_mode}")
+
+    # 배경은 디코딩 캐시에서 가져온다 (파일이 바뀌면 수정 시각으로 무효화된다)
+    with stage("decode"):
+        height, width = background_cache.get_array(image_path).shape[:2]
+    with stage("font"):
+        font = load_font(font_choice, font_size, upscale_factor)
+    with stage("layout"):
+        lines = split_lines(text, font, wrap_width, upscale_factor)
+    style = make_style(stroke_px, shadow, glow)
+    _check_cancelled(should_cancel)
+
+    if render_mode == "full":
+        with stage("upscale"):
+            high_res_image = background_cache.get_upscaled(image_path, upscale_factor)
+        _check_cancelled(should_cancel)
+        return _render_full(high_res_image, (width, height), lines, font, text_color, stroke_color, style, x, y,
+                            upscale_factor, should_cancel)
+    with stage("background"):
+        image = background_cache.get_image(image_path)
+    return _render_region(image, lines, font, text_color, stroke_color, style, x, y, upscale_factor, should_cancel)
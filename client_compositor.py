@@ -0,0 +1,123 @@
+# 브라우저 합성 미리보기 (Streamlit 사용자 컴포넌트, assets/compositor/index.html)
+# 위치나 색을 바꿀 때마다 서버가 책갈피 전체를 합성/인코딩해 st.image 로 보내는 대신,
+#
+#   - 배경은 원본 파일 바이트를 내용 해시와 함께 세션마다 한 번만 보낸다 (브라우저가 해시로 보관한다)
+#   - 서버는 작은 투명 글귀 레이어만 만들어 보내고 (위상이 같으면 같은 레이어라 해시만 간다)
+#   - 브라우저가 캔버스에서 레이어를 슬라이더 위치에 붙인다
+#
+# 레이어는 render_bookmark(render_mode="region") 가 배경에 붙이는 것과 같으므로 결과도 같다.
+# 인쇄용 내보내기는 지금처럼 서버에서 전체 품질로 합성한다.
+# 세션이 보낸 해시는 st.session_state 에 브라우저 보관 한도보다 작게 기록하고, 브라우저에 없는 해시가
+# 가면 (새로 고침, 놓친 메시지) 컴포넌트가 missing 으로 알려 와서 다음 실행에서 다시 보낸다.
+import base64
+import hashlib
+import io
+import os
+from collections import OrderedDict
+
+import streamlit as st
+import streamlit.components.v1 as components
+from PIL import Image
+
+from app_assets import ASSET_DIR
+from bookmark_render import STROKE_PX, render_text_overlay
+from image_cache import LRUByteCache, background_cache
+from metrics import metrics, stage
+from render_cache import PNG_COMPRESS_LEVEL, file_digest
+
+# 브라우저 쪽 한도(MAX_BACKGROUNDS=16, MAX_LAYERS=128)보다 작게 잡아 브라우저가 먼저 버리지 않게 한다
+SENT_BACKGROUNDS = 8
+SENT_LAYERS = 64
+# 그대로 보낼 수 있는 배경 형식 (나머지와 EXIF 회전이 있는 파일은 디코딩 결과를 JPEG 로 다시 인코딩한다)
+RAW_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+BACKGROUND_QUALITY = 92
+EXIF_ORIENTATION = 0x0112
+
+_component = components.declare_component("bookmark_compositor", path=os.path.join(ASSET_DIR, "compositor"))
+_payload_cache = LRUByteCache(int(os.getenv("BOOKMARK_COMPOSITOR_CACHE_BYTES", 64 * 1024 * 1024)))
+
+
+def _data_url(mime, data):
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def _background_payload(image_path):
+    # (해시, data URL). 서버가 디코딩한 배경과 픽셀이 같은 경우에만 원본 파일을 그대로 보낸다.
+    digest = file_digest(image_path)
+
+    def build():
+        with Image.open(image_path) as image:
+            mime = RAW_FORMATS.get(image.format)
+            if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+                mime = None
+        if mime is not None:
+            with open(image_path, "rb") as f:
+                data = f.read()
+        else:
+            buffer = io.BytesIO()
+            Image.fromarray(background_cache.get_array(image_path)).save(buffer, "JPEG", quality=BACKGROUND_QUALITY)
+            data, mime = buffer.getvalue(), "image/jpeg"
+        url = _data_url(mime, data)
+        return url, len(url)
+
+    return digest, _payload_cache.get_or_create(("background", digest), build)
+
+
+def _layer_payload(layer):
+    buffer = io.BytesIO()
+    layer.save(buffer, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    data = buffer.getvalue()
+    return hashlib.sha1(data).hexdigest(), _data_url("image/png", data)
+
+
+def _sent(kind):
+    # 이 세션이 브라우저에 보낸 해시 (최근 사용 순서)
+    return st.session_state.setdefault(f"compositor_sent_{kind}", OrderedDict())
+
+
+def _item(kind, limit, digest, data):
+    # 이미 보낸 해시면 데이터 없이 해시만 보낸다
+    sent = _sent(kind)
+    item = {"hash": digest, "data": None}
+    if digest in sent:
+        sent.move_to_end(digest)
+    else:
+        item["data"] = data
+        sent[digest] = True
+        while len(sent) > limit:
+            sent.popitem(last=False)
+    return item
+
+
+def client_preview(image_path, text, font_choice, text_color, stroke_color, x=None, y=None, font_size=60,
+                   upscale_factor=6, wrap_width=None, stroke_px=STROKE_PX, shadow=None, glow=None, caption="",
+                   key="compositor"):
+    # 브라우저 합성 미리보기를 그린다. 이번 실행에 보낸 바이트 수를 돌려준다.
+    report_key = f"{key}_report"
+    reported = st.session_state.get(key)
+    if isinstance(reported, dict) and reported.get("report") != st.session_state.get(report_key):
+        # 브라우저에 없는 해시가 있었다 -> 기록에서 지우고 이번에 다시 보낸다
+        st.session_state[report_key] = reported.get("report")
+        for kind in ("backgrounds", "layers"):
+            sent = _sent(kind)
+            for digest in reported.get("missing", []):
+                sent.pop(digest, None)
+
+    digest, background_url = _background_payload(image_path)
+    background = _item("backgrounds", SENT_BACKGROUNDS, digest, background_url)
+
+    with stage("client_layer"):
+        region = render_text_overlay(image_path, text, font_choice, text_color, stroke_color, x=x, y=y,
+                                     font_size=font_size, upscale_factor=upscale_factor, wrap_width=wrap_width,
+                                     stroke_px=stroke_px, shadow=shadow, glow=glow)
+    layer = None
+    if region is not None:
+        image, (left, top) = region
+        layer_digest, layer_url = _layer_payload(image)
+        layer = _item("layers", SENT_LAYERS, layer_digest, layer_url)
+        layer.update(left=left, top=top)
+
+    sent_bytes = len(background["data"] or "") + len((layer or {}).get("data") or "")
+    metrics.increment("compositor_bytes", sent_bytes)
+    _component(background=background, layer=layer, caption=caption, key=key, default=None)
+    return sent_bytes
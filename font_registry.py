@@ -0,0 +1,149 @@
+# 글꼴 레지스트리
+# 처음 쓸 때 글꼴 폴더를 한 번만 훑어서 실제로 열리고 글자가 그려지는 글꼴만 등록한다.
+# 글꼴 이름은 파일 이름(확장자 제외)이고, 화면의 글꼴 선택 목록도 여기서 가져온다.
+#
+#   - 글꼴 파일은 등록할 때 한 번 읽어 메모리에 두고, 크기별 FreeTypeFont 는 모두 같은 바이트를 공유한다.
+#   - FreeTypeFont 는 (글꼴, 픽셀 크기) 마다 한 번만 만들어 LRU 로 보관한다 (배치 결과가 달라지지 않도록 크기는 반올림하지 않는다).
+#   - 등록되지 않은 이름을 고르면 파일을 다시 찾지 않고 기본 글꼴로 바꿔 쓴다.
+#
+# 폴더는 BOOKMARK_FONT_DIRS (os.pathsep 로 구분) 로 바꿀 수 있다. 기본값은 fonts 폴더와 현재 폴더.
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from PIL import ImageFont
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+DEFAULT_FONT_DIRS = tuple(filter(None, os.getenv("BOOKMARK_FONT_DIRS", os.pathsep.join(("fonts", "."))).split(os.pathsep)))
+DEFAULT_FAMILY = "나눔손글씨 가람연꽃"
+# 검증할 때 그려 보는 글자
+SAMPLE_TEXT = "가A"
+# 미리 만들어 두는 픽셀 크기: 초안(배율 1)과 완성본(배율 6)의 기본 글귀 크기 30pt
+PRELOAD_SIZES = (30, 180)
+MAX_FONTS = int(os.getenv("BOOKMARK_FONT_CACHE_SIZE", 64))
+
+FontFace = namedtuple("FontFace", ["family", "path", "name", "style"])
+
+
+# 앱에서는 IOError 로 함께 처리된다
+class FontNotFoundError(OSError):
+    pass
+
+
+def _validate(data):
+    # 글꼴을 열어 보고 예시 글자가 실제로 그려지는지 확인한다. 문제가 있으면 OSError.
+    font = ImageFont.truetype(io.BytesIO(data), 16)
+    left, top, right, bottom = font.getbbox(SAMPLE_TEXT)
+    if right <= left or bottom <= top:
+        raise OSError("예시 글자를 그릴 수 없습니다")
+    return font.getname()
+
+
+class FontRegistry:
+    def __init__(self, dirs=DEFAULT_FONT_DIRS, max_fonts=MAX_FONTS):
+        self.dirs = tuple(dirs)
+        self.max_fonts = max_fonts
+        self._faces = None
+        self._data = {}
+        self._digests = {}
+        self._rejected = {}
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def scan(self):
+        # 폴더를 (다시) 훑는다. 앞쪽 폴더에 있는 같은 이름의 글꼴이 우선한다.
+        faces, data, rejected = {}, {}, {}
+        for directory in self.dirs:
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                family, extension = os.path.splitext(filename)
+                if extension.lower() not in FONT_EXTENSIONS or family in faces:
+                    continue
+                path = os.path.abspath(os.path.join(directory, filename))
+                try:
+                    with open(path, "rb") as f:
+                        content = f.read()
+                    name, style = _validate(content)
+                except (OSError, ValueError) as e:
+                    rejected[path] = str(e)
+                    continue
+                faces[family] = FontFace(family, path, name, style)
+                data[family] = content
+        with self._lock:
+            self._faces, self._data, self._rejected = faces, data, rejected
+            self._digests.clear()
+            self._fonts.clear()
+        return list(faces)
+
+    def _ensure_scanned(self):
+        if self._faces is None:
+            self.scan()
+        return self._faces
+
+    def families(self):
+        # 기본 글꼴을 맨 앞에 두고 나머지는 이름 순서
+        faces = self._ensure_scanned()
+        return sorted(faces, key=lambda family: (family != DEFAULT_FAMILY, family))
+
+    def resolve(self, family):
+        # 없는 이름이면 기본 글꼴, 그것도 없으면 첫 번째 글꼴
+        faces = self._ensure_scanned()
+        face = faces.get(family) or faces.get(DEFAULT_FAMILY)
+        if face is None:
+            if not faces:
+                raise FontNotFoundError(f"사용할 수 있는 글꼴이 없습니다 (찾은 폴더: {', '.join(self.dirs)})")
+            face = faces[self.families()[0]]
+        return face
+
+    def get_font(self, family, size):
+        face = self.resolve(family)
+        key = (face.family, size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+        font = ImageFont.truetype(io.BytesIO(self._data[face.family]), size)
+        # 메모리에서 열면 path 가 BytesIO 가 되므로 원래 파일 경로로 되돌린다 (글귀 레이어 캐시 키와 font_variant 에 쓰인다)
+        font.path = face.path
+        with self._lock:
+            self._fonts[key] = font
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+        return font
+
+    def digest(self, family):
+        # 글꼴 파일 내용의 해시 (렌더링 결과 캐시 키에 쓴다). 같은 이름의 다른 파일로 바뀌면 값도 바뀐다.
+        face = self.resolve(family)
+        with self._lock:
+            digest = self._digests.get(face.family)
+            if digest is None:
+                digest = self._digests[face.family] = hashlib.sha256(self._data[face.family]).hexdigest()
+        return digest
+
+    def preload(self, sizes=PRELOAD_SIZES):
+        for family in self.families():
+            for size in sizes:
+                self.get_font(family, size)
+
+    def stats(self):
+        faces = self._ensure_scanned()
+        with self._lock:
+            return {
+                "families": len(faces),
+                "rejected": dict(self._rejected),
+                "bytes": sum(len(content) for content in self._data.values()),
+                "entries": len(self._fonts),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+font_registry = FontRegistry()
@@ -0,0 +1,191 @@
+# 디코딩된 배경 이미지 캐시
+# 프로세스 전체에서 공유되며, 여러 세션이 같은 배경을 고르더라도 JPEG 디코딩은 한 번만 일어난다.
+# 키는 (파일 경로, 수정 시각, 변형 종류) 이고, 바이트 예산을 넘으면 가장 오래 쓰지 않은 항목부터 버린다.
+# 피라미드(background_store.py)가 빌드되어 있으면 JPEG 대신 미리 만든 단계를 읽는다.
+# 워커 프로세스는 부모가 공유 메모리에 올린 배경을 adopt() 로 받아 디코딩 없이 쓴다 (shared_image.py).
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from background_store import PREVIEW_SIZE, pyramid_store
+from resample import get_backend, resize_image
+from shared_image import attach
+
+DEFAULT_MAX_BYTES = int(os.getenv("BOOKMARK_BG_CACHE_BYTES", 512 * 1024 * 1024))
+# 캐시에 없다는 표시 (None 도 캐시할 수 있는 값이다. 예: 글자가 없는 텍스트 레이어)
+_MISSING = object()
+
+
+class LRUByteCache:
+    # 바이트 예산 기반 LRU 캐시 (스레드 안전)
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            # 예산보다 큰 항목은 캐시하지 않는다
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            self._evict()
+
+    def get_or_create(self, key, factory):
+        # 같은 키를 동시에 요청하면 한 스레드만 factory 를 실행하고 나머지는 결과를 기다린다
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+            try:
+                value, nbytes = factory()
+                self.put(key, value, nbytes)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return value
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.current_bytes -= nbytes
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array, array.nbytes
+
+
+class BackgroundCache:
+    # 배경 이미지별로 원본 RGB 배열, 미리보기 썸네일, 업스케일 변형을 보관한다
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self._cache = LRUByteCache(max_bytes)
+
+    def _key(self, path, variant):
+        path = os.path.abspath(path)
+        return (path, os.stat(path).st_mtime_ns, variant)
+
+    def get_array(self, path):
+        def decode():
+            # 피라미드의 working 단계는 메모리 매핑이라 디코딩 없이 바로 쓸 수 있다
+            working = pyramid_store.load(path, "working")
+            if working is not None:
+                return _readonly(working)
+            with Image.open(path) as image:
+                return _readonly(np.asarray(image.convert("RGB")))
+        return self._cache.get_or_create(self._key(path, ("rgb",)), decode)
+
+    def get_image(self, path):
+        # 렌더링 결과를 담을 쓰기 가능한 복사본 (렌더링 한 번에 배경 복사는 이것 하나뿐이다)
+        return Image.fromarray(self.get_array(path))
+
+    def share(self, paths, pool):
+        # 부모 프로세스에서: 배경을 디코딩해 pool(SharedArrayPool)에 올리고 워커에 넘길 설명자 목록을 돌려준다.
+        # 피라미드 working 단계가 있는 배경은 메모리 매핑으로 이미 공유되므로 건너뛴다.
+        descriptors = []
+        for path in paths:
+            entry = pyramid_store.entry(path)
+            if entry is None or "working" not in entry["tiers"]:
+                descriptors.append(pool.publish(self._key(path, ("rgb",)), self.get_array(path)))
+        return descriptors
+
+    def adopt(self, descriptors):
+        # 워커에서: 공유 메모리 배열을 디코딩 결과로 등록한다. 메모리는 게시한 프로세스 몫이라 예산에는 세지 않는다.
+        for descriptor in descriptors:
+            self._cache.put(tuple(descriptor["key"]), attach(descriptor), 0)
+
+    def get_preview(self, path, size=PREVIEW_SIZE):
+        def build():
+            image = pyramid_store.load(path, "preview") if tuple(size) == PREVIEW_SIZE else None
+            if image is not None:
+                return _readonly(np.asarray(image))
+            image = self.get_image(path)
+            image.thumbnail(size, Image.LANCZOS)
+            return _readonly(np.asarray(image))
+        return Image.fromarray(self._cache.get_or_create(self._key(path, ("preview", tuple(size))), build))
+
+    def get_upscaled(self, path, factor):
+        backend = get_backend()
+
+        def build():
+            image = self.get_image(path)
+            image = resize_image(image, (image.width * factor, image.height * factor), backend)
+            return _readonly(np.asarray(image))
+        return Image.fromarray(self._cache.get_or_create(self._key(path, ("upscaled", factor, backend)), build))
+
+    def get_for_size(self, path, min_size):
+        # min_size (너비, 높이) 를 만족하는 가장 작은 피라미드 단계를 돌려준다. 피라미드가 없으면 원본 해상도.
+        tier = pyramid_store.select_tier(path, min_size)
+        if tier is None or tier == "working":
+            return self.get_image(path)
+
+        def build():
+            return _readonly(np.asarray(pyramid_store.load(path, tier)))
+        return Image.fromarray(self._cache.get_or_create(self._key(path, ("tier", tier)), build))
+
+    def configure(self, max_bytes):
+        self._cache.resize(max_bytes)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+background_cache = BackgroundCache()
+
+
+def adopt_shared_backgrounds(descriptors):
+    # ProcessPoolExecutor(initializer=...) 용
+    background_cache.adopt(descriptors)
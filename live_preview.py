@@ -0,0 +1,248 @@
+# 스타일/위치 조작 중 실시간 미리보기
+# 조작이 이어지는 동안에는 슈퍼샘플링 없는 초안을 바로 보여주고, 입력이 DEBOUNCE_SECONDS 동안 멈추면
+# 전체 품질 렌더링을 한 번만 한다. 새 입력이 들어오면 같은 세션의 대기/진행 중인 렌더링은 취소된다.
+#
+# Streamlit 은 st 호출 시점에만 스크립트를 중단하므로, 기다리는 동안 tick() 으로 빈 요소를 갱신해
+# 새 입력이 오면 바로 다음 실행으로 넘어갈 수 있게 한다.
+# 완성본은 렌더링 결과 캐시(render_cache.py)를 거친다. 다른 세션이나 프로세스가 이미 그린 설정이면
+# 그리지 않고 PNG 바이트를 그대로 보여준다 (완성본은 PIL 이미지가 아니라 PNG 바이트다).
+#
+# 세션마다 들고 있는 상태는 작은 설정(spec)과 선택적인 JPEG 썸네일뿐이다. 완성본 바이트는 세션에 두지 않고
+# 필요할 때 공유 캐시에서 꺼내거나 다시 그린다. 세션 상태는 세션별/전체 바이트 예산을 넘지 않게 줄이고,
+# SESSION_IDLE_SECONDS 동안 쓰지 않은 세션은 잊는다. 전체 크기는 session_state_bytes 지표로 내보낸다.
+import concurrent.futures
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from PIL import Image
+
+from bookmark_render import RenderCancelled, render_bookmark, render_draft
+from metrics import metrics
+from render_cache import encode_png, render_cache, render_key
+from render_server import get_render_client, render_remote_png
+
+DEBOUNCE_SECONDS = float(os.getenv("BOOKMARK_PREVIEW_DEBOUNCE", 0.35))
+POLL_SECONDS = 0.05
+MAX_SESSIONS = 4096
+SESSION_IDLE_SECONDS = float(os.getenv("BOOKMARK_SESSION_IDLE_SECONDS", 30 * 60))
+# 세션 하나의 상태 한도. 썸네일까지 넣으면 넘는 경우 썸네일은 보관하지 않는다.
+SESSION_MAX_BYTES = int(os.getenv("BOOKMARK_SESSION_MAX_BYTES", 64 * 1024))
+# 모든 세션 상태의 합 한도. 넘으면 오래 쓰지 않은 세션의 썸네일부터 버리고, 그래도 넘으면 세션을 잊는다.
+SESSIONS_MAX_BYTES = int(os.getenv("BOOKMARK_SESSIONS_MAX_BYTES", 16 * 1024 * 1024))
+# 썸네일 긴 변 길이 (0 이면 만들지 않는다)
+THUMBNAIL_SIZE = int(os.getenv("BOOKMARK_SESSION_THUMBNAIL", 256))
+THUMBNAIL_QUALITY = 70
+
+
+def _spec_bytes(spec):
+    return 0 if spec is None else len(json.dumps(spec, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE):
+    # 완성본 PNG 바이트 -> 작은 JPEG 바이트
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+class _PreviewSession:
+    def __init__(self):
+        self.generation = 0
+        self.spec = None
+        self.final_spec = None
+        self.final_key = None
+        self.thumbnail = None
+        self.last_seen = time.monotonic()
+        self.nbytes = 0
+
+    def measure(self):
+        self.nbytes = _spec_bytes(self.spec) + _spec_bytes(self.final_spec) + len(self.thumbnail or b"")
+        return self.nbytes
+
+
+class PreviewScheduler:
+    def __init__(self, max_workers=None, debounce=DEBOUNCE_SECONDS):
+        self.debounce = debounce
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                            thread_name_prefix="preview")
+        # 최근에 쓴 세션이 뒤에 온다
+        self._sessions = OrderedDict()
+        self._state_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"drafts": 0, "finals": 0, "reused": 0, "regenerated": 0, "cancelled": 0,
+                       "idle_evictions": 0, "budget_evictions": 0, "thumbnails_dropped": 0}
+
+    def _forget(self, session_id):
+        self._state_bytes -= self._sessions.pop(session_id).nbytes
+
+    def _session(self, session_id):
+        # 세션을 꺼내면서 SESSION_IDLE_SECONDS 동안 쓰지 않은 세션을 앞에서부터 잊는다
+        now = time.monotonic()
+        for oldest_id, oldest in list(self._sessions.items()):
+            if oldest_id == session_id or now - oldest.last_seen < SESSION_IDLE_SECONDS:
+                break
+            self._forget(oldest_id)
+            self._stats["idle_evictions"] += 1
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _PreviewSession()
+            while len(self._sessions) > MAX_SESSIONS:
+                self._forget(next(iter(self._sessions)))
+                self._stats["budget_evictions"] += 1
+        session.last_seen = now
+        self._sessions.move_to_end(session_id)
+        self._publish()
+        return session
+
+    def _update(self, session):
+        # 세션 상태가 바뀐 뒤 크기를 다시 재고 예산을 맞춘다
+        previous = session.nbytes
+        if session.measure() > SESSION_MAX_BYTES and session.thumbnail is not None:
+            session.thumbnail = None
+            session.measure()
+            self._stats["thumbnails_dropped"] += 1
+        self._state_bytes += session.nbytes - previous
+        if self._state_bytes > SESSIONS_MAX_BYTES:
+            # 오래 쓰지 않은 세션의 썸네일부터 버린다 (썸네일이 없어도 완성본은 다시 그릴 수 있다)
+            for other in self._sessions.values():
+                if self._state_bytes <= SESSIONS_MAX_BYTES:
+                    break
+                if other is not session and other.thumbnail is not None:
+                    previous = other.nbytes
+                    other.thumbnail = None
+                    self._state_bytes += other.measure() - previous
+                    self._stats["thumbnails_dropped"] += 1
+            while self._state_bytes > SESSIONS_MAX_BYTES and len(self._sessions) > 1:
+                oldest_id = next(iter(self._sessions))
+                if self._sessions[oldest_id] is session:
+                    break
+                self._forget(oldest_id)
+                self._stats["budget_evictions"] += 1
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge("session_state_bytes", self._state_bytes)
+        metrics.set_gauge("preview_sessions", len(self._sessions))
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def final_for(self, session_id, spec):
+        # 같은 설정으로 이미 완성본을 만들었으면 공유 캐시에서 꺼내 돌려준다. 캐시에서 밀려났으면 None.
+        with self._lock:
+            session = self._session(session_id)
+            key = session.final_key if session.final_spec == spec else None
+        if key is None:
+            return None
+        data = render_cache.get(key)
+        self._count("reused" if data is not None else "regenerated")
+        return data
+
+    def thumbnail_for(self, session_id, spec):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and session.final_spec == spec:
+                return session.thumbnail
+        return None
+
+    def begin(self, session_id, spec):
+        # 새 설정으로 렌더링을 시작한다. 세대 번호가 바뀌므로 이전 렌더링은 모두 취소된다.
+        with self._lock:
+            session = self._session(session_id)
+            session.generation += 1
+            session.spec = spec
+            self._update(session)
+            return session.generation
+
+    def is_current(self, session_id, generation):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session is not None and session.generation == generation
+
+    def submit(self, session_id, generation, spec):
+        def run():
+            should_cancel = lambda: not self.is_current(session_id, generation)
+
+            def render():
+                # 렌더링 서버가 설정되어 있으면 완성본은 서버에 맡긴다 (초안은 가벼우므로 여기서 그린다)
+                if get_render_client() is not None:
+                    return render_remote_png(**spec, should_cancel=should_cancel)
+                return encode_png(render_bookmark(**spec, should_cancel=should_cancel))
+
+            key = render_key(spec)
+            try:
+                image = render_cache.get_or_render(key, render)
+            except RenderCancelled:
+                self._count("cancelled")
+                raise
+            thumbnail = make_thumbnail(image) if THUMBNAIL_SIZE > 0 and not should_cancel() else None
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is not None and session.generation == generation:
+                    session.final_spec = spec
+                    session.final_key = key
+                    session.thumbnail = thumbnail
+                    self._update(session)
+                self._stats["finals"] += 1
+            return image
+        return self._executor.submit(run)
+
+    def draft(self, spec):
+        # 초안은 스크립트 스레드에서 바로 그린다 (render_mode 는 초안에 해당하지 않는다)
+        self._count("drafts")
+        return render_draft(**{key: value for key, value in spec.items() if key != "render_mode"})
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["sessions"] = len(self._sessions)
+            stats["state_bytes"] = self._state_bytes
+        return stats
+
+
+preview_scheduler = PreviewScheduler()
+
+
+def live_preview(session_id, spec, show, tick=None, scheduler=None):
+    # spec: render_bookmark 키워드 인자, show(image, is_final): 화면 갱신, tick(): 중단 지점용 st 호출
+    scheduler = scheduler or preview_scheduler
+    final = scheduler.final_for(session_id, spec)
+    if final is not None:
+        show(final, True)
+        return final
+
+    # 같은 설정인데 완성본이 공유 캐시에서 밀려났으면 썸네일을 먼저 보여주고 기다리지 않고 다시 그린다
+    thumbnail = scheduler.thumbnail_for(session_id, spec)
+    generation = scheduler.begin(session_id, spec)
+    draft = thumbnail if thumbnail is not None else scheduler.draft(spec)
+    show(draft, False)
+
+    # 입력이 멈출 때까지 기다린다. 그 사이 새 입력이 오면 tick() 에서 Streamlit 이 이 실행을 중단한다.
+    deadline = time.monotonic() + (scheduler.debounce if thumbnail is None else 0)
+    while time.monotonic() < deadline:
+        if not scheduler.is_current(session_id, generation):
+            return draft
+        if tick is not None:
+            tick()
+        time.sleep(POLL_SECONDS)
+
+    future = scheduler.submit(session_id, generation, spec)
+    while True:
+        try:
+            image = future.result(timeout=POLL_SECONDS)
+            break
+        except concurrent.futures.TimeoutError:
+            if tick is not None:
+                tick()
+        except (RenderCancelled, CancelledError):
+            return draft
+    show(image, True)
+    return image
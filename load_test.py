@@ -0,0 +1,268 @@
+# 동시 세션 부하 테스트 (ai.bk-v4.py 전체 흐름)
+# Streamlit AppTest 로 실제 스크립트를 세션 N개가 동시에 실행하게 하고, 글귀 생성은 지연 시간을 정할 수 있는
+# 스텁 OpenAI 서버(stub_openai_server.py)가 받는다. 동시 세션 수마다 새 프로세스에서 돌려서
+# 처리량, 상호작용 종류별 지연 백분위, CPU 사용량, 메모리(RSS)를 따로 잰다.
+#
+# 세션 하나의 흐름 (상호작용마다 스크립트 재실행 한 번):
+#   load -> answer x 질문 수 -> submit -> (background -> slider x --drags) x --backgrounds
+# 제출 뒤 글귀가 바뀌지 않았거나 스텁 서버가 요청을 하나도 받지 못한 단계는 오류로 세고, 오류가 있으면 종료 코드 1 로 끝난다.
+#
+# 사용 예:
+#   python load_test.py --sessions 1 2 4 8 16 --openai-latency 0.8
+#   python load_test.py --sessions 4 --drags 10 --think 0.2 --output load.json --target-p95-ms 1500
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows 에는 resource 모듈이 없다
+    resource = None
+
+DEFAULT_APP = "ai.bk-v4.py"
+DEFAULT_LEVELS = (1, 2, 4, 8)
+INTERACTIONS = ("load", "answer", "submit", "background", "slider")
+SAMPLE_SECONDS = 0.1
+
+
+def _rss_mb():
+    # 현재 RSS (리눅스 /proc 이 없으면 None)
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def _summary(seconds):
+    values = np.asarray(seconds) * 1000
+    if not len(values):
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p95_ms": round(float(np.percentile(values, 95)), 1),
+        "p99_ms": round(float(np.percentile(values, 99)), 1),
+        "max_ms": round(float(values.max()), 1)
+    }
+
+
+class _MemorySampler:
+    # 실행하는 동안 RSS 최대값을 주기적으로 기록한다 (ru_maxrss 는 프로세스 시작부터의 최대값이라 단계별로 쓸 수 없다)
+    def __init__(self):
+        self.peak = _rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(SAMPLE_SECONDS):
+            rss = _rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def simulate_session(index, args, record):
+    # 세션 하나를 처음부터 끝까지 진행한다. record(종류, 초, 오류) 로 상호작용마다 보고한다.
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(args.seed * 100003 + index)
+    app = AppTest.from_file(os.path.abspath(args.app), default_timeout=args.timeout)
+    app.secrets["OPENAI_API_KEY"] = "load-test-key"
+
+    def interact(kind, action=None, check=None):
+        # action 에서 위젯을 찾을 때는 매번 app 에서 다시 찾아야 한다 (재실행 전에 잡아 둔 위젯에 넣은 값은 사라진다)
+        if args.think:
+            time.sleep(rng.uniform(0, 2 * args.think))
+        started = time.perf_counter()
+        error = None
+        try:
+            if action is not None:
+                action()
+            app.run()
+            if app.exception:
+                error = app.exception[0].value
+            elif check is not None:
+                error = check()
+        except Exception as e:  # 시간 초과 등도 실패한 상호작용으로 센다
+            error = f"{type(e).__name__}: {e}"
+        record(kind, time.perf_counter() - started, error)
+
+    interact("load")
+    # 같은 답변은 글귀 캐시에 걸리므로 --distinct-answers 로 서로 다른 답변 수를 정한다
+    answer = f"답변{index % args.distinct_answers}"
+    for field in range(len(app.text_input)):
+        interact("answer", lambda field=field: app.text_input[field].input(answer))
+    if not all(text_input.value for text_input in app.text_input):
+        record("answer", 0.0, f"답변이 입력되지 않았습니다: {[text_input.value for text_input in app.text_input]}")
+        return
+
+    def submitted():
+        if app.session_state["quote"] == previous_quote:
+            return "제출했지만 글귀가 바뀌지 않았습니다"
+        return None
+
+    previous_quote = app.session_state["quote"]
+    interact("submit", lambda: next(button for button in app.button if "제출" in button.label).click(),
+             check=submitted)
+
+    for _ in range(args.backgrounds):
+        selectbox = next((box for box in app.selectbox if "배경" in box.label), None)
+        if selectbox is None:
+            break
+        interact("background", lambda selectbox=selectbox: selectbox.set_value(rng.choice(selectbox.options)))
+        for _ in range(args.drags):
+            slider = rng.choice([slider for slider in app.slider if "좌표" in slider.label] or [None])
+            if slider is None:
+                break
+            interact("slider", lambda slider=slider: slider.set_value(rng.randrange(slider.min, slider.max + 1, 10)))
+
+
+def run_level(args):
+    # 자식 프로세스에서 실행된다. 세션 args.level 개를 동시에 돌리고 결과를 JSON 한 줄로 출력한다.
+    from stub_openai_server import StubOpenAIServer
+
+    server = StubOpenAIServer(("127.0.0.1", 0), latency=args.openai_latency).start()
+    os.environ["OPENAI_API_BASE"] = server.api_base
+
+    latencies = {kind: [] for kind in INTERACTIONS}
+    errors = []
+    lock = threading.Lock()
+
+    def record(kind, seconds, error):
+        with lock:
+            latencies[kind].append(seconds)
+            if error is not None:
+                errors.append(f"{kind}: {error}")
+
+    # Streamlit 과 앱 모듈을 가져오는 시간은 빼고 잰다 (세션 하나를 먼저 돌려 데우지는 않는다)
+    from streamlit.testing.v1 import AppTest  # noqa: F401
+
+    threads = [threading.Thread(target=simulate_session, args=(index, args, record), daemon=True)
+               for index in range(args.level)]
+    cpu_started = os.times()
+    with _MemorySampler() as memory:
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    cpu_ended = os.times()
+    server.shutdown()
+
+    if server.request_count == 0:
+        errors.append("submit: 스텁 OpenAI 서버가 요청을 하나도 받지 못했습니다")
+
+    cpu_seconds = (cpu_ended.user - cpu_started.user) + (cpu_ended.system - cpu_started.system)
+    interactions = sum(len(values) for values in latencies.values())
+    print(json.dumps({
+        "sessions": args.level,
+        "seconds": round(elapsed, 2),
+        "interactions": interactions,
+        "throughput_per_s": round(interactions / elapsed, 2),
+        "sessions_per_min": round(args.level / elapsed * 60, 2),
+        "latency": {"all": _summary([value for values in latencies.values() for value in values]),
+                    **{kind: _summary(values) for kind, values in latencies.items()}},
+        # CPU 코어 몇 개 분량을 썼는지 (1.0 = 한 코어를 내내 쓴 것)
+        "cpu_cores": round(cpu_seconds / elapsed, 2),
+        "rss_peak_mb": memory.peak,
+        "rss_end_mb": _rss_mb(),
+        "ru_maxrss_mb": _peak_rss_mb(),
+        "openai_requests": server.request_count,
+        "errors": len(errors),
+        "error_samples": errors[:5]
+    }, ensure_ascii=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="동시 세션 부하 테스트 (스텁 OpenAI 서버 사용)")
+    parser.add_argument("--app", default=DEFAULT_APP)
+    parser.add_argument("--sessions", type=int, nargs="*", default=list(DEFAULT_LEVELS), help="동시 세션 수 단계")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="스텁 OpenAI 응답 지연 (초)")
+    parser.add_argument("--backgrounds", type=int, default=2, help="세션마다 고르는 배경 수")
+    parser.add_argument("--drags", type=int, default=5, help="배경마다 슬라이더를 옮기는 횟수")
+    parser.add_argument("--think", type=float, default=0.0, help="상호작용 사이 평균 대기 시간 (초)")
+    parser.add_argument("--distinct-answers", type=int, default=1000, help="세션들이 쓰는 서로 다른 답변 수")
+    parser.add_argument("--timeout", type=float, default=120, help="상호작용 하나의 시간 한도 (초)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target-p95-ms", type=float, default=None, help="이 p95 안에 드는 최대 동시 세션 수를 알려준다")
+    parser.add_argument("--output", default=None, help="결과 JSON 파일")
+    parser.add_argument("--level", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.level is not None:
+        run_level(args)
+        return 0
+
+    results = []
+    for level in args.sessions:
+        # 단계마다 새 프로세스와 빈 렌더링 결과 캐시, 빈 글귀 캐시에서 시작한다
+        with tempfile.TemporaryDirectory(prefix="bookmark-load-") as cache_dir:
+            env = {**os.environ, "BOOKMARK_RENDER_CACHE_DIR": os.path.join(cache_dir, "render"),
+                   "BOOKMARK_QUOTE_CACHE": os.path.join(cache_dir, "quotes.sqlite3")}
+            command = [sys.executable, os.path.abspath(__file__), "--level", str(level), "--app", args.app,
+                       "--openai-latency", str(args.openai_latency), "--backgrounds", str(args.backgrounds),
+                       "--drags", str(args.drags), "--think", str(args.think),
+                       "--distinct-answers", str(args.distinct_answers), "--timeout", str(args.timeout),
+                       "--seed", str(args.seed)]
+            completed = subprocess.run(command, capture_output=True, text=True, env=env)
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            parser.exit(1, f"동시 세션 {level}개 단계가 실패했습니다\n")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        latency = result["latency"]["all"]
+        print(f"세션 {level:>4}개: {result['throughput_per_s']:>7}회/초  p50 {latency['p50_ms']:>8}ms  "
+              f"p95 {latency['p95_ms']:>8}ms  CPU {result['cpu_cores']:>5}코어  RSS 최대 {result['rss_peak_mb']}MB  "
+              f"오류 {result['errors']}")
+        for kind in INTERACTIONS:
+            stats = result["latency"][kind]
+            if stats["count"]:
+                print(f"    {kind:<10} n={stats['count']:<5} p50 {stats['p50_ms']:>8}ms  p95 {stats['p95_ms']:>8}ms  "
+                      f"p99 {stats['p99_ms']:>8}ms")
+        for sample in result["error_samples"]:
+            print(f"    오류: {sample}")
+
+    if args.target_p95_ms is not None:
+        passing = [r["sessions"] for r in results if r["errors"] == 0
+                   and r["latency"]["all"]["p95_ms"] <= args.target_p95_ms]
+        if passing:
+            print(f"p95 {args.target_p95_ms:g}ms 안에 드는 최대 동시 세션 수: {max(passing)}")
+        else:
+            print(f"p95 {args.target_p95_ms:g}ms 안에 드는 단계가 없습니다")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"options": {key: value for key, value in vars(args).items() if key != "level"},
+                       "levels": results}, f, ensure_ascii=False, indent=2)
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# 렌더링/글귀 생성 경로 계측
+# 단계별 소요 시간(히스토그램 + 최근 표본 백분위)과, 켜져 있을 때는 tracemalloc 기반 최대 할당량을 모은다.
+#
+#   with stage("decode"):
+#       ...
+#
+# BOOKMARK_TRACE_MEMORY=1 이면 tracemalloc 을 켠다 (NumPy 와 파이썬 객체 할당만 잡히고 Pillow 내부 버퍼는 잡히지 않는다).
+# BOOKMARK_METRICS_PORT 를 주면 start_metrics_server() 가 /metrics (Prometheus 텍스트) 와 /stats.json 을 연다.
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SAMPLE_SIZE = 1024
+
+
+class _StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+        self.peak_bytes = 0
+
+    def observe(self, seconds, peak_bytes):
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        self.samples.append(seconds)
+        if peak_bytes is not None:
+            self.peak_bytes = max(self.peak_bytes, peak_bytes)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Metrics:
+    def __init__(self, trace_memory=False):
+        self._stages = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if trace_memory:
+            self.enable_memory_tracking()
+
+    @property
+    def memory_tracking(self):
+        return tracemalloc.is_tracing()
+
+    def enable_memory_tracking(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def disable_memory_tracking(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        # 중첩된 단계의 최대 할당량은 바깥 단계에도 반영된다 (tracemalloc 은 프로세스 전체 기준)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        tracing = tracemalloc.is_tracing()
+        frame = None
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # 최대값을 되돌리기 전에 바깥 단계가 지금까지 찍은 최대값을 옮겨 둔다
+            if stack and stack[-1] is not None:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            frame = {"start": current, "peak": current}
+            tracemalloc.reset_peak()
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            peak_bytes = None
+            if frame is not None and tracemalloc.is_tracing():
+                absolute_peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                peak_bytes = absolute_peak - frame["start"]
+                if stack and stack[-1] is not None:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], absolute_peak)
+            with self._lock:
+                self._stages.setdefault(name, _StageStats()).observe(elapsed, peak_bytes)
+
+    def timed(self, name):
+        # 함수 전체를 하나의 단계로 잰다
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        # 현재 값 하나만 보관한다 (예: 세션 상태 바이트)
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self):
+        # JSON 으로 내보낼 수 있는 요약 (백분위는 최근 SAMPLE_SIZE 개 표본 기준, 단위 ms)
+        with self._lock:
+            stages = {}
+            for name, stats in sorted(self._stages.items()):
+                samples = sorted(stats.samples)
+                stages[name] = {
+                    "count": stats.count,
+                    "mean_ms": round(stats.total / stats.count * 1000, 3) if stats.count else 0.0,
+                    "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+                    "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+                    "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+                    "max_ms": round(max(samples) * 1000, 3) if samples else 0.0,
+                    "peak_alloc_bytes": stats.peak_bytes if self.memory_tracking else None
+                }
+            return {"stages": stages, "counters": dict(self._counters), "gauges": dict(self._gauges),
+                    "memory_tracking": self.memory_tracking}
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP bookmark_stage_seconds Time spent per pipeline stage.",
+            "# TYPE bookmark_stage_seconds histogram"
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            for name, stats in stages:
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    lines.append(f'bookmark_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'bookmark_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'bookmark_stage_seconds_sum{{stage="{name}"}} {stats.total:.6f}')
+                lines.append(f'bookmark_stage_seconds_count{{stage="{name}"}} {stats.count}')
+            if self.memory_tracking:
+                lines.append("# HELP bookmark_stage_peak_alloc_bytes Largest traced allocation peak per stage.")
+                lines.append("# TYPE bookmark_stage_peak_alloc_bytes gauge")
+                for name, stats in stages:
+                    lines.append(f'bookmark_stage_peak_alloc_bytes{{stage="{name}"}} {stats.peak_bytes}')
+            for name, value in counters:
+                lines.append(f"# TYPE bookmark_{name}_total counter")
+                lines.append(f"bookmark_{name}_total {value}")
+            for name, value in gauges:
+                lines.append(f"# TYPE bookmark_{name} gauge")
+                lines.append(f"bookmark_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+metrics = Metrics(trace_memory=os.getenv("BOOKMARK_TRACE_MEMORY") == "1")
+stage = metrics.stage
+timed = metrics.timed
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = metrics.prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/stats.json":
+            body, content_type = json.dumps(metrics.snapshot(), ensure_ascii=False), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    # 프로세스당 한 번만 띄운다. 포트가 없으면 아무 것도 하지 않는다.
+    global _server
+    port = port or os.getenv("BOOKMARK_METRICS_PORT")
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
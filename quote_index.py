@@ -0,0 +1,275 @@
+# 글귀 검색 색인 (OpenAI 호출 전에 먼저 찾아보는 빠른 길)
+# 답변 다섯 개를 질문별 글자 n-gram (1~3글자) TF-IDF 벡터로 바꾸고, 이전에 생성했거나 직접 넣은 (답변, 글귀) 예시 중
+# 코사인 유사도가 높은 후보를 찾는다. 후보의 글귀를 바로 쓰려면 질문마다 따로 잰 유사도가 모두 threshold 이상이고
+# 부정/반대 표현이 들어 있는 낱말 수(polarity)가 같아야 한다. 아니면 원래대로 API 를 부른다.
+# 전체 벡터 하나의 유사도로만 고르면 답변 하나가 "행복" -> "불행", "좋아요" -> "싫어요" 로 뒤집혀도 0.9 가 넘게 나와서
+# 엉뚱한 글귀를 돌려주기 때문이다 (글자 n-gram 은 뜻이 반대인 것을 알 수 없다).
+# API 결과는 add() 로 그때그때 색인에 더한다 (색인을 다시 만들지 않는다).
+#
+# 색인은 n-gram 별 역색인 (예시 번호, tf) 이라서 조회는 질의에 나온 n-gram 의 목록을 모아 np.bincount 한 번으로 끝난다.
+# IDF 는 조회할 때의 문서 빈도로 계산하고, 예시 벡터의 크기(norm)는 더할 때의 IDF 로 계산해 두었다가
+# 예시 수가 REWEIGHT_GROWTH 배 늘 때마다 전체를 다시 계산한다.
+#
+# 예시는 글귀 캐시 SQLite 파일의 examples 표에 함께 저장된다 (quote_service.py 의 QuoteCache).
+# 직접 고른 예시 넣기와 조회:
+#   python quote_index.py import curated.json     ([{"answers": [...], "quote": "..."}, ...])
+#   python quote_index.py query 좋아요 가족 아니요 진로 행복
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+NGRAM_SIZES = (1, 2, 3)
+# 질문마다의 최소 유사도 (1 보다 크면 색인을 쓰지 않는다). test_quote_index.py 의 PARAPHRASES (어미/띄어쓰기만 다른 답변)는
+# 20/26 이 넘고 DIFFERENT (낱말 하나만 다른 "엄마 건강" / "아빠 건강" 등, 가장 높은 것이 0.615)는 넘지 않도록 맞춘 값이다.
+# 뜻이 뒤집힌 답변은 유사도와 상관없이 polarity 로 거른다.
+DEFAULT_THRESHOLD = float(os.getenv("BOOKMARK_QUOTE_INDEX_THRESHOLD", 0.63))
+REWEIGHT_GROWTH = 1.1
+# 전체 유사도 순서로 질문별 검사를 해 볼 후보 수
+LOOKUP_CANDIDATES = 5
+# n-gram 을 만들기 전에 낱말 끝에서 떼는 어미 (앞에 있는 것부터 확인한다. "좋아요" / "좋습니다" -> "좋").
+# 조사 "이", "가" 등은 "휴가" 같은 낱말을 망가뜨리므로 떼지 않는다.
+ENDINGS = ("이에요", "예요", "이요", "입니다", "습니다", "합니다", "해요", "어요", "아요", "네요", "요", "음", "들")
+# 답변의 뜻을 뒤집는 부정/반대 표현은 낱말 단위로 센다.
+# 한 글자 부정어는 낱말 전체가 그것일 때만 ("편안", "안녕", "잘못" 은 세지 않는다)
+NEGATION_WORDS = frozenset(("안", "못"))
+# 낱말이 이것으로 시작할 때 ("불꽃", "불고기" 가 걸리지 않도록 "불" 은 뒤 글자까지 적는다)
+NEGATION_PREFIXES = ("아니", "아뇨", "별로", "그만", "전혀", "안좋", "안돼", "안되", "안해", "안하", "못해", "못하",
+                     "불행", "불안", "불편", "불만", "불쾌", "나쁘", "나빠", "나쁜", "미워", "미운", "슬프", "슬퍼", "슬픈",
+                     "힘들", "힘드", "힘든")
+# 낱말 안 어디에 있어도 ("좋지않아요", "재미없어요")
+NEGATION_SYLLABLES = ("않", "없", "싫")
+
+Match = namedtuple("Match", ["quote", "score", "answers"])
+
+
+def _stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) > len(ending):
+            return word[:-len(ending)]
+    return word
+
+
+def answer_grams(answers):
+    # {"질문 번호:n-gram": 개수}. 문장 부호와 어미는 빼고, 답변 앞뒤에 공백을 붙여 낱말 경계도 n-gram 에 들어가게 한다.
+    counts = {}
+    for field, answer in enumerate(answers):
+        words = "".join(ch for ch in answer if ch.isalnum() or ch.isspace()).split()
+        text = " " + " ".join(_stem(word) for word in words) + " "
+        for size in NGRAM_SIZES:
+            for start in range(len(text) - size + 1):
+                gram = text[start:start + size]
+                if gram.strip():
+                    key = f"{field}:{gram}"
+                    counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def _tf(count):
+    return 1 + math.log(count)
+
+
+def _idf(df, n):
+    return math.log((1 + n) / (1 + df)) + 1
+
+
+@lru_cache(maxsize=4096)
+def _field_grams(answer):
+    return answer_grams([answer])
+
+
+def field_similarity(answer, other):
+    # 답변 하나끼리의 n-gram 코사인 유사도 (tf 만 쓴다. 색인 내용과 상관없이 같은 값이 나와야 기준을 맞출 수 있다)
+    if answer == other:
+        return 1.0
+    grams, other_grams = _field_grams(answer), _field_grams(other)
+    if not grams or not other_grams:
+        return float(grams == other_grams)
+    dot = sum(_tf(count) * _tf(other_grams[gram]) for gram, count in grams.items() if gram in other_grams)
+    norm = math.sqrt(sum(_tf(count) ** 2 for count in grams.values()) *
+                     sum(_tf(count) ** 2 for count in other_grams.values()))
+    return dot / norm
+
+
+def _negated(word):
+    return word in NEGATION_WORDS or word.startswith(NEGATION_PREFIXES) or any(
+        syllable in word for syllable in NEGATION_SYLLABLES)
+
+
+@lru_cache(maxsize=4096)
+def polarity(answer):
+    # 부정/반대 표현이 들어 있는 낱말 수 ("안 싫어요" 는 2 라서 "싫어요" 와 다르다)
+    words = "".join(ch if ch.isalnum() else " " for ch in answer).split()
+    return sum(_negated(word) for word in words)
+
+
+def match_score(answers, other, floor=0.0):
+    # 질문별 유사도의 최솟값. 부정/반대 표현의 수가 다른 질문이 있으면 0.
+    # floor 보다 낮은 질문이 나오면 나머지는 재지 않고 그 값을 돌려준다.
+    if len(answers) != len(other):
+        return 0.0
+    pairs = list(zip(answers, other))
+    if any(polarity(answer) != polarity(other_answer) for answer, other_answer in pairs):
+        return 0.0
+    score = 1.0
+    for answer, other_answer in pairs:
+        score = min(score, field_similarity(answer, other_answer))
+        if score < floor:
+            break
+    return score
+
+
+class QuoteIndex:
+    # answers 는 정규화된 답변 튜플을 받는다 (quote_service.normalize_answers)
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._answers = []
+        self._quotes = []
+        self._rows = {}
+        self._postings = {}
+        self._norms = array("f")
+        self._weighted = 0
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "added": 0, "reweights": 0}
+
+    def _add(self, answers, quote):
+        # 같은 답변이 이미 있으면 글귀만 바꾼다. 새 예시면 행 번호를 돌려준다.
+        row = self._rows.get(answers)
+        if row is not None:
+            self._quotes[row] = quote
+            return None
+        row = len(self._quotes)
+        self._rows[answers] = row
+        self._answers.append(answers)
+        self._quotes.append(quote)
+        self._stats["added"] += 1
+        for gram, count in answer_grams(answers).items():
+            rows, tfs = self._postings.setdefault(gram, (array("i"), array("f")))
+            rows.append(row)
+            tfs.append(_tf(count))
+        return row
+
+    def _reweight(self):
+        # 지금의 IDF 로 모든 예시 벡터의 크기를 다시 계산한다
+        n = len(self._quotes)
+        squares = np.zeros(n, dtype=np.float64)
+        for rows, tfs in self._postings.values():
+            weights = np.array(tfs, dtype=np.float64) * _idf(len(rows), n)
+            squares[np.array(rows, dtype=np.int64)] += weights ** 2
+        self._norms = array("f", np.sqrt(squares).astype(np.float32).tobytes())
+        self._weighted = n
+        self._stats["reweights"] += 1
+
+    def add(self, answers, quote):
+        with self._lock:
+            row = self._add(tuple(answers), quote)
+            if row is None:
+                return
+            n = len(self._quotes)
+            if n >= self._weighted * REWEIGHT_GROWTH:
+                self._reweight()
+            else:
+                norm = math.sqrt(sum((_tf(count) * _idf(len(self._postings[gram][0]), n)) ** 2
+                                     for gram, count in answer_grams(answers).items()))
+                self._norms.append(norm)
+
+    def extend(self, examples):
+        # (답변, 글귀) 여러 개를 한꺼번에 더하고 크기는 마지막에 한 번만 계산한다
+        with self._lock:
+            for answers, quote in examples:
+                self._add(tuple(answers), quote)
+            if self._quotes:
+                self._reweight()
+
+    def search(self, answers, k=1):
+        # 유사도가 높은 순서로 Match 를 k 개까지 돌려준다 (threshold 와 상관없이)
+        grams = answer_grams(answers)
+        with self._lock:
+            n = len(self._quotes)
+            if not n or not grams:
+                return []
+            # 목록은 array 끼리 이어 붙이고 (C 에서 복사) n-gram 별 가중치는 np.repeat 로 펼쳐서 NumPy 연산을 한 번씩만 한다
+            rows, tfs, scales, lengths, query_square = array("i"), array("f"), [], [], 0.0
+            for gram, count in grams.items():
+                posting = self._postings.get(gram)
+                idf = _idf(len(posting[0]) if posting else 0, n)
+                query_square += (_tf(count) * idf) ** 2
+                if posting:
+                    rows.extend(posting[0])
+                    tfs.extend(posting[1])
+                    scales.append(_tf(count) * idf * idf)
+                    lengths.append(len(posting[0]))
+            if not scales:
+                return []
+            weights = np.array(tfs, dtype=np.float64) * np.repeat(scales, lengths)
+            scores = np.bincount(np.array(rows, dtype=np.intp), weights, minlength=n)
+            scores /= np.maximum(np.array(self._norms, dtype=np.float64), 1e-9) * math.sqrt(query_square)
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [Match(self._quotes[row], float(scores[row]), self._answers[row]) for row in top if scores[row] > 0]
+
+    def lookup(self, answers):
+        # 질문마다 threshold 이상으로 닮은 예시의 글귀, 없으면 None
+        quote = None
+        for match in self.search(answers, k=LOOKUP_CANDIDATES):
+            if match_score(answers, match.answers, self.threshold) >= self.threshold:
+                quote = match.quote
+                break
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats["hits"] += quote is not None
+        return quote
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(examples=len(self._quotes), grams=len(self._postings), threshold=self.threshold)
+        return stats
+
+
+def main(argv=None):
+    from quote_service import DEFAULT_CACHE_PATH, MODEL, QuoteCache, normalize_answers
+
+    parser = argparse.ArgumentParser(description="글귀 검색 색인 (예시 넣기와 조회)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    importer = subparsers.add_parser("import", help="직접 고른 예시 JSON 을 넣는다")
+    importer.add_argument("path")
+    query = subparsers.add_parser("query", help="답변과 가장 닮은 예시를 찾는다")
+    query.add_argument("answers", nargs="+")
+    query.add_argument("-k", type=int, default=3)
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite 캐시 경로")
+    parser.add_argument("--model", default=MODEL)
+    args = parser.parse_args(argv)
+
+    cache = QuoteCache(args.cache)
+    if args.command == "import":
+        with open(args.path, encoding="utf-8") as f:
+            examples = json.load(f)
+        for example in examples:
+            cache.put_example(normalize_answers(example["answers"]), args.model, example["quote"], curated=True)
+        print(f"예시 {len(examples)}개를 넣었습니다 ({args.cache})")
+        return
+
+    index = QuoteIndex()
+    index.extend(cache.examples(args.model))
+    answers = normalize_answers(args.answers)
+    started = time.perf_counter()
+    matches = index.search(answers, k=args.k)
+    elapsed = time.perf_counter() - started
+    for match in matches:
+        score = match_score(answers, match.answers)
+        mark = "✔" if score >= index.threshold else " "
+        print(f"{mark} 전체 {match.score:.3f} 질문별 최소 {score:.3f}  {match.quote}  <- {' / '.join(match.answers)}")
+    print(f"예시 {index.stats()['examples']}개 중 조회 {elapsed * 1000:.2f}ms (질문별 기준 유사도 {index.threshold})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# 글귀 생성 서비스
+# - 전용 이벤트 루프 스레드에서 비동기로 ChatCompletion 을 호출한다 (연결 풀 크기와 타임아웃 제한)
+# - 같은 답변으로 동시에 들어온 요청은 한 번의 호출을 함께 기다린다
+# - 응답은 SQLite 에 TTL 과 함께 저장해 같은 답변이면 다시 호출하지 않는다
+# - 답변이 충분히 닮은 이전 예시가 있으면 호출하지 않고 그 글귀를 쓴다 (quote_index.py)
+#
+# 부하 테스트 (스텁 서버를 함께 띄운다):
+#   python quote_service.py --concurrency 500 --distinct 50 --latency 0.5
+import argparse
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+
+import aiohttp
+import openai
+
+from metrics import metrics, stage
+from quote_index import QuoteIndex
+
+MODEL = "gpt-3.5-turbo"
+TEMPERATURE = 0.7
+MAX_TOKENS = 50
+PROMPT = "사용자의 심리 검사 결과가 다음과 같아: {answers}. 이 사용자에게 어울리는 짧고 따뜻하고 긍정적인 명언과 같은 글귀 1개 20글자 내로 추천해줘."
+
+DEFAULT_POOL_SIZE = int(os.getenv("BOOKMARK_OPENAI_POOL_SIZE", 20))
+DEFAULT_TIMEOUT = float(os.getenv("BOOKMARK_OPENAI_TIMEOUT", 20))
+DEFAULT_CACHE_PATH = os.getenv("BOOKMARK_QUOTE_CACHE", "quote_cache.sqlite3")
+DEFAULT_CACHE_TTL = float(os.getenv("BOOKMARK_QUOTE_CACHE_TTL", 7 * 24 * 3600))
+
+
+def normalize_answers(answers):
+    # 유니코드 정규화 후 앞뒤 공백 제거, 연속 공백은 하나로 줄인다
+    return tuple(" ".join(unicodedata.normalize("NFC", str(answer)).split()) for answer in answers)
+
+
+def cache_key(answers, model, temperature):
+    payload = json.dumps([normalize_answers(answers), model, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QuoteCache:
+    # SQLite 기반 응답 캐시 (여러 스레드와 프로세스에서 함께 쓸 수 있다)
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS quotes (key TEXT PRIMARY KEY, quote TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            # 글귀 검색 색인용 (답변, 글귀) 예시. curated 는 직접 넣은 예시라 TTL 이 지나도 남긴다.
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS examples (answers TEXT NOT NULL, model TEXT NOT NULL, quote TEXT NOT NULL, "
+                "created REAL NOT NULL, curated INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (answers, model))"
+            )
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT quote, created FROM quotes WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return row[0]
+
+    def put(self, key, quote):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quotes (key, quote, created) VALUES (?, ?, ?)",
+                (key, quote, time.time())
+            )
+
+    def put_example(self, answers, model, quote, curated=False):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO examples (answers, model, quote, created, curated) VALUES (?, ?, ?, ?, ?)",
+                (json.dumps(list(answers), ensure_ascii=False), model, quote, time.time(), int(curated))
+            )
+
+    def examples(self, model):
+        # [(답변 튜플, 글귀)] (오래된 순서)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT answers, quote FROM examples WHERE model = ? AND (curated = 1 OR created >= ?) ORDER BY created",
+                (model, time.time() - self.ttl)
+            ).fetchall()
+        return [(tuple(json.loads(answers)), quote) for answers, quote in rows]
+
+    def purge_expired(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM quotes WHERE created < ?", (time.time() - self.ttl,))
+            self._conn.execute("DELETE FROM examples WHERE curated = 0 AND created < ?", (time.time() - self.ttl,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QuoteService:
+    def __init__(self, model=MODEL, temperature=TEMPERATURE, max_tokens=MAX_TOKENS,
+                 pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, cache=None, index=None):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = cache
+        self.index = index
+        self._loop = None
+        self._session = None
+        self._inflight = {}
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "api_calls": 0, "cache_hits": 0, "index_hits": 0, "coalesced": 0,
+                       "errors": 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _ensure_loop(self):
+        # 이벤트 루프는 처음 요청이 들어올 때 데몬 스레드에서 띄운다
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="quote-service", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    async def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _fetch(self, key, answers):
+        self._count("api_calls")
+        metrics.increment("quote_api_calls")
+        openai.aiosession.set(await self._get_session())
+        try:
+            response = await openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=[{"role": "user", "content": PROMPT.format(answers=list(answers))}],
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                request_timeout=self.timeout
+            )
+        except Exception:
+            self._count("errors")
+            raise
+        quote = response["choices"][0]["message"]["content"].strip()
+        if self.cache is not None:
+            self.cache.put(key, quote)
+            self.cache.put_example(answers, self.model, quote)
+        if self.index is not None:
+            self.index.add(answers, quote)
+        return quote
+
+    async def _get(self, key, answers):
+        # 같은 키로 진행 중인 호출이 있으면 그 결과를 함께 기다린다
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, answers))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._count("coalesced")
+        return await asyncio.shield(task)
+
+    def _done(self, name, quote):
+        self._count(name)
+        metrics.increment(f"quote_{name}")
+        future = Future()
+        future.set_result(quote)
+        return future
+
+    def submit(self, answers):
+        # concurrent.futures.Future 를 돌려준다 (캐시나 색인 적중 시에는 이미 완료된 Future)
+        self._count("requests")
+        answers = normalize_answers(answers)
+        key = cache_key(answers, self.model, self.temperature)
+        if self.cache is not None:
+            quote = self.cache.get(key)
+            if quote is not None:
+                return self._done("cache_hits", quote)
+        if self.index is not None:
+            quote = self.index.lookup(answers)
+            if quote is not None:
+                return self._done("index_hits", quote)
+        return asyncio.run_coroutine_threadsafe(self._get(key, answers), self._ensure_loop())
+
+    def get_quote(self, answers):
+        # Streamlit 스크립트에서 쓰는 동기 API. 응답이 늦으면 openai.error.Timeout 을 낸다.
+        with stage("quote"):
+            future = self.submit(answers)
+            try:
+                return future.result(timeout=self.timeout + 1)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                raise openai.error.Timeout("글귀 생성 응답 시간이 초과되었습니다") from None
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["inflight"] = len(self._inflight)
+        if self.index is not None:
+            stats["index"] = self.index.stats()
+        return stats
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+        self._session = None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_quote_service():
+    # 프로세스 전체에서 하나의 서비스를 함께 쓴다 (세션 간 중복 제거와 캐시 공유)
+    global _service
+    with _service_lock:
+        if _service is None:
+            cache = QuoteCache()
+            index = QuoteIndex()
+            index.extend(cache.examples(MODEL))
+            _service = QuoteService(cache=cache, index=index)
+        return _service
+
+
+def main(argv=None):
+    from stub_openai_server import StubOpenAIServer
+
+    parser = argparse.ArgumentParser(description="글귀 생성 서비스 부하 테스트")
+    parser.add_argument("--concurrency", type=int, default=500, help="동시에 제출할 요청 수")
+    parser.add_argument("--distinct", type=int, default=50, help="서로 다른 답변 조합 수")
+    parser.add_argument("--latency", type=float, default=0.5, help="스텁 서버 응답 지연 (초)")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--cache", default=":memory:", help="SQLite 캐시 경로")
+    parser.add_argument("--api-base", default=None, help="이미 떠 있는 스텁 서버 주소 (없으면 직접 띄운다)")
+    parser.add_argument("--index-threshold", type=float, default=None, help="글귀 검색 색인을 함께 쓸 때의 기준 유사도")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.api_base is None:
+        server = StubOpenAIServer(("127.0.0.1", 0), latency=args.latency).start()
+        args.api_base = server.api_base
+    openai.api_base = args.api_base
+    openai.api_key = openai.api_key or "stub-key"
+
+    index = QuoteIndex(args.index_threshold) if args.index_threshold is not None else None
+    service = QuoteService(pool_size=args.pool_size, cache=QuoteCache(args.cache), index=index)
+    answers = [[f"답변{i % args.distinct}", "가족", "아니요", "진로", "행복"] for i in range(args.concurrency)]
+
+    started = time.perf_counter()
+    futures = [service.submit(a) for a in answers]
+    errors = 0
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    stats = service.stats()
+    service.close()
+    print(f"요청 {args.concurrency}건 / {elapsed:.3f}초 ({args.concurrency / elapsed:.1f}건/초), 실패 {errors}건")
+    print(f"실제 API 호출 {stats['api_calls']}건, 중복 병합 {stats['coalesced']}건, 캐시 적중 {stats['cache_hits']}건, "
+          f"색인 적중 {stats['index_hits']}건")
+    if server is not None:
+        print(f"스텁 서버 수신 {server.request_count}건")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
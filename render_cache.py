@@ -0,0 +1,223 @@
+# 완성본 렌더링 결과 캐시 (내용 주소 방식)
+# 키는 결과를 결정하는 입력 전체의 해시다: 배경 파일 내용, 글귀, 글꼴 파일 내용, 크기, 색, 테두리/효과, 위치,
+# 줄 바꿈 너비, 배율(출력 크기), 렌더링 방식, 리샘플링 백엔드. 값은 인코딩된 PNG 바이트라서
+# 꺼낸 그대로 화면이나 HTTP 응답으로 보낼 수 있다 (다시 그리거나 인코딩하지 않는다).
+#
+#   메모리 단계: 프로세스 안의 바이트 예산 LRU. 모든 Streamlit 세션이 함께 쓴다.
+#   디스크 단계: <폴더>/<키 앞 2글자>/<키>.png. 여러 프로세스(앱 인스턴스, 렌더링 서버)가 같은 폴더를 함께 쓴다.
+#               임시 파일에 쓴 뒤 os.replace 로 바꾸므로 읽는 쪽은 반쯤 쓰인 파일을 보지 않는다.
+#               읽을 때마다 수정 시각을 갱신하고, 용량 한도를 넘으면 오래 쓰지 않은 파일부터 지운다.
+#
+# BOOKMARK_RENDER_CACHE_DIR 를 빈 문자열로 두면 디스크 단계를 끈다.
+# 렌더링 결과가 달라지는 코드 변경을 하면 CACHE_VERSION 을 올린다.
+import functools
+import hashlib
+import inspect
+import io
+import json
+import os
+import threading
+import time
+
+from bookmark_render import render_bookmark
+from font_registry import font_registry
+from image_cache import LRUByteCache
+from resample import get_backend
+from text_effects import make_style
+
+CACHE_VERSION = 1
+DEFAULT_DIR = os.getenv("BOOKMARK_RENDER_CACHE_DIR", ".render_cache")
+DEFAULT_MAX_BYTES = int(os.getenv("BOOKMARK_RENDER_CACHE_BYTES", 64 * 1024 * 1024))
+DEFAULT_MAX_DISK_BYTES = int(os.getenv("BOOKMARK_RENDER_CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+# 한도를 넘으면 이 비율까지 줄인다 (쓸 때마다 정리하지 않도록 여유를 둔다)
+DISK_LOW_WATER = 0.9
+# 이보다 오래된 임시 파일은 중간에 죽은 프로세스가 남긴 것으로 보고 정리할 때 지운다
+STALE_TEMP_SECONDS = 3600
+# 속도 우선 (1 -> 6 이면 용량은 15% 줄지만 인코딩이 4배 느리다)
+PNG_COMPRESS_LEVEL = 1
+
+# 키에 넣을 render_bookmark 기본값 (인자를 생략한 요청과 기본값을 직접 넘긴 요청이 같은 키가 되도록)
+_RENDER_DEFAULTS = {
+    name: parameter.default for name, parameter in inspect.signature(render_bookmark).parameters.items()
+    if parameter.default is not inspect.Parameter.empty and name != "should_cancel"
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _file_digest(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    # 파일 내용의 해시. (경로, 수정 시각, 크기) 가 같으면 다시 읽지 않는다.
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return _file_digest(path, stat.st_mtime_ns, stat.st_size)
+
+
+def render_key(spec):
+    # spec: render_bookmark 키워드 인자 (should_cancel 제외)
+    spec = {**_RENDER_DEFAULTS, **spec}
+    payload = [
+        CACHE_VERSION,
+        file_digest(spec["image_path"]),
+        font_registry.digest(spec["font_choice"]),
+        spec["text"],
+        spec["font_size"],
+        spec["text_color"],
+        spec["stroke_color"],
+        make_style(spec["stroke_px"], spec["shadow"], spec["glow"]),
+        spec["x"],
+        spec["y"],
+        spec["wrap_width"],
+        spec["upscale_factor"],
+        spec["render_mode"],
+        get_backend()
+    ]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
+
+
+class RenderCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=DEFAULT_DIR, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self._memory = LRUByteCache(max_bytes)
+        self.directory = os.path.abspath(directory) if directory else None
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        # 폴더 전체 용량 추정치. 처음 쓸 때 한 번 세고, 이후에는 이 프로세스가 쓴 양만 더한다
+        # (다른 프로세스가 쓴 양은 다음에 정리할 때 다시 세면서 반영된다).
+        self._disk_bytes = None
+        self._stats = {"disk_hits": 0, "disk_misses": 0, "disk_writes": 0, "disk_evictions": 0, "disk_errors": 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # 최근에 쓴 파일로 표시한다 (정리할 때 오래된 순서의 기준)
+            os.utime(path)
+        except FileNotFoundError:
+            # 없거나, 읽는 사이 다른 프로세스가 지웠다
+            self._count("disk_misses")
+            return None
+        except OSError:
+            self._count("disk_errors")
+            return None
+        self._count("disk_hits")
+        return data
+
+    def _write(self, key, data):
+        # 디스크 단계는 실패해도 렌더링 결과에는 영향이 없으므로 오류를 세기만 한다
+        if self.directory is None:
+            return
+        path = self._path(key)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        except OSError:
+            self._count("disk_errors")
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._stats["disk_writes"] += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data)
+            over = self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+        if over:
+            self.trim()
+
+    def trim(self):
+        # 폴더를 다시 세고, 한도를 넘었으면 수정 시각이 오래된 파일부터 DISK_LOW_WATER 까지 지운다
+        if self.directory is None:
+            return
+        entries, total = [], 0
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith(".tmp"):
+                        if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                            os.remove(path)
+                        continue
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        evicted = 0
+        if total > self.max_disk_bytes:
+            target = self.max_disk_bytes * DISK_LOW_WATER
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats["disk_evictions"] += evicted
+
+    def get(self, key):
+        data = self._memory.get(key)
+        if data is None:
+            data = self._read(key)
+            if data is not None:
+                self._memory.put(key, data, len(data))
+        return data
+
+    def put(self, key, data):
+        self._memory.put(key, data, len(data))
+        self._write(key, data)
+
+    def get_or_render(self, key, render):
+        # render(): PNG 바이트를 돌려주는 함수. 같은 키를 동시에 요청하면 이 프로세스에서는 한 번만 그린다.
+        def load():
+            data = self._read(key)
+            if data is None:
+                data = render()
+                self._write(key, data)
+            return data, len(data)
+        return self._memory.get_or_create(key, load)
+
+    def clear(self):
+        # 메모리 단계만 비운다 (디스크는 다른 프로세스와 함께 쓰므로 trim() 으로만 줄인다)
+        self._memory.clear()
+
+    def stats(self):
+        stats = {"memory": self._memory.stats(), "directory": self.directory, "max_disk_bytes": self.max_disk_bytes}
+        with self._lock:
+            stats.update(self._stats, disk_bytes=self._disk_bytes)
+        return stats
+
+
+render_cache = RenderCache()
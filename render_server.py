@@ -0,0 +1,373 @@
+# 헤드리스 책갈피 렌더링 서버
+# Streamlit 스크립트 스레드가 아니라 별도 프로세스의 풀에서 렌더링해서, 동시 사용자가 많아도
+# LANCZOS 리사이즈가 GIL 뒤에 줄 서며 다른 세션 화면을 멈추지 않게 한다.
+#
+#   POST /render   본문: render_bookmark 키워드 인자 JSON (+ deadline 초), 응답: PNG
+#                  같은 설정의 결과가 렌더링 결과 캐시(render_cache.py)에 있으면 대기열을 거치지 않고 바로 보낸다.
+#   GET  /healthz  대기열/처리 현황 JSON
+#
+# 대기열(max_queue)이 가득 차면 503 + Retry-After 로 바로 거절하고, 작업마다 마감 시간을 넘기면 504 로 끝낸다.
+# 배경 경로는 서버의 --root 기준 상대 경로다 (앱과 같은 폴더에서 실행).
+#
+# 실행:
+#   python render_server.py --port 8766 --workers 4
+#   python render_server.py --unix /tmp/bookmark-render.sock
+# 앱 쪽에서는 BOOKMARK_RENDER_SERVER=http://127.0.0.1:8766 (또는 unix:///tmp/bookmark-render.sock) 로 연결한다.
+import argparse
+import concurrent.futures
+import http.client
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from PIL import Image
+
+from background_store import BACKGROUND_IMAGES
+from bookmark_render import RenderCancelled, render_bookmark
+from image_cache import adopt_shared_backgrounds, background_cache
+from metrics import metrics, stage
+from render_cache import encode_png, render_cache, render_key
+from shared_image import SharedArrayPool
+
+DEFAULT_PORT = 8766
+DEFAULT_DEADLINE = float(os.getenv("BOOKMARK_RENDER_DEADLINE", 30))
+MAX_BODY_BYTES = 64 * 1024
+SPEC_FIELDS = ("image_path", "text", "font_choice", "text_color", "stroke_color", "x", "y",
+               "font_size", "upscale_factor", "render_mode", "wrap_width", "stroke_px", "shadow", "glow")
+
+
+# 연결 실패와 같은 계열로 다루도록 OSError 를 상속한다 (앱에서는 IOError 로 함께 처리된다)
+class RenderServerError(OSError):
+    pass
+
+
+class RenderServerBusy(RenderServerError):
+    # 대기열이 가득 찼다. 잠시 뒤 다시 시도하면 된다.
+    pass
+
+
+class RenderDeadlineExceeded(RenderServerError):
+    pass
+
+
+def _render_job(spec, deadline):
+    # 워커 프로세스에서 실행된다. 마감 시간이 지나면 단계 사이에서 중단하고, PNG 로 인코딩한 바이트만 돌려보낸다.
+    return encode_png(render_bookmark(**spec, should_cancel=lambda: time.time() > deadline))
+
+
+class RenderService:
+    # 프로세스 풀 + 대기열 한도 + 작업별 마감 시간. TCP/유닉스 소켓 서버가 함께 쓴다.
+    def __init__(self, workers=None, max_queue=None, root=".", default_deadline=DEFAULT_DEADLINE,
+                 shared_backgrounds=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue or self.workers * 4
+        self.root = os.path.abspath(root)
+        self.default_deadline = default_deadline
+        # 카탈로그 배경은 한 번만 디코딩해서 공유 메모리로 워커에 넘긴다 (워커마다 디코딩/보관하지 않는다)
+        self._shared = SharedArrayPool()
+        paths = [os.path.join(self.root, name) for name in (shared_backgrounds or [])]
+        descriptors = background_cache.share([path for path in paths if os.path.exists(path)], self._shared)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=adopt_shared_backgrounds,
+                                             initargs=(descriptors,))
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"cached": 0, "completed": 0, "rejected": 0, "timed_out": 0, "failed": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+        metrics.increment(f"render_server_{name}")
+
+    def _spec(self, request):
+        spec = {key: value for key, value in request.items() if key != "deadline"}
+        unknown = set(spec) - set(SPEC_FIELDS)
+        if unknown:
+            raise ValueError(f"알 수 없는 필드입니다: {', '.join(sorted(unknown))}")
+        for field in ("image_path", "text", "font_choice", "text_color", "stroke_color"):
+            if field not in spec:
+                raise ValueError(f"필수 필드가 없습니다: {field}")
+        # 배경 폴더 밖의 파일은 읽지 않는다
+        path = os.path.abspath(os.path.join(self.root, spec["image_path"]))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"배경 폴더 밖의 경로입니다: {spec['image_path']}")
+        spec["image_path"] = path
+        return spec
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def render(self, request):
+        spec = self._spec(request)
+        key = render_key(spec)
+        data = render_cache.get(key)
+        if data is not None:
+            self._count("cached")
+            return data
+        timeout = float(request.get("deadline") or self.default_deadline)
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._stats["rejected"] += 1
+                metrics.increment("render_server_rejected")
+                raise RenderServerBusy(f"렌더링 대기열이 가득 찼습니다 ({self.max_queue})")
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(_render_job, spec, time.time() + timeout)
+        except Exception:
+            self._release()
+            raise
+        # 대기열 자리는 응답을 보낼 때가 아니라 워커가 작업을 실제로 끝내거나 취소될 때 돌려준다
+        # (시간 초과 뒤에도 워커는 다음 중단 지점까지 계속 일하므로, 그 전에 자리를 비우면 대기열 한도가 의미 없어진다)
+        future.add_done_callback(self._release)
+        try:
+            data = future.result(timeout=timeout)
+        except (concurrent.futures.TimeoutError, RenderCancelled):
+            # 아직 시작하지 않은 작업은 취소되고, 진행 중인 작업은 워커가 다음 단계에서 스스로 멈춘다
+            future.cancel()
+            self._count("timed_out")
+            raise RenderDeadlineExceeded(f"렌더링이 {timeout:g}초 안에 끝나지 않았습니다")
+        except Exception:
+            self._count("failed")
+            raise
+        self._count("completed")
+        render_cache.put(key, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(pending=self._pending, max_queue=self.max_queue, workers=self.workers,
+                         shared_bytes=self._shared.nbytes)
+        stats["render_cache"] = render_cache.stats()
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._shared.close()
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send(200, self.server.service.stats())
+        else:
+            self._send(404, {"error": f"알 수 없는 경로: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/render":
+            self._send(404, {"error": f"알 수 없는 경로: {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_BYTES:
+            self._send(413, {"error": "요청 본문이 너무 큽니다"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length))
+            if not isinstance(request, dict):
+                raise ValueError("요청 본문은 JSON 객체여야 합니다")
+            data = self.server.service.render(request)
+        except RenderServerBusy as e:
+            self._send(503, {"error": str(e)}, headers={"Retry-After": "1"})
+        except RenderDeadlineExceeded as e:
+            self._send(504, {"error": str(e)})
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+        except FileNotFoundError as e:
+            self._send(404, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._send(200, data, content_type="image/png")
+
+
+class RenderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, service, address=("127.0.0.1", DEFAULT_PORT)):
+        self.service = service
+        super().__init__(address, RenderHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        # 백그라운드 스레드에서 서버를 실행한다
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class UnixRenderServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+        def __init__(self, service, path):
+            if os.path.exists(path):
+                os.unlink(path)
+            self.service = service
+            super().__init__(path, RenderHandler)
+
+        @property
+        def url(self):
+            return f"unix://{self.server_address}"
+
+        def start(self):
+            threading.Thread(target=self.serve_forever, daemon=True).start()
+            return self
+else:  # Windows 에는 유닉스 소켓이 없다
+    UnixRenderServer = None
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class RenderClient:
+    # 앱 쪽 클라이언트. 서버 오류는 RenderServerError 계열 예외로 올린다.
+    def __init__(self, url, deadline=DEFAULT_DEADLINE):
+        self.url = url
+        self.deadline = deadline
+        self._parsed = urlparse(url)
+
+    def _connection(self, timeout):
+        if self._parsed.scheme == "unix":
+            return _UnixHTTPConnection(self._parsed.path, timeout=timeout)
+        return http.client.HTTPConnection(self._parsed.hostname, self._parsed.port or DEFAULT_PORT, timeout=timeout)
+
+    def _request(self, method, path, body=None, timeout=None):
+        connection = self._connection(timeout)
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def render_png(self, spec, deadline=None):
+        # 서버가 보낸 PNG 바이트를 디코딩하지 않고 그대로 돌려준다
+        deadline = deadline or self.deadline
+        body = json.dumps({**spec, "deadline": deadline}, ensure_ascii=False).encode("utf-8")
+        # 네트워크 대기는 서버 마감 시간보다 조금 길게 잡는다 (서버가 504 를 돌려줄 시간)
+        status, data = self._request("POST", "/render", body, timeout=deadline + 5)
+        if status == 200:
+            return data
+        try:
+            message = json.loads(data).get("error", "")
+        except ValueError:
+            message = data.decode("utf-8", "replace")
+        if status == 503:
+            raise RenderServerBusy(message)
+        if status == 504:
+            raise RenderDeadlineExceeded(message)
+        raise RenderServerError(f"렌더링 서버 오류 ({status}): {message}")
+
+    def render(self, spec, deadline=None):
+        image = Image.open(io.BytesIO(self.render_png(spec, deadline)))
+        image.load()
+        return image
+
+    def stats(self):
+        status, data = self._request("GET", "/healthz", timeout=5)
+        if status != 200:
+            raise RenderServerError(f"렌더링 서버 오류 ({status})")
+        return json.loads(data)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_render_client():
+    # BOOKMARK_RENDER_SERVER 가 없으면 None (앱이 직접 렌더링한다)
+    global _client
+    url = os.getenv("BOOKMARK_RENDER_SERVER")
+    if not url:
+        return None
+    with _client_lock:
+        if _client is None or _client.url != url:
+            _client = RenderClient(url)
+        return _client
+
+
+def render_remote(should_cancel=None, **spec):
+    # render_bookmark 와 같은 인자로 서버에 맡긴다. 서버 쪽 작업은 중간에 멈출 수 없으므로 보내기 전에만 확인한다.
+    if should_cancel is not None and should_cancel():
+        raise RenderCancelled()
+    with stage("remote_render"):
+        return get_render_client().render(spec)
+
+
+def render_remote_png(should_cancel=None, **spec):
+    # render_remote 와 같지만 PNG 바이트를 그대로 돌려준다 (렌더링 결과 캐시에 그대로 넣는다)
+    if should_cancel is not None and should_cancel():
+        raise RenderCancelled()
+    with stage("remote_render"):
+        return get_render_client().render_png(spec)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="헤드리스 책갈피 렌더링 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="TCP 대신 유닉스 소켓 경로로 연다")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="렌더링 워커 프로세스 수")
+    parser.add_argument("--max-queue", type=int, default=None, help="대기+진행 중 작업 한도 (기본값: 워커 수 x 4)")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE, help="요청에 deadline 이 없을 때의 마감 시간(초)")
+    parser.add_argument("--root", default=".", help="배경 이미지 폴더")
+    parser.add_argument("--no-shared-backgrounds", action="store_true",
+                        help="카탈로그 배경을 공유 메모리로 워커에 넘기지 않는다")
+    args = parser.parse_args(argv)
+
+    shared = None if args.no_shared_backgrounds else BACKGROUND_IMAGES
+    service = RenderService(args.workers, args.max_queue, args.root, args.deadline, shared)
+    if args.unix:
+        if UnixRenderServer is None:
+            parser.error("이 플랫폼은 유닉스 소켓을 지원하지 않습니다")
+        server = UnixRenderServer(service, args.unix)
+    else:
+        server = RenderServer(service, (args.host, args.port))
+    print(f"렌더링 서버 실행 중: {server.url} (워커 {service.workers}개, 대기열 {service.max_queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
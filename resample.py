@@ -0,0 +1,130 @@
+# 리샘플링 백엔드
+# 업스케일/다운스케일 경로에서 쓰는 리사이즈 구현을 하나의 인터페이스로 묶는다.
+# BOOKMARK_RESAMPLE_BACKEND 환경 변수나 set_backend() 로 고른다.
+#   pil    : Pillow LANCZOS (기본값)
+#   opencv : 축소는 INTER_AREA, 확대는 INTER_CUBIC. 채널 순서와 무관하므로 RGB↔BGR 변환 없이 그대로 넘긴다.
+#   numpy  : 순수 NumPy 박스 필터 (정수 배율은 reshape/broadcast 로 바로 처리)
+import os
+
+import numpy as np
+from PIL import Image
+
+from shared_image import wrap_image
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def _resize_opencv(array, size):
+    downscale = size[0] < array.shape[1] or size[1] < array.shape[0]
+    interpolation = cv2.INTER_AREA if downscale else cv2.INTER_CUBIC
+    return cv2.resize(array, size, interpolation=interpolation)
+
+
+def _box_weights(src, dst):
+    # 출력 픽셀 하나가 덮는 입력 구간과 각 입력 픽셀이 겹치는 비율 (dst x src)
+    scale = src / dst
+    edges = np.arange(dst + 1) * scale
+    pixels = np.arange(src)
+    overlap = np.minimum(edges[1:, None], pixels[None, :] + 1) - np.maximum(edges[:-1, None], pixels[None, :])
+    return (np.clip(overlap, 0, None) / scale).astype(np.float32)
+
+
+def _resize_numpy(array, size):
+    width, height = size
+    src_height, src_width = array.shape[:2]
+    channels = array.shape[2:]
+
+    # 정수 배율 축소: 블록 평균
+    if src_width % width == 0 and src_height % height == 0 and src_width >= width and src_height >= height:
+        fx, fy = src_width // width, src_height // height
+        # uint8 합계가 넘치지 않으면 uint16 으로 더한다. 메모리를 연속으로 읽도록 행 방향부터 합친다.
+        acc_dtype = np.uint16 if array.dtype == np.uint8 and fx * fy <= 257 else np.float32
+        rows = np.ascontiguousarray(array).reshape(height, fy, -1)
+        acc = rows[:, 0].astype(acc_dtype)
+        for k in range(1, fy):
+            acc += rows[:, k]
+        cols = acc.reshape(height, width, fx, -1)
+        out = cols[:, :, 0].astype(acc_dtype)
+        for k in range(1, fx):
+            out += cols[:, :, k]
+        return (out * np.float32(1 / (fx * fy))).reshape(height, width, *channels)
+
+    # 정수 배율 확대: 픽셀 복제 (복사는 한 번만 일어난다)
+    if width % src_width == 0 and height % src_height == 0:
+        fx, fy = width // src_width, height // src_height
+        expanded = np.broadcast_to(
+            array[:, None, :, None],
+            (src_height, fy, src_width, fx, *channels)
+        )
+        return expanded.reshape(height, width, *channels)
+
+    # 그 밖의 배율: 가로/세로 분리형 면적 가중 평균
+    rows = _box_weights(src_height, height)
+    cols = _box_weights(src_width, width)
+    out = np.tensordot(rows, array.astype(np.float32), axes=(1, 0))
+    out = np.tensordot(cols, out, axes=(1, 1))
+    return np.swapaxes(out, 0, 1)
+
+
+def _resize_pil(array, size):
+    return np.asarray(Image.fromarray(array).resize(size, Image.LANCZOS))
+
+
+BACKENDS = {
+    "pil": _resize_pil,
+    "opencv": _resize_opencv,
+    "numpy": _resize_numpy
+}
+
+_backend = os.getenv("BOOKMARK_RESAMPLE_BACKEND", "pil")
+
+
+def available_backends():
+    return [name for name in BACKENDS if name != "opencv" or cv2 is not None]
+
+
+def set_backend(name):
+    global _backend
+    if name not in available_backends():
+        raise ValueError(f"사용할 수 없는 리샘플링 백엔드입니다: {name} (가능: {', '.join(available_backends())})")
+    _backend = name
+
+
+def get_backend(name=None):
+    name = name or _backend
+    if name not in available_backends():
+        raise ValueError(f"사용할 수 없는 리샘플링 백엔드입니다: {name} (가능: {', '.join(available_backends())})")
+    return name
+
+
+def resize_array(array, size, backend=None):
+    # size 는 PIL 과 같이 (너비, 높이) 순서다
+    backend = get_backend(backend)
+    if backend == "pil":
+        return _resize_pil(array, size)
+
+    # RGBA 는 알파를 곱한 상태로 리샘플링해야 투명한 가장자리에 검은 테두리가 생기지 않는다
+    premultiply = array.ndim == 3 and array.shape[2] == 4
+    if premultiply:
+        alpha = array[..., 3:].astype(np.float32)
+        array = np.concatenate([array[..., :3] * (alpha / 255), alpha], axis=2)
+
+    out = BACKENDS[backend](array, size)
+
+    if premultiply:
+        alpha = out[..., 3:]
+        out = np.concatenate([out[..., :3] * (255 / np.maximum(alpha, 1e-3)), alpha], axis=2)
+    if out.dtype != np.uint8:
+        out = np.clip(np.rint(out), 0, 255).astype(np.uint8)
+    return out
+
+
+def resize_image(image, size, backend=None):
+    # PIL 이미지를 받아 PIL 이미지를 돌려준다. pil 백엔드는 변환 없이 바로 처리한다.
+    backend = get_backend(backend)
+    if backend == "pil":
+        return image.resize(size, Image.LANCZOS)
+    return wrap_image(resize_array(np.asarray(image), size, backend))
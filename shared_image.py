@@ -0,0 +1,99 @@
+# 프로세스 사이 배경 배열 공유와 복사 없는 PIL 감싸기
+# 부모 프로세스가 디코딩한 배경을 공유 메모리(multiprocessing.shared_memory)에 한 번 올려 두면,
+# 워커 프로세스는 세그먼트 이름만 받아서 피클이나 복사 없이 같은 메모리를 NumPy 배열로 붙여 쓴다.
+# 피라미드 working 단계(.npy 메모리 매핑)는 운영체제가 이미 페이지를 공유하므로 따로 올리지 않는다.
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+# Pillow 가 메모리를 그대로 쓸 수 있는 배열 모양 (채널 수 -> 모드). RGB 는 내부적으로 픽셀당 4바이트라 복사가 필요하다.
+_MAPPED_MODES = {1: "L", 4: "RGBA"}
+
+# 붙인 세그먼트는 배열이 살아 있는 동안 닫히면 안 되므로 프로세스가 끝날 때까지 들고 있는다
+_attached = {}
+
+
+class SharedArrayPool:
+    # 게시하는 쪽(부모 프로세스). close() 에서 세그먼트를 모두 지운다.
+    def __init__(self):
+        self._segments = []
+
+    def allocate(self, key, shape, dtype=np.uint8):
+        # 빈 공유 배열을 만든다. (설명자, 쓰기 가능한 배열) 을 돌려준다. 배열은 close() 전에 놓아야 한다.
+        dtype = np.dtype(dtype)
+        segment = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self._segments.append(segment)
+        array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        return {"key": key, "name": segment.name, "shape": tuple(shape), "dtype": dtype.str}, array
+
+    def publish(self, key, array):
+        # 배열을 공유 메모리로 복사하고, 워커에 넘길 작은 설명자(dict)를 돌려준다
+        descriptor, shared = self.allocate(key, array.shape, array.dtype)
+        shared[...] = array
+        del shared
+        return descriptor
+
+    @property
+    def nbytes(self):
+        return sum(segment.size for segment in self._segments)
+
+    def close(self):
+        for segment in self._segments:
+            try:
+                segment.close()
+            except BufferError:
+                # 아직 남아 있는 배열(예외 추적 정보 등)이 있으면 매핑은 그 배열이 사라질 때 풀린다. 이름은 아래에서 지운다.
+                pass
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+        self._segments.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach(descriptor):
+    # 워커에서 설명자로 세그먼트를 열어 읽기 전용 배열로 돌려준다
+    name = descriptor["name"]
+    segment = _attached.get(name)
+    if segment is None:
+        # 워커는 게시한 프로세스의 자식이라 리소스 트래커를 함께 쓴다. 이름은 이미 등록되어 있으므로
+        # 다시 등록되어도 항목은 하나이고, 게시한 쪽의 close() 에서 한 번만 정리된다.
+        segment = shared_memory.SharedMemory(name=name)
+        _attached[name] = segment
+    array = np.ndarray(descriptor["shape"], dtype=np.dtype(descriptor["dtype"]), buffer=segment.buf)
+    array.setflags(write=False)
+    return array
+
+
+def with_shared_array(descriptor, function, *args):
+    # 세그먼트를 잠깐 붙여 쓰기 가능한 배열로 function(array, *args) 를 실행하고 바로 닫는다
+    # (예: 여러 워커가 나눠 그리는 인쇄 캔버스). attach() 와 달리 붙인 채로 두지 않으므로
+    # function 은 배열이나 그 일부를 돌려주거나 보관하면 안 된다.
+    segment = shared_memory.SharedMemory(name=descriptor["name"])
+    array = np.ndarray(descriptor["shape"], dtype=np.dtype(descriptor["dtype"]), buffer=segment.buf)
+    try:
+        return function(array, *args)
+    finally:
+        del array
+        try:
+            segment.close()
+        except BufferError:
+            # 예외 추적 정보가 아직 배열을 잡고 있으면 프로세스가 끝날 때 정리된다
+            pass
+
+
+def wrap_image(array):
+    # 가능하면 복사 없이 PIL 이미지로 감싼다 (읽기 전용 배열이면 Pillow 가 수정하기 전에 스스로 복사한다)
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    mode = _MAPPED_MODES.get(channels)
+    if mode is None or array.dtype != np.uint8 or not array.flags.c_contiguous:
+        return Image.fromarray(array)
+    height, width = array.shape[:2]
+    return Image.frombuffer(mode, (width, height), array, "raw", mode, 0, 1)
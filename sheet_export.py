@@ -0,0 +1,268 @@
+# 인쇄용 책갈피 시트 (용지 한 장에 여러 개 앉히기)
+# 책갈피 여러 개를 A4/A3 용지에 칸으로 나눠 배치하고 재단선을 그려 인쇄용 PDF/PNG 로 내보낸다.
+#
+#   - 용지 한 장 크기의 RGB 캔버스를 공유 메모리에 한 번만 만들고, 워커 프로세스들이 책갈피마다 자기 칸에 띠 단위로 바로 그린다
+#     (bookmark_export.py 의 띠 렌더링을 그대로 쓴다). 책갈피마다 전체 크기의 중간 이미지를 따로 만들지 않는다.
+#   - 칸이 모자라면 같은 캔버스를 지우고 다음 장을 그린다. 최대 메모리는 책갈피 수와 상관없이 캔버스 한 장 + 워커마다
+#     띠 하나와 글귀 레이어 조각 하나다 (글귀 레이어도 띠 안에서 조각으로 나눠 그린다, bookmark_export.py 참고).
+#   - PDF 는 장마다 한 페이지, PNG 는 한 장에 모두 들어갈 때만 쓸 수 있다.
+#
+# 사용 예:
+#   python sheet_export.py jobs.jsonl -o sheet.pdf --paper A4 --width-mm 50
+import argparse
+import math
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from bookmark_export import DEFAULT_DPI, _strip_height, _strips, _write_pdf_pages, _write_png, export_size
+from bookmark_render import STROKE_PX
+from image_cache import adopt_shared_backgrounds, background_cache
+from metrics import stage, timed
+from shared_image import SharedArrayPool, with_shared_array
+from text_effects import make_style
+
+PAPER_SIZES_MM = {"A4": (210, 297), "A3": (297, 420)}
+SHEET_FORMATS = ("pdf", "png")
+DEFAULT_SHEET_WIDTH_MM = 50
+DEFAULT_MARGIN_MM = 10
+# 칸 사이 간격. 양쪽 재단선(간격 + 길이)이 이웃 책갈피와 겹치지 않을 만큼은 되어야 한다.
+DEFAULT_GUTTER_MM = 10
+CROP_MARK_MM = 3
+CROP_OFFSET_MM = 1.5
+CROP_LINE_MM = 0.1
+
+# 책갈피 하나의 인자 (render_bookmark 와 같은 이름). 빠진 값은 기본값으로 채운다.
+SPEC_DEFAULTS = {
+    "text_color": "#000000",
+    "stroke_color": "#FFFFFF",
+    "x": None,
+    "y": None,
+    "font_size": 60,
+    "upscale_factor": 6,
+    "wrap_width": None,
+    "stroke_px": STROKE_PX,
+    "shadow": None,
+    "glow": None
+}
+REQUIRED_FIELDS = ("image_path", "text", "font_choice")
+
+# slots: 책갈피마다 (장 번호, (왼쪽, 위), (너비, 높이))
+SheetLayout = namedtuple("SheetLayout", ["size", "columns", "rows", "pages", "slots"])
+
+
+def _mm(value, dpi):
+    return round(value / 25.4 * dpi)
+
+
+def _bookmark_spec(spec):
+    missing = [field for field in REQUIRED_FIELDS if field not in spec]
+    if missing:
+        raise ValueError(f"필수 필드가 없습니다: {', '.join(missing)}")
+    unknown = set(spec) - set(REQUIRED_FIELDS) - set(SPEC_DEFAULTS)
+    if unknown:
+        raise ValueError(f"알 수 없는 필드입니다: {', '.join(sorted(unknown))}")
+    return {**SPEC_DEFAULTS, **spec}
+
+
+def sheet_layout(specs, paper="A4", landscape=False, width_mm=DEFAULT_SHEET_WIDTH_MM, dpi=DEFAULT_DPI,
+                 margin_mm=DEFAULT_MARGIN_MM, gutter_mm=DEFAULT_GUTTER_MM):
+    # 책갈피 너비는 모두 같고 높이는 배경 비율을 따른다. 칸 높이는 가장 긴 책갈피에 맞추고, 짧은 책갈피는 칸 가운데에 둔다.
+    if paper not in PAPER_SIZES_MM:
+        raise ValueError(f"지원하지 않는 용지입니다: {paper} (가능: {', '.join(PAPER_SIZES_MM)})")
+    paper_width, paper_height = PAPER_SIZES_MM[paper]
+    if landscape:
+        paper_width, paper_height = paper_height, paper_width
+    size = (_mm(paper_width, dpi), _mm(paper_height, dpi))
+    sizes = [export_size(spec["image_path"], width_mm, dpi) for spec in specs]
+    slot_width = sizes[0][0]
+    slot_height = max(height for _, height in sizes)
+    margin, gutter = _mm(margin_mm, dpi), _mm(gutter_mm, dpi)
+
+    columns = (size[0] - 2 * margin + gutter) // (slot_width + gutter)
+    rows = (size[1] - 2 * margin + gutter) // (slot_height + gutter)
+    if columns < 1 or rows < 1:
+        raise ValueError(f"책갈피({width_mm}mm)가 {paper} 용지의 인쇄 영역보다 큽니다")
+
+    # 칸 묶음 전체를 용지 가운데에 둔다
+    left = (size[0] - (columns * slot_width + (columns - 1) * gutter)) // 2
+    top = (size[1] - (rows * slot_height + (rows - 1) * gutter)) // 2
+    per_page = columns * rows
+    slots = []
+    for index, (width, height) in enumerate(sizes):
+        page, position = divmod(index, per_page)
+        row, column = divmod(position, columns)
+        origin = (left + column * (slot_width + gutter), top + row * (slot_height + gutter) + (slot_height - height) // 2)
+        slots.append((page, origin, (width, height)))
+    return SheetLayout(size, columns, rows, math.ceil(len(specs) / per_page), slots)
+
+
+def _draw_crop_marks(canvas, boxes, dpi):
+    # 재단선: 책갈피 모서리마다 바깥쪽으로 가로/세로 선 하나씩 (재단 위치에서 CROP_OFFSET_MM 만큼 띄운다)
+    length, offset = _mm(CROP_MARK_MM, dpi), _mm(CROP_OFFSET_MM, dpi)
+    line = max(1, _mm(CROP_LINE_MM, dpi))
+
+    def fill(x0, y0, x1, y1):
+        canvas[max(0, y0):max(0, y1), max(0, x0):max(0, x1)] = 0
+
+    for left, top, right, bottom in boxes:
+        for x in (left, right):
+            x0 = x - line // 2
+            fill(x0, top - offset - length, x0 + line, top - offset)
+            fill(x0, bottom + offset, x0 + line, bottom + offset + length)
+        for y in (top, bottom):
+            y0 = y - line // 2
+            fill(left - offset - length, y0, left - offset, y0 + line)
+            fill(right + offset, y0, right + offset + length, y0 + line)
+
+
+def _paint_slot(canvas, spec, origin, size):
+    # 책갈피 하나를 캔버스의 제 칸에 띠 단위로 그린다
+    left, top = origin
+    strips = _strips(spec["image_path"], spec["text"], spec["font_choice"], spec["text_color"], spec["stroke_color"],
+                     spec["x"], spec["y"], spec["font_size"], spec["upscale_factor"], spec["wrap_width"],
+                     make_style(spec["stroke_px"], spec["shadow"], spec["glow"]), size, _strip_height(size, "png"))
+    for strip_top, strip in strips:
+        canvas[top + strip_top:top + strip_top + strip.height, left:left + size[0]] = np.asarray(strip)
+
+
+def _render_slot(descriptor, spec, origin, size):
+    # 워커 프로세스에서 실행된다. 캔버스는 공유 메모리라 결과를 돌려보낼 필요가 없다.
+    with_shared_array(descriptor, _paint_slot, spec, origin, size)
+
+
+def _canvas_strips(canvas, rows):
+    for top in range(0, canvas.shape[0], rows):
+        yield top, Image.fromarray(canvas[top:top + rows])
+
+
+def _pages(canvas, descriptor, specs, layout, dpi, rows, crop_marks, executor):
+    # 장마다 캔버스를 지우고 그린 뒤 띠 목록을 내놓는다. 쓰는 쪽이 앞 장을 다 쓴 뒤에 다음 장을 그린다.
+    for page in range(layout.pages):
+        slots = [(spec, origin, size) for spec, (slot_page, origin, size) in zip(specs, layout.slots)
+                 if slot_page == page]
+        with stage("sheet_page"):
+            canvas.fill(255)
+            # 재단선을 먼저 그려야 칸에 겹치는 부분이 있어도 책갈피가 덮는다
+            if crop_marks:
+                _draw_crop_marks(canvas, [(x, y, x + width, y + height) for _, (x, y), (width, height) in slots], dpi)
+            if executor is None:
+                for slot in slots:
+                    _paint_slot(canvas, *slot)
+            else:
+                for future in [executor.submit(_render_slot, descriptor, *slot) for slot in slots]:
+                    future.result()
+        yield _canvas_strips(canvas, rows)
+
+
+@timed("sheet")
+def export_sheet(out, specs, paper="A4", landscape=False, width_mm=DEFAULT_SHEET_WIDTH_MM, dpi=DEFAULT_DPI,
+                 image_format="pdf", margin_mm=DEFAULT_MARGIN_MM, gutter_mm=DEFAULT_GUTTER_MM, crop_marks=True,
+                 quality=95, workers=None):
+    # specs: 책갈피 인자 dict 목록 (image_path, text, font_choice 는 필수, 나머지는 render_bookmark 와 같다).
+    # workers 가 1 이하이면 현재 프로세스에서 그린다. 배치 결과(SheetLayout)를 돌려준다.
+    if image_format not in SHEET_FORMATS:
+        raise ValueError(f"지원하지 않는 시트 형식입니다: {image_format}")
+    specs = [_bookmark_spec(spec) for spec in specs]
+    if not specs:
+        raise ValueError("시트에 넣을 책갈피가 없습니다")
+    layout = sheet_layout(specs, paper, landscape, width_mm, dpi, margin_mm, gutter_mm)
+    if image_format == "png" and layout.pages > 1:
+        raise ValueError(f"PNG 는 한 장만 만들 수 있습니다 ({len(specs)}개는 {layout.pages}장이 필요합니다)")
+    workers = min(workers or os.cpu_count() or 1, layout.columns * layout.rows, len(specs))
+    width, height = layout.size
+    rows = _strip_height(layout.size, image_format)
+
+    with SharedArrayPool() as pool:
+        descriptor, canvas = pool.allocate("sheet", (height, width, 3))
+        executor = None
+        pages = None
+        try:
+            if workers > 1:
+                # 배경은 한 번만 디코딩해서 공유 메모리로 워커에 넘긴다
+                backgrounds = background_cache.share(sorted({spec["image_path"] for spec in specs}), pool)
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=adopt_shared_backgrounds,
+                                               initargs=(backgrounds,))
+            pages = _pages(canvas, descriptor, specs, layout, dpi, rows, crop_marks, executor)
+            if image_format == "png":
+                _write_png(out, next(pages), layout.size, dpi)
+            else:
+                _write_pdf_pages(out, pages, layout.pages, layout.size, dpi, quality, rows)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if pages is not None:
+                pages.close()
+            # 캔버스를 잡고 있으면 pool 이 세그먼트를 닫지 못한다
+            del canvas, pages
+    return layout
+
+
+def job_spec(job, background_dir="."):
+    # batch_render.py 작업 항목을 책갈피 인자로 바꾼다
+    from batch_render import DEFAULT_JOB, _optional_int
+
+    job = {**DEFAULT_JOB, **job}
+    return {
+        "image_path": os.path.join(background_dir, job["background"]),
+        "text": job["quote"],
+        "font_choice": job["font"],
+        "text_color": job["text_color"],
+        "stroke_color": job["stroke_color"],
+        "x": _optional_int(job["x"]),
+        "y": _optional_int(job["y"]),
+        "font_size": int(job["font_size"])
+    }
+
+
+def main(argv=None):
+    from batch_render import peak_rss_mb, read_jobs
+
+    parser = argparse.ArgumentParser(description="책갈피 여러 개를 용지 한 장에 배치한 인쇄용 시트")
+    parser.add_argument("jobs", help="작업 목록 파일 (.jsonl 또는 .csv, batch_render.py 와 같은 형식)")
+    parser.add_argument("-o", "--output", default="sheet.pdf", help="결과 파일 (.pdf 또는 .png)")
+    parser.add_argument("--format", choices=SHEET_FORMATS, default=None, help="기본값: 결과 파일 확장자")
+    parser.add_argument("--paper", choices=sorted(PAPER_SIZES_MM), default="A4")
+    parser.add_argument("--landscape", action="store_true", help="용지를 가로로 놓는다")
+    parser.add_argument("--width-mm", type=float, default=DEFAULT_SHEET_WIDTH_MM, help="책갈피 가로 길이")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI)
+    parser.add_argument("--margin-mm", type=float, default=DEFAULT_MARGIN_MM)
+    parser.add_argument("--gutter-mm", type=float, default=DEFAULT_GUTTER_MM)
+    parser.add_argument("--no-crop-marks", action="store_true", help="재단선을 그리지 않는다")
+    parser.add_argument("--quality", type=int, default=95, help="PDF 에 담는 JPEG 품질")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="워커 프로세스 수")
+    parser.add_argument("--background-dir", default=".", help="배경 이미지 폴더")
+    args = parser.parse_args(argv)
+
+    image_format = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if image_format not in SHEET_FORMATS:
+        parser.error(f"결과 형식을 알 수 없습니다: {args.output} (--format 으로 지정하세요)")
+    specs = [job_spec(job, args.background_dir) for job in read_jobs(args.jobs)]
+
+    started = time.perf_counter()
+    try:
+        with open(args.output, "wb") as f:
+            layout = export_sheet(f, specs, args.paper, args.landscape, args.width_mm, args.dpi, image_format,
+                                  args.margin_mm, args.gutter_mm, not args.no_crop_marks, args.quality, args.workers)
+    except BaseException as e:
+        # 중간에 실패하면 반쯤 쓴 결과 파일을 남기지 않는다
+        if os.path.exists(args.output):
+            os.remove(args.output)
+        if isinstance(e, ValueError):
+            parser.error(str(e))
+        raise
+    elapsed = time.perf_counter() - started
+
+    print(f"시트 완료: 책갈피 {len(specs)}개, {layout.pages}장 (장당 {layout.columns}x{layout.rows}), "
+          f"{layout.size[0]}x{layout.size[1]}px, {elapsed:.2f}초 -> {args.output}")
+    print(f"최대 RSS: 메인 {peak_rss_mb()} MB, 워커 {peak_rss_mb(children=True)} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
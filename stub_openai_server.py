@@ -0,0 +1,111 @@
+# OpenAI ChatCompletion 엔드포인트를 흉내 내는 로컬 스텁 서버
+# 네트워크 없이 글귀 생성 경로를 시험하거나 부하 테스트할 때 사용한다.
+#
+# 사용 예:
+#   python stub_openai_server.py --port 8765 --latency 0.5
+#   (앱 쪽에서는 OPENAI_API_BASE=http://127.0.0.1:8765/v1 로 연결)
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_QUOTES = [
+    "오늘의 당신도 충분히 빛나요",
+    "천천히 가도 괜찮아요",
+    "당신의 마음은 늘 따뜻해요",
+    "작은 걸음이 큰 길을 만들어요",
+    "지금 이대로도 소중해요"
+]
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, latency=0.0, error_rate=0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def api_base(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def next_request_number(self):
+        with self._lock:
+            self.request_count += 1
+            return self.request_count
+
+    def start(self):
+        # 백그라운드 스레드에서 서버를 실행한다
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"알 수 없는 경로: {self.path}", "type": "invalid_request_error"}})
+            return
+
+        number = self.server.next_request_number()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.error_rate and (number * 7919 % 1000) < self.server.error_rate * 1000:
+            self._send(500, {"error": {"message": "스텁 서버 오류", "type": "server_error"}})
+            return
+
+        request = json.loads(body or b"{}")
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        quote = STUB_QUOTES[sum(map(ord, prompt)) % len(STUB_QUOTES)]
+        self._send(200, {
+            "id": f"chatcmpl-stub-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": quote},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI ChatCompletion 스텁 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="응답 지연 (초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 오류를 돌려줄 비율 (0~1)")
+    args = parser.parse_args(argv)
+
+    server = StubOpenAIServer((args.host, args.port), latency=args.latency, error_rate=args.error_rate)
+    print(f"스텁 서버 실행 중: {server.api_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
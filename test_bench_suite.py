@@ -0,0 +1,39 @@
+# 벤치마크 회귀 검사: 중앙값 기준과 검사 통계
+from bench_suite import P95_MIN_SAMPLES, compare, median_baseline
+
+
+def _run(p50, p95, count=P95_MIN_SAMPLES, rss=100.0):
+    return {"suites": {"render": {"benchmarks": {"render": {"count": count, "p50_ms": p50, "p95_ms": p95}},
+                                  "peak_rss_mb": rss}}}
+
+
+def test_baseline_is_median_of_recent_runs():
+    baseline = median_baseline([_run(10, 20, rss=100), _run(14, 30, rss=120), _run(11, 22, rss=90)])
+    assert baseline["suites"]["render"]["benchmarks"]["render"] == {"count": P95_MIN_SAMPLES, "p50_ms": 11.0,
+                                                                   "p95_ms": 22.0}
+    assert baseline["suites"]["render"]["peak_rss_mb"] == 100.0
+
+
+def test_one_lucky_run_does_not_fail_typical_run():
+    baseline = median_baseline([_run(10, 20), _run(6, 12), _run(10, 21), _run(11, 20)])
+    assert compare(baseline, _run(10.5, 21), 0.15, 0.10) == []
+
+
+def test_gates_on_p95_by_default():
+    baseline = median_baseline([_run(10, 20)])
+    failures = compare(baseline, _run(10, 30), 0.15, 0.10)
+    assert len(failures) == 1 and "p95" in failures[0]
+    assert compare(baseline, _run(10, 30), 0.15, 0.10, gate_stat="p50") == []
+
+
+def test_few_samples_fall_back_to_p50():
+    baseline = median_baseline([_run(10, 20, count=5)])
+    assert compare(baseline, _run(10, 30, count=5), 0.15, 0.10) == []
+    failures = compare(baseline, _run(13, 20, count=5), 0.15, 0.10)
+    assert len(failures) == 1 and "p50" in failures[0]
+
+
+def test_memory_regression_fails():
+    baseline = median_baseline([_run(10, 20, rss=100)])
+    failures = compare(baseline, _run(10, 20, rss=120), 0.15, 0.10)
+    assert failures == ["render: peak RSS 100.0MB -> 120MB (+20%)"]
@@ -0,0 +1,25 @@
+# 바이트 예산 LRU 캐시: None 값 캐시와 적중/실패 집계
+from image_cache import LRUByteCache
+
+
+def test_none_value_is_cached():
+    cache = LRUByteCache(1024)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return None, 0
+
+    assert cache.get_or_create("empty", factory) is None
+    assert cache.get_or_create("empty", factory) is None
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_get_default_distinguishes_missing_from_none():
+    cache = LRUByteCache(1024)
+    missing = object()
+    assert cache.get("empty", missing) is missing
+    cache.put("empty", None, 0)
+    assert cache.get("empty", missing) is None
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,39 @@
+# 단계 계측: 중첩된 단계와 최대 할당량
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from metrics import Metrics
+
+
+@pytest.fixture
+def metrics():
+    metrics = Metrics()
+    was_tracing = tracemalloc.is_tracing()
+    metrics.enable_memory_tracking()
+    yield metrics
+    if not was_tracing:
+        metrics.disable_memory_tracking()
+
+
+def test_outer_peak_keeps_allocation_before_nested_stage(metrics):
+    with metrics.stage("outer"):
+        big = np.ones(50 * 1024 * 1024, dtype=np.uint8)
+        del big
+        with metrics.stage("inner"):
+            small = np.ones(1024 * 1024, dtype=np.uint8)
+            del small
+    stages = metrics.snapshot()["stages"]
+    assert stages["outer"]["peak_alloc_bytes"] >= 50 * 1024 * 1024
+    assert 1024 * 1024 <= stages["inner"]["peak_alloc_bytes"] < 50 * 1024 * 1024
+
+
+def test_outer_peak_includes_nested_stage(metrics):
+    with metrics.stage("outer"):
+        with metrics.stage("inner"):
+            big = np.ones(8 * 1024 * 1024, dtype=np.uint8)
+            del big
+    stages = metrics.snapshot()["stages"]
+    assert stages["outer"]["peak_alloc_bytes"] >= 8 * 1024 * 1024
+    assert stages["outer"]["count"] == stages["inner"]["count"] == 1
@@ -0,0 +1,123 @@
+# 렌더링 결과 캐시: 키 정규화, 바이트 예산, 디스크 정리, 임시 파일 정리
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import render_cache
+from render_cache import DISK_LOW_WATER, STALE_TEMP_SECONDS, RenderCache, render_key
+
+
+@pytest.fixture
+def spec(tmp_path, monkeypatch):
+    # 글꼴 파일은 저장소에 없으므로 글꼴 해시는 이름으로 대신한다
+    monkeypatch.setattr(render_cache.font_registry, "digest", lambda family: f"font:{family}")
+    path = tmp_path / "background.png"
+    Image.new("RGB", (32, 48), "#336699").save(path)
+    return {"image_path": str(path), "text": "오늘도 한 걸음씩", "font_choice": "나눔손글씨 가람연꽃",
+            "text_color": "#000000", "stroke_color": "#FFFFFF"}
+
+
+def _files(directory, suffix):
+    return sorted(name for _, _, files in os.walk(directory) for name in files if name.endswith(suffix))
+
+
+def _age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_key_ignores_explicit_defaults(spec):
+    explicit = {**spec, **render_cache._RENDER_DEFAULTS}
+    assert render_key(spec) == render_key(explicit)
+    assert render_key(spec) != render_key({**spec, "text": "다른 글귀"})
+    assert render_key(spec) != render_key({**spec, "font_size": render_cache._RENDER_DEFAULTS["font_size"] + 1})
+
+
+def test_key_follows_background_content(spec):
+    before = render_key(spec)
+    Image.new("RGB", (32, 48), "#993366").save(spec["image_path"])
+    os.utime(spec["image_path"], ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+    assert render_key(spec) != before
+
+
+def test_memory_budget_evicts_least_recently_used():
+    cache = RenderCache(max_bytes=250, directory="")
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    assert cache.get("a") == b"a" * 100
+    cache.put("c", b"c" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["memory"]["bytes"] <= 250
+
+
+def test_disk_budget_evicts_oldest_files(tmp_path):
+    cache = RenderCache(max_bytes=1, directory=tmp_path, max_disk_bytes=1000)
+    for index in range(5):
+        cache.put(f"{index:02d}key", bytes(300))
+        _age(cache._path(f"{index:02d}key"), 100 - index)
+    assert sum(os.path.getsize(cache._path(f"{index:02d}key")) for index in range(5)
+               if os.path.exists(cache._path(f"{index:02d}key"))) <= 1000
+    assert os.path.exists(cache._path("04key"))
+    assert not os.path.exists(cache._path("00key"))
+
+
+def test_trim_reaches_low_water_mark(tmp_path):
+    cache = RenderCache(max_bytes=1, directory=tmp_path, max_disk_bytes=10_000)
+    for index in range(20):
+        path = cache._path(f"{index:02d}key")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(bytes(1000))
+        _age(path, 1000 - index)
+    cache.trim()
+    remaining = [index for index in range(20) if os.path.exists(cache._path(f"{index:02d}key"))]
+    assert len(remaining) * 1000 <= 10_000 * DISK_LOW_WATER
+    # 오래된 파일부터 지우고 최근 파일은 남긴다
+    assert remaining == list(range(20 - len(remaining), 20))
+    assert cache.stats()["disk_bytes"] == len(remaining) * 1000
+    assert cache.stats()["disk_evictions"] == 20 - len(remaining)
+
+
+def test_trim_removes_only_stale_temp_files(tmp_path):
+    cache = RenderCache(max_bytes=1, directory=tmp_path)
+    os.makedirs(tmp_path / "ab")
+    stale, fresh = tmp_path / "ab" / "abkey.png.1.1.tmp", tmp_path / "ab" / "abkey.png.2.2.tmp"
+    stale.write_bytes(b"partial")
+    fresh.write_bytes(b"partial")
+    _age(stale, STALE_TEMP_SECONDS + 60)
+    cache.trim()
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    cache = RenderCache(directory=tmp_path)
+
+    def fail(source, target):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(render_cache.os, "replace", fail)
+    cache.put("cdkey", b"png")
+    assert _files(tmp_path, ".tmp") == []
+    assert _files(tmp_path, ".png") == []
+    assert cache.stats()["disk_errors"] == 1
+    # 디스크에 못 써도 메모리 단계에서는 꺼낼 수 있다
+    assert cache.get("cdkey") == b"png"
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    calls = []
+
+    def render():
+        calls.append(1)
+        return b"rendered"
+
+    assert RenderCache(directory=tmp_path).get_or_render("efkey", render) == b"rendered"
+    # 다른 프로세스처럼 메모리 단계가 빈 새 인스턴스는 디스크에서 읽고 다시 그리지 않는다
+    other = RenderCache(directory=tmp_path)
+    assert other.get_or_render("efkey", render) == b"rendered"
+    assert len(calls) == 1
+    assert other.stats()["disk_hits"] == 1
@@ -0,0 +1,102 @@
+# 글귀 테두리 / 그림자 / 빛 번짐 효과
+# 글자 마스크는 테두리 없이 한 번만 래스터화하고, 테두리는 그 마스크를 팽창(dilation)시켜 만든다.
+# 두께와 효과 크기는 모두 출력 픽셀 기준이라 upscale_factor 가 달라도 결과 모양이 같다.
+#
+#   OpenCV 가 있으면 거리 변환으로 가장자리가 부드러운 원형 테두리를 만들고,
+#   없으면 3x3 정사각형/십자 최대 필터를 번갈아 적용한 팔각형 근사를 쓴다 (NumPy).
+# 그림자와 빛 번짐은 테두리까지 포함한 마스크를 가우시안 블러한 알파로 만든다.
+import math
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+TextStyle = namedtuple("TextStyle", ["stroke_px", "shadow", "glow"])
+Shadow = namedtuple("Shadow", ["color", "offset", "blur", "opacity"])
+Glow = namedtuple("Glow", ["color", "blur", "strength"])
+
+# shadow=True / glow=True 로 켜면 쓰는 기본값 (출력 픽셀 기준)
+DEFAULT_SHADOW = {"color": "#000000", "offset": (2, 2), "blur": 3, "opacity": 0.6}
+DEFAULT_GLOW = {"color": "#FFFFFF", "blur": 6, "strength": 1.0}
+
+
+def make_style(stroke_px, shadow=None, glow=None):
+    # dict(또는 True) 인자를 캐시 키로 쓸 수 있는 namedtuple 로 바꾼다. None/False 면 효과를 끈다.
+    if shadow:
+        shadow = {**DEFAULT_SHADOW, **(shadow if isinstance(shadow, dict) else {})}
+        shadow = Shadow(shadow["color"], tuple(shadow["offset"]), float(shadow["blur"]), float(shadow["opacity"]))
+    if glow:
+        glow = {**DEFAULT_GLOW, **(glow if isinstance(glow, dict) else {})}
+        glow = Glow(glow["color"], float(glow["blur"]), float(glow["strength"]))
+    return TextStyle(max(0.0, float(stroke_px)), shadow or None, glow or None)
+
+
+def effect_margin(style):
+    # 글자 바깥으로 번지는 최대 거리 (출력 픽셀). 레이어 영역을 잡을 때 쓴다.
+    margin = style.stroke_px
+    if style.shadow:
+        margin = max(margin, style.stroke_px + max(map(abs, style.shadow.offset)) + 3 * style.shadow.blur)
+    if style.glow:
+        margin = max(margin, style.stroke_px + 3 * style.glow.blur)
+    return margin
+
+
+def _max3(array, square):
+    # 3x3 정사각형(square=True) 또는 십자 모양 최대 필터
+    out = array.copy()
+    np.maximum(out[1:], array[:-1], out=out[1:])
+    np.maximum(out[:-1], array[1:], out=out[:-1])
+    source = out.copy() if square else array
+    np.maximum(out[:, 1:], source[:, :-1], out=out[:, 1:])
+    np.maximum(out[:, :-1], source[:, 1:], out=out[:, :-1])
+    return out
+
+
+def dilate_mask(mask, radius):
+    # mask(uint8) 를 radius 픽셀만큼 바깥으로 넓힌다
+    if radius <= 0 or not mask.any():
+        # 빈 마스크(공백뿐인 글귀, 글자가 없는 띠 조각)는 거리 변환 값이 무한대라 그대로 돌려준다
+        return mask
+    if cv2 is not None:
+        # 바깥 픽셀마다 가장 가까운 글자 픽셀까지의 거리 -> 반지름 경계에서 1픽셀 폭으로 부드럽게 떨어뜨린다
+        distance = cv2.distanceTransform((mask < 128).astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_5)
+        stroke = np.clip((radius + 0.5 - distance) * 255, 0, 255).astype(np.uint8)
+        return np.maximum(mask, stroke)
+    out = mask
+    for step in range(math.ceil(radius)):
+        out = _max3(out, square=step % 2 == 0)
+    return out
+
+
+def _solid(color, alpha):
+    layer = Image.new("RGBA", alpha.size, color)
+    layer.putalpha(alpha)
+    return layer
+
+
+def compose_text_layer(fill_mask, text_color, stroke_color, style, scale=1):
+    # fill_mask: 테두리 없이 그린 글자 마스크 (L). scale: 출력 1픽셀에 해당하는 마스크 픽셀 수.
+    # 테두리 색 바탕에 글자 색을 제자리에서 칠하고, 효과는 아래에 깐 RGBA 레이어를 돌려준다.
+    ink = Image.fromarray(dilate_mask(np.asarray(fill_mask), style.stroke_px * scale))
+    layer = Image.new("RGBA", fill_mask.size, stroke_color)
+    layer.paste(text_color, (0, 0) + fill_mask.size, fill_mask)
+    layer.putalpha(ink)
+
+    if style.glow:
+        glow = ink.filter(ImageFilter.GaussianBlur(style.glow.blur * scale))
+        if style.glow.strength != 1:
+            glow = glow.point(lambda value: min(255, round(value * style.glow.strength)))
+        layer = Image.alpha_composite(_solid(style.glow.color, glow), layer)
+
+    if style.shadow:
+        shadow = Image.new("L", fill_mask.size, 0)
+        shadow.paste(ink, (round(style.shadow.offset[0] * scale), round(style.shadow.offset[1] * scale)))
+        shadow = shadow.filter(ImageFilter.GaussianBlur(style.shadow.blur * scale))
+        shadow = shadow.point(lambda value: round(value * style.shadow.opacity))
+        layer = Image.alpha_composite(_solid(style.shadow.color, shadow), layer)
+    return layer
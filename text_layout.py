@@ -0,0 +1,72 @@
+# 글귀 배치 엔진
+# 줄마다 한 번만 측정해서 캐시하고, 줄 간격은 글꼴의 ascent/descent 로 정한다.
+# 최대 너비에 맞춘 자동 줄바꿈과, 주어진 영역에 들어가는 가장 큰 글꼴 크기 찾기(이진 탐색)를 제공한다.
+import functools
+from collections import namedtuple
+
+TextBlock = namedtuple("TextBlock", ["lines", "offsets", "width", "height", "line_height"])
+
+
+@functools.lru_cache(maxsize=4096)
+def measure_line(font, line):
+    # (left, top, right, bottom) — ImageDraw.textbbox((0, 0), line, font=font) 와 같다
+    return font.getbbox(line)
+
+
+def line_width(font, line):
+    return measure_line(font, line)[2] if line else 0
+
+
+def wrap_lines(text, font, max_width=None):
+    # 줄바꿈 문자는 그대로 지키고, max_width 를 넘는 줄은 단어 단위로 (단어가 너무 길면 글자 단위로) 나눈다
+    paragraphs = text.split("\n")
+    if max_width is None:
+        return paragraphs
+
+    lines = []
+    for paragraph in paragraphs:
+        current = ""
+        for word in paragraph.split(" "):
+            candidate = f"{current} {word}" if current else word
+            if line_width(font, candidate) <= max_width:
+                current = candidate
+                continue
+            if current:
+                lines.append(current)
+            current = ""
+            for char in word:
+                if current and line_width(font, current + char) > max_width:
+                    lines.append(current)
+                    current = char
+                else:
+                    current += char
+        lines.append(current)
+    return lines
+
+
+def layout_block(lines, font, gap=0, line_spacing=1.0):
+    # 모든 줄이 같은 줄 높이(ascent + descent)를 쓰므로 가운데 정렬 계산과 실제 배치가 항상 일치한다
+    ascent, descent = font.getmetrics()
+    line_height = (ascent + descent) * line_spacing
+    advance = line_height + gap
+    width = max((line_width(font, line) for line in lines), default=0)
+    height = (len(lines) - 1) * advance + line_height if lines else 0
+    offsets = [index * advance for index in range(len(lines))]
+    return TextBlock(lines, offsets, width, height, line_height)
+
+
+def fit_font_size(text, load_font, box_size, min_size=10, max_size=200, gap=0, wrap=True):
+    # box_size (너비, 높이) 에 들어가는 가장 큰 글꼴 크기를 찾는다. load_font(size) 는 글꼴을 돌려주는 함수.
+    box_width, box_height = box_size
+    best = min_size
+    low, high = min_size, max_size
+    while low <= high:
+        size = (low + high) // 2
+        font = load_font(size)
+        block = layout_block(wrap_lines(text, font, box_width if wrap else None), font, gap)
+        if block.width <= box_width and block.height <= box_height:
+            best = size
+            low = size + 1
+        else:
+            high = size - 1
+    return best